@@ -0,0 +1,98 @@
+from typing import Any, Awaitable, Callable, Dict, List
+import asyncio
+import logging
+from .config import config_batch
+from .wire import binary_response, MEDIA_JSON
+
+# Batch endpoints, i.e. one request for several headwords
+# - The headwords are processed concurrently, but at most
+#   `config_batch["CONCURRENCY"]` at once per request.
+# - A failed headword doesn't fail the whole request. Each result has its
+#   own "status", and the response "status" is "success", "partial" or
+#   "failed".
+# - Binary responses (see `app/wire.py`) contain one feature matrix per
+#   headword, i.e. "features-0", "features-1", ... in the order of the
+#   requested headwords.
+
+logger = logging.getLogger(__name__)
+
+
+def read_headwords(params: dict) -> List[str]:
+    """ Read and check `params["headwords"]`
+
+    Raises:
+    -------
+    ValueError
+        If no list of headwords or too many headwords are provided
+    """
+    headwords = params.get("headwords")
+    if not isinstance(headwords, list) or len(headwords) == 0:
+        raise ValueError("No list of headwords provided")
+    if len(headwords) > config_batch["MAX_HEADWORDS"]:
+        raise ValueError(
+            f"Too many headwords (max. {config_batch['MAX_HEADWORDS']})")
+    return [str(headword) for headword in headwords]
+
+
+async def map_headwords(fn: Callable[[str], Awaitable[dict]],
+                        headwords: List[str]) -> List[dict]:
+    """ Run `fn(headword)` concurrently for all headwords
+
+    Parameters:
+    -----------
+    fn : Callable[[str], Awaitable[dict]]
+        Returns the result of a headword, i.e. a dict with "status"
+    headwords : List[str]
+        The requested headwords
+
+    Return:
+    -------
+    List[dict]
+        The result of each headword (in the same order). Exceptions are
+          reported as failed results.
+    """
+    semaphore = asyncio.Semaphore(config_batch["CONCURRENCY"])
+
+    async def run(headword):
+        async with semaphore:
+            try:
+                return await fn(headword)
+            except Exception as err:
+                logger.error(f"Unknown problems with '{headword}': {err}")
+                return {"status": "failed", "msg": str(err)}
+
+    return await asyncio.gather(*[run(headword) for headword in headwords])
+
+
+def batch_response(headwords: List[str],
+                   results: List[dict],
+                   media: str) -> Any:
+    """ Combine the results of `map_headwords`
+
+    Parameters:
+    -----------
+    headwords : List[str]
+        The requested headwords
+    results : List[dict]
+        The result of each headword. Successful results have the keys
+          "data" and "features" (np.ndarray).
+    media : str
+        The response format, see `negotiate`
+    """
+    arrays = {}
+    combined = []
+    for i, (headword, result) in enumerate(zip(headwords, results)):
+        result = dict(result, headword=headword)
+        feats = result.pop("features", None)
+        if feats is not None and media != MEDIA_JSON:
+            result["features"] = f"features-{i}"  # name of the array
+            arrays[f"features-{i}"] = feats
+        combined.append(result)
+
+    n_success = sum([1 for r in results if r["status"] == "success"])
+    status = ("success" if n_success == len(results)
+              else "partial" if n_success > 0 else "failed")
+    data: Dict[str, Any] = {"status": status, "results": combined}
+    if media != MEDIA_JSON:
+        return binary_response(data, arrays, media)
+    return data
@@ -0,0 +1,192 @@
+from typing import Any, Callable, Hashable, Optional
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache(object):
+    def __init__(self,
+                 maxsize: int,
+                 ttl: float,
+                 getsizeof: Optional[Callable[[Any], int]] = None,
+                 timer: Callable[[], float] = time.monotonic):
+        """ Size-bounded LRU cache whose entries expire after `ttl` seconds
+
+        Parameters:
+        -----------
+        maxsize : int
+            The maximum total size of all cached values. Each value counts
+              as 1 unless `getsizeof` is given, i.e. `maxsize` is the max.
+              number of entries by default.
+        ttl : float
+            Time to live of an entry in seconds
+        getsizeof : Callable (Default: None)
+            Function that returns the size of a value, e.g. in bytes.
+        timer : Callable (Default: time.monotonic)
+            The clock of the expiry times in seconds
+
+        Notes:
+        ------
+        - The cache is shared between threads, i.e. every access is guarded
+            by a lock.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.getsizeof = getsizeof if getsizeof else (lambda value: 1)
+        self.timer = timer
+        self.lock = threading.Lock()
+        self.data = collections.OrderedDict()  # key -> (expiry, size, value)
+        self.currsize = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expiry, _, value = entry
+            if expiry < self.timer():
+                self._delete(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self,
+            key: Hashable,
+            value: Any,
+            ttl: Optional[float] = None) -> None:
+        """ Add or replace an entry (`ttl` overrides the default TTL) """
+        size = self.getsizeof(value)
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            if key in self.data:
+                self._delete(key)
+            # never cache values that would flush the whole cache
+            if size > self.maxsize:
+                return
+            # evict least recently used entries
+            while self.data and (self.currsize + size > self.maxsize):
+                oldest = next(iter(self.data))
+                self._delete(oldest)
+                self.evictions += 1
+            self.data[key] = (self.timer() + ttl, size, value)
+            self.currsize += size
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return default
+            self._delete(key)
+            return entry[2]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+            self.currsize = 0
+
+    def _delete(self, key: Hashable) -> None:
+        """ remove an entry (the caller must hold the lock) """
+        _, size, _ = self.data.pop(key)
+        self.currsize -= size
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.data),
+                "currsize": self.currsize,
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+def redis_client(url: Optional[str]):
+    """ Connect to a Redis-compatible server, e.g. to share cache entries
+      between workers (optional dependency `redis`)
+
+    Parameters:
+    -----------
+    url : str
+        e.g. "redis://localhost:6379/0". No client is created if empty.
+
+    Return:
+    -------
+    redis.asyncio.Redis or None
+    """
+    if not url:
+        return None
+    import redis.asyncio
+    return redis.asyncio.from_url(url)
+
+
+class ResponseCache(object):
+    def __init__(self,
+                 prefix: str,
+                 maxbytes: int,
+                 ttl: float,
+                 redis=None):
+        """ Cache of serialized responses (bytes) in memory and optionally
+          in a shared Redis-compatible server
+
+        Parameters:
+        -----------
+        prefix : str
+            Prefix of the Redis keys, e.g. "simi"
+        maxbytes : int
+            The max. total size of the responses in memory
+        ttl : float
+            Time to live of an entry in seconds
+        redis : redis.asyncio.Redis (Default: None)
+            The shared cache, see `redis_client`. Any object with the async
+              methods `get(key)` and `set(key, value, ex=seconds)` works.
+
+        Notes:
+        ------
+        - Errors of the shared cache are logged, i.e. a request never fails
+            because the shared cache is not available.
+        """
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxbytes, ttl=ttl, getsizeof=len)
+        self.redis = redis
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.local.get(key)
+        if value is not None or self.redis is None:
+            return value
+        try:
+            value = await self.redis.get(f"{self.prefix}:{key}")
+        except Exception as e:
+            logger.error(e)
+            return None
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.local.set(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"{self.prefix}:{key}", value,
+                                     ex=max(1, int(self.ttl)))
+            except Exception as e:
+                logger.error(e)
+
+    def stats(self) -> dict:
+        return self.local.stats()
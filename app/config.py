@@ -33,6 +33,13 @@ config_auth_psql = {
     "password": config("DBAUTH_PASSWORD", default="evidence")
 }
 
+# Connection pool of the Authentication Database (per worker)
+config_auth_psql_pool = {
+    "MIN_SIZE": config("DBAUTH_POOL_MIN_SIZE", cast=int, default="1"),
+    "MAX_SIZE": config("DBAUTH_POOL_MAX_SIZE", cast=int, default="10"),
+    "TIMEOUT": config("DBAUTH_POOL_TIMEOUT", cast=float, default="30")
+}
+
 # Access Token Settings
 # - How to create a SECRET_KEY: `openssl rand -hex 32`
 config_auth_token = {
@@ -50,5 +57,168 @@ cfg_mailer = {
     "SMTP_PASSWORD": config("SMTP_PASSWORD", default=None),
     "FROM_EMAIL": config("FROM_EMAIL", default=None),
     "VERIFY_PUBLIC_URL": config("VERIFY_PUBLIC_URL",
-                                default='http://localhost:8080')
+                                default='http://localhost:8080'),
+    # outbound mail queue (see `app/mailer.py`)
+    # - SMTP_TIMEOUT: seconds till an SMTP command fails
+    # - QUEUE_MAXSIZE: max. number of queued mails
+    # - RATE: max. number of mails per second
+    # - RETRIES, BACKOFF: retries (and seconds before the 1st retry) after
+    #   transient errors
+    # - IDLE_TIMEOUT: seconds till an unused SMTP connection is closed
+    "SMTP_TIMEOUT": config("SMTP_TIMEOUT", cast=float, default="10"),
+    "QUEUE_MAXSIZE": config("MAIL_QUEUE_MAXSIZE", cast=int, default="1000"),
+    "RATE": config("MAIL_RATE", cast=float, default="5"),
+    "RETRIES": config("MAIL_RETRIES", cast=int, default="5"),
+    "BACKOFF": config("MAIL_BACKOFF", cast=float, default="1.0"),
+    "IDLE_TIMEOUT": config("MAIL_IDLE_TIMEOUT", cast=float, default="30")
+}
+
+# Throttling of the password checks (see `app/ratelimit.py`)
+# - CONCURRENCY: max. number of concurrent password checks per worker
+# - QUEUE_TIMEOUT: seconds to wait for a free slot (503 otherwise)
+# - ACCOUNT_RATE, ACCOUNT_BURST: attempts per second, and in a burst, of
+#   an account (429 otherwise)
+# - IP_RATE, IP_BURST: the same per client IP. A class room usually shares
+#   one IP, i.e. the burst must cover all annotators logging in at once.
+# - MAXKEYS: max. number of tracked accounts/IPs
+config_login = {
+    "CONCURRENCY": config("LOGIN_CONCURRENCY", cast=int, default="4"),
+    "QUEUE_TIMEOUT": config("LOGIN_QUEUE_TIMEOUT", cast=float,
+                            default="10"),
+    "ACCOUNT_RATE": config("LOGIN_ACCOUNT_RATE", cast=float, default="0.1"),
+    "ACCOUNT_BURST": config("LOGIN_ACCOUNT_BURST", cast=int, default="5"),
+    "IP_RATE": config("LOGIN_IP_RATE", cast=float, default="5"),
+    "IP_BURST": config("LOGIN_IP_BURST", cast=int, default="100"),
+    "MAXKEYS": config("LOGIN_MAXKEYS", cast=int, default="10000")
+}
+
+# Signed cursor tokens for pagination (see `app/cursors.py`)
+# - SECRET_KEY: defaults to the secret key of the access tokens
+# - TTL: seconds till a cursor expires
+config_cursors = {
+    "SECRET_KEY": config("CURSOR_SECRET_KEY",
+                         default=config_auth_token["SECRET_KEY"]),
+    "TTL": config("CURSOR_TTL", cast=int, default="86400")
+}
+
+# Process-wide cache for `tbl_features` partitions
+# - MAXBYTES: approx. memory limit of all cached partitions
+# - TTL: seconds till a cached partition is downloaded again
+config_partition_cache = {
+    "MAXBYTES": config("PARTITION_CACHE_MAXBYTES", cast=int,
+                       default="268435456"),
+    "TTL": config("PARTITION_CACHE_TTL", cast=int, default="600")
+}
+
+# Cache of the `/variation/similarity-matrices` responses
+# - MAXBYTES: memory limit of all cached responses
+# - TTL: seconds till a response is computed again
+config_similarity_cache = {
+    "MAXBYTES": config("SIMILARITY_CACHE_MAXBYTES", cast=int,
+                       default="67108864"),
+    "TTL": config("SIMILARITY_CACHE_TTL", cast=int, default="3600")
+}
+
+# Optional Redis-compatible server to share caches between workers
+# (e.g. "redis://localhost:6379/0", requires `pip install redis`)
+config_shared_cache = {
+    "REDIS_URL": config("CACHE_REDIS_URL", default=None)
+}
+
+# Cache for the `is_active_user` check of each authenticated request
+# - TTL: seconds till an active user is checked again
+# - NEGATIVE_TTL: seconds till an inactive user is checked again
+config_active_user_cache = {
+    "MAXSIZE": config("ACTIVE_USER_CACHE_MAXSIZE", cast=int, default="10000"),
+    "TTL": config("ACTIVE_USER_CACHE_TTL", cast=float, default="60"),
+    "NEGATIVE_TTL": config("ACTIVE_USER_CACHE_NEGATIVE_TTL", cast=float,
+                           default="10")
+}
+
+# Thread pools for blocking work in async route handlers
+# - CPU_WORKERS: numpy/numba transforms, e.g. `i2f`, similarity matrices
+# - IO_WORKERS: blocking client libraries, e.g. `smtplib`
+config_executors = {
+    "CPU_WORKERS": config("EXECUTOR_CPU_WORKERS", cast=int, default="2"),
+    "IO_WORKERS": config("EXECUTOR_IO_WORKERS", cast=int, default="8")
+}
+
+# Garbage collection of each worker (see `app/memory.py`)
+# - GC_THRESHOLD0..2: see `gc.set_threshold`
+# - GC_FREEZE: exclude the objects allocated at startup from collections
+# - GC_IDLE_INTERVAL: seconds between full collections while idle
+#     (0 disables the background collection)
+config_memory = {
+    "GC_THRESHOLD0": config("GC_THRESHOLD0", cast=int, default="50000"),
+    "GC_THRESHOLD1": config("GC_THRESHOLD1", cast=int, default="20"),
+    "GC_THRESHOLD2": config("GC_THRESHOLD2", cast=int, default="10"),
+    "GC_FREEZE": config("GC_FREEZE", cast=bool, default="True"),
+    "GC_IDLE_INTERVAL": config("GC_IDLE_INTERVAL", cast=float, default="60")
+}
+
+# Batch endpoints for several headwords (see `app/batch.py`)
+# - MAX_HEADWORDS: max. number of headwords per request
+# - CONCURRENCY: max. number of headwords processed at once per request
+config_batch = {
+    "MAX_HEADWORDS": config("BATCH_MAX_HEADWORDS", cast=int, default="20"),
+    "CONCURRENCY": config("BATCH_CONCURRENCY", cast=int, default="4")
+}
+
+# Near-duplicate filtering with `hashes16` (see `app/dedup.py`)
+# - THRESHOLD: min. share of equal hashes of duplicates (1.0: identical)
+config_dedup = {
+    "THRESHOLD": config("DEDUP_THRESHOLD", cast=float, default="1.0")
+}
+
+# Write pipeline of the annotation data (see `app/writes.py`)
+# - BATCH_SIZE: max. number of rows per (single-partition) batch
+# - CONCURRENCY: max. number of batches in flight per request
+# - RETRIES, BACKOFF: retries of failed writes, and the 1st delay (seconds)
+# - CONSISTENCY, SERIAL_CONSISTENCY: see `cassandra.ConsistencyLevel`
+config_writes = {
+    "BATCH_SIZE": config("WRITE_BATCH_SIZE", cast=int, default="20"),
+    "CONCURRENCY": config("WRITE_CONCURRENCY", cast=int, default="8"),
+    "RETRIES": config("WRITE_RETRIES", cast=int, default="3"),
+    "BACKOFF": config("WRITE_BACKOFF", cast=float, default="0.1"),
+    "CONSISTENCY": config("WRITE_CONSISTENCY", default="LOCAL_QUORUM"),
+    "SERIAL_CONSISTENCY": config("WRITE_SERIAL_CONSISTENCY",
+                                 default="LOCAL_SERIAL")
+}
+
+# Optional write-behind queue of the annotation data (see `app/writes.py`)
+# - ENABLED: queue the rows, and write them in a background task
+# - MAXSIZE: max. number of queued rows (requests wait if it is full)
+# - FLUSH_SIZE, FLUSH_INTERVAL: write after n rows or seconds
+# - PUT_TIMEOUT: seconds till rows are rejected if the queue is full
+config_write_behind = {
+    "ENABLED": config("WRITE_BEHIND_ENABLED", cast=bool, default="False"),
+    "MAXSIZE": config("WRITE_BEHIND_MAXSIZE", cast=int, default="10000"),
+    "FLUSH_SIZE": config("WRITE_BEHIND_FLUSH_SIZE", cast=int, default="200"),
+    "FLUSH_INTERVAL": config("WRITE_BEHIND_FLUSH_INTERVAL", cast=float,
+                             default="0.05"),
+    "PUT_TIMEOUT": config("WRITE_BEHIND_PUT_TIMEOUT", cast=float,
+                          default="1.0")
+}
+
+# Binary storage of the model weights (see `app/weights.py`)
+# - DTYPE: "float32" or "float16"
+# - COMPRESS: compress the weights with zlib
+# - KEEP_LAST: keep the last N snapshots per user (0: keep all)
+# - TTL: seconds till a snapshot expires (0: never)
+# - LIST_LIMIT: default page size of `/model/list`
+config_model_weights = {
+    "DTYPE": config("MODEL_WEIGHTS_DTYPE", default="float32"),
+    "COMPRESS": config("MODEL_WEIGHTS_COMPRESS", cast=bool, default="False"),
+    "KEEP_LAST": config("MODEL_WEIGHTS_KEEP_LAST", cast=int, default="0"),
+    "TTL": config("MODEL_WEIGHTS_TTL", cast=int, default="0"),
+    "LIST_LIMIT": config("MODEL_WEIGHTS_LIST_LIMIT", cast=int, default="100")
+}
+
+# Server-side scoring with the model weights (see `app/scoring.py`)
+# - CACHE_MAXBYTES: approx. memory limit of all cached models
+# - CACHE_TTL: seconds till a cached model is read again
+config_scoring = {
+    "CACHE_MAXBYTES": config("SCORING_CACHE_MAXBYTES", cast=int,
+                             default="67108864"),
+    "CACHE_TTL": config("SCORING_CACHE_TTL", cast=int, default="3600")
 }
@@ -4,7 +4,9 @@ import cassandra.query
 import cassandra.auth
 import cassandra.policies
 from .config import config_ev_cql
-import gc
+from .statements import get_registry
+import asyncio
+import threading
 
 
 class CqlConn:
@@ -39,10 +41,105 @@ class CqlConn:
     def shutdown(self) -> None:
         self.session.shutdown()
         self.cluster.shutdown()
-        gc.collect()
         pass
 
 
+# The process-wide Cassandra connection, shared by all routers.
+# (see `startup`, `shutdown`, `get_session`)
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def startup() -> None:
+    """ Connect to Cassandra (FastAPI startup event) """
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            _conn = CqlConn()
+
+
+def shutdown() -> None:
+    """ Close the Cassandra connection (FastAPI shutdown event) """
+    global _conn
+    with _conn_lock:
+        if _conn is not None:
+            _conn.shutdown()
+            _conn = None
+
+
+def get_session() -> cas.cluster.Session:
+    """ Return the shared Cassandra session (FastAPI dependency)
+
+    Notes:
+    ------
+    - The connection is created lazily if the startup event didn't run,
+        e.g. if `TestClient` is not used as context manager.
+    """
+    if _conn is None:
+        startup()
+    return _conn.get_session()
+
+
+def _resolve(afuture: asyncio.Future,
+             future: cas.cluster.ResponseFuture) -> None:
+    """ Copy the result of a finished ResponseFuture (in the event loop) """
+    if afuture.done():  # e.g. cancelled
+        return
+    try:
+        afuture.set_result(future.result())
+    except Exception as err:
+        afuture.set_exception(err)
+
+
+def wrap_future(future: cas.cluster.ResponseFuture) -> asyncio.Future:
+    """ Bridge a Cassandra ResponseFuture to an awaitable asyncio Future
+
+    Notes:
+    ------
+    - The driver calls the callbacks in its IO thread, i.e. the result is
+        handed over with `call_soon_threadsafe`. `future.result()` doesn't
+        block anymore at this point.
+    """
+    loop = asyncio.get_running_loop()
+    afuture = loop.create_future()
+
+    def callback(*args):
+        loop.call_soon_threadsafe(_resolve, afuture, future)
+
+    future.add_callbacks(callback, callback)
+    return afuture
+
+
+async def aexecute(session: cas.cluster.Session,
+                   query,
+                   parameters=None,
+                   paging_state: bytes = None
+                   ) -> cas.cluster.ResultSet:
+    """ Execute a query without blocking the event loop
+
+    Return:
+    -------
+    cas.cluster.ResultSet
+        The first page (`current_rows`) and its `paging_state`
+    """
+    return await wrap_future(session.execute_async(
+        query, parameters, paging_state=paging_state))
+
+
+async def aexecute_all(session: cas.cluster.Session,
+                       query,
+                       parameters=None) -> list:
+    """ Execute a query and download all pages without blocking """
+    rows, paging_state = [], None
+    while True:
+        results = await aexecute(
+            session, query, parameters, paging_state=paging_state)
+        rows.extend(results.current_rows)
+        paging_state = results.paging_state
+        if paging_state is None:
+            return rows
+
+
 def _isvalid_keyspace_name(keyspace: str) -> bool:
     """ helper function for `_cas_init_tables` """
     try:
@@ -130,6 +227,37 @@ def _cas_init_tables(session: cas.cluster.Session,
     );
     """)
 
+    # Copy of `tbl_features` sorted by score (see `app/score_index.py`)
+    session.execute(f"""
+    CREATE TABLE IF NOT EXISTS {keyspace}.tbl_features_by_score (
+      headword  TEXT
+    , score     FLOAT
+    , sentence  TEXT
+    , example_id UUID
+    , sent_id   UUID
+    , spans    frozen<list<frozen<list<SMALLINT>>>>
+    , annot    TEXT
+    , biblio   TEXT
+    , license  TEXT
+    , feats1   frozen<list<TINYINT>>
+    , feats2   frozen<list<TINYINT>>
+    , feats3   frozen<list<TINYINT>>
+    , feats4   frozen<list<TINYINT>>
+    , feats5   frozen<list<SMALLINT>>
+    , feats6   frozen<list<SMALLINT>>
+    , feats7   frozen<list<SMALLINT>>
+    , feats8   frozen<list<TINYINT>>
+    , feats9   frozen<list<TINYINT>>
+    , feats12  frozen<list<SMALLINT>>
+    , feats13  frozen<list<TINYINT>>
+    , feats14  frozen<list<TINYINT>>
+    , hashes15  frozen<list<INT>>
+    , hashes16  frozen<list<INT>>
+    , hashes18  frozen<list<INT>>
+    , PRIMARY KEY ((headword), score, sentence)
+    ) WITH CLUSTERING ORDER BY (score DESC, sentence ASC);
+    """)
+
     # Table for BWS-rankings annotated via the Web-App
     session.execute(f"""
     CREATE TABLE IF NOT EXISTS {keyspace}.evaluated_bestworst (
@@ -165,7 +293,46 @@ def _cas_init_tables(session: cas.cluster.Session,
       user_id     UUID
     , updated_at  TIMESTAMP 
     , weights     TEXT
+    , weights_blob  BLOB
+    , manifest      TEXT
+    , nbytes        INT
     , PRIMARY KEY(user_id, updated_at)
     ) WITH CLUSTERING ORDER BY (updated_at DESC);
     """)
+    # migrate tables created before the binary weights (see app/weights.py)
+    _cas_add_columns(session, keyspace, "model_weights", {
+        "weights_blob": "BLOB", "manifest": "TEXT", "nbytes": "INT"})
     pass
+
+
+def _cas_add_columns(session: cas.cluster.Session,
+                     keyspace: str,
+                     table: str,
+                     columns: dict) -> None:
+    """ Add missing columns to an existing table (`ALTER TABLE ... ADD`)
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    keyspace, table : str
+        The table to migrate
+    columns : dict
+        The column names and CQL types, e.g. `{"manifest": "TEXT"}`
+
+    Notes:
+    ------
+    - The prepared statements of the session are dropped if a column was
+        added, see `StatementRegistry.invalidate`.
+    """
+    session.cluster.refresh_table_metadata(keyspace, table)
+    existing = session.cluster.metadata.keyspaces[keyspace].tables[
+        table].columns
+    missing = {name: cqltype for name, cqltype in columns.items()
+               if name not in existing}
+    for name, cqltype in missing.items():
+        session.execute(
+            f"ALTER TABLE {keyspace}.{table} ADD {name} {cqltype};")
+    if len(missing) > 0:
+        # the prepared statements of the table are stale now
+        get_registry(session).invalidate()
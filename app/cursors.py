@@ -0,0 +1,98 @@
+from typing import Optional
+import base64
+import hashlib
+import hmac
+import json
+import time
+from .config import config_cursors
+
+# Stateless pagination with signed cursor tokens
+# - A cursor carries the Cassandra `paging_state` of the next page. It is
+#   returned to the client, and sent back to request the next page, i.e.
+#   no pagination state is stored in the worker.
+# - The token is signed (HMAC-SHA256), and bound to a scope, e.g. the user
+#   and the headword. A modified, expired or foreign cursor is rejected.
+# - Format: base64url(JSON payload) "." base64url(signature)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(config_cursors["SECRET_KEY"].encode("utf-8"),
+                    payload, hashlib.sha256).digest()
+
+
+def encode_cursor(paging_state: Optional[bytes],
+                  **scope) -> Optional[str]:
+    """ Create a cursor token for the next page
+
+    Parameters:
+    -----------
+    paging_state : bytes
+        The `paging_state` of the Cassandra ResultSet. No cursor is created
+          if it is None, i.e. if there is no next page.
+    scope : str
+        The request the cursor belongs to, e.g. `user=..., headword=...`
+
+    Return:
+    -------
+    str
+        The cursor token (URL-safe), or None
+    """
+    if paging_state is None:
+        return None
+    payload = json.dumps({
+        "p": _b64encode(paging_state),
+        "s": scope,
+        "t": int(time.time())
+    }, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def decode_cursor(token: Optional[str], **scope) -> Optional[bytes]:
+    """ Check a cursor token, and return its `paging_state`
+
+    Parameters:
+    -----------
+    token : str
+        The cursor token of the previous response (None for the 1st page)
+    scope : str
+        The same scope as in `encode_cursor`
+
+    Return:
+    -------
+    bytes
+        The `paging_state` (None for the 1st page)
+
+    Raises:
+    -------
+    InvalidCursor
+        If the cursor is malformed, modified, expired, or was created for
+          another scope
+    """
+    if not token:
+        return None
+    try:
+        payload, signature = token.split(".")
+        payload = _b64decode(payload)
+        signature = _b64decode(signature)
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidCursor("Invalid cursor signature")
+    data = json.loads(payload)
+    if data["s"] != scope:
+        raise InvalidCursor("Cursor of another request")
+    if time.time() - data["t"] > config_cursors["TTL"]:
+        raise InvalidCursor("Expired cursor")
+    return _b64decode(data["p"])
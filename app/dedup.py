@@ -0,0 +1,137 @@
+from typing import List
+import collections
+import math
+import numpy as np
+from .config import config_dedup
+
+# Near-duplicate filtering with the duplicate hashes (`hashes16`)
+# - Two sentence examples are duplicates if at least `threshold` (share)
+#   of their hashes are equal, i.e. the same measure as the `duplicate`
+#   matrix of `/variation/similarity-matrices`.
+# - The rows are grouped greedily in their order (e.g. by score): a row
+#   joins the group of the 1st earlier representative it is similar to,
+#   or becomes the representative of a new group. The representatives,
+#   i.e. the kept rows, are pairwise dissimilar, and each dropped row is
+#   similar to its representative. Similarity is not transitive: if A~B
+#   and B~C but not A~C, then B joins A, and C is not dropped because of B.
+# - Identical rows are merged first (`np.unique`). Instead of comparing
+#   all pairs of the remaining distinct rows, the hashes are split into
+#   bands. Two rows with at most `b - 1` different hashes have at least
+#   one equal band if there are `b` bands (pigeonhole principle), i.e. a
+#   row is only compared with the representatives that share a band with
+#   it. The memory is O(N), and the time is O(N * G) in the worst case of
+#   G groups with equal bands (e.g. low-entropy hashes and a low
+#   threshold).
+
+
+def check_threshold(threshold: float) -> float:
+    """ Check the share of equal hashes (0.0 < threshold <= 1.0)
+
+    Raises:
+    -------
+    ValueError
+        If the threshold is out of range
+    """
+    try:
+        threshold = float(threshold)
+    except (TypeError, ValueError):
+        raise ValueError(f"dedup_threshold={threshold} is no number")
+    if not 0.0 < threshold <= 1.0:
+        raise ValueError(
+            f"dedup_threshold={threshold} must be in (0.0, 1.0]")
+    return threshold
+
+
+def duplicate_groups(hashes: np.ndarray, threshold: float) -> np.ndarray:
+    """ Group near-duplicate rows (greedily, in the order of the rows)
+
+    Parameters:
+    -----------
+    hashes : np.ndarray (int32)
+        (N, n_hashes) matrix, e.g. `hashes16`
+    threshold : float
+        Min. share of equal hashes of duplicates (0.0 < threshold <= 1.0)
+
+    Return:
+    -------
+    np.ndarray (int64)
+        (N,) group of each row, i.e. the index of the 1st row of the group
+
+    Raises:
+    -------
+    ValueError
+        If the threshold is out of range
+    """
+    threshold = check_threshold(threshold)
+    n, m = hashes.shape
+    if n == 0 or m == 0:
+        return np.arange(n)
+    min_equal = max(1, math.ceil(threshold * m - 1e-9))
+
+    # merge identical rows, and sort the distinct rows by 1st occurrence
+    uniq, first, inverse = np.unique(
+        hashes, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    uniq, first, inverse = uniq[order], first[order], rank[inverse.ravel()]
+
+    # the representative of each distinct row
+    leader = np.arange(len(uniq))
+    if min_equal < m:
+        bands = np.array_split(np.arange(m), m - min_equal + 1)
+        buckets = [np.unique(uniq[:, band], axis=0, return_inverse=True)[1]
+                   .ravel().tolist() for band in bands]
+        reps = [collections.defaultdict(list) for _ in bands]
+        for i in range(len(uniq)):
+            cands = sorted({r for b, bucket in enumerate(buckets)
+                            for r in reps[b][bucket[i]]})
+            if len(cands) > 0:
+                equal = (uniq[cands] == uniq[i]).sum(axis=1)
+                hits = np.flatnonzero(equal >= min_equal)
+                if len(hits) > 0:
+                    leader[i] = cands[hits[0]]  # the earliest one
+                    continue
+            for b, bucket in enumerate(buckets):
+                reps[b][bucket[i]].append(i)
+    return first[leader[inverse]]
+
+
+def dedup_indices(hashes: np.ndarray,
+                  threshold: float = None) -> List[int]:
+    """ The rows to keep, i.e. the 1st row of each duplicate group
+
+    Parameters:
+    -----------
+    hashes : np.ndarray (int32)
+        (N, n_hashes) matrix, e.g. `hashes16` of rows sorted by score
+    threshold : float
+        Min. share of equal hashes (Default: DEDUP_THRESHOLD)
+    """
+    if threshold is None:
+        threshold = config_dedup["THRESHOLD"]
+    groups = duplicate_groups(hashes, threshold)
+    return np.flatnonzero(groups == np.arange(len(groups))).tolist()
+
+
+def read_dedup(params: dict) -> dict:
+    """ Read the `dedup` options of a request payload
+
+    Return:
+    -------
+    dict
+        The keyword arguments `dedup` and `dedup_threshold`
+
+    Raises:
+    -------
+    ValueError
+        If `dedup` is no boolean, or `dedup_threshold` is no number in
+          (0.0, 1.0]
+    """
+    dedup = params.get("dedup", False)
+    if not isinstance(dedup, bool):
+        raise ValueError(f"dedup={dedup!r} must be true or false")
+    threshold = params.get("dedup_threshold")
+    if threshold is not None:
+        threshold = check_threshold(threshold)
+    return {"dedup": dedup, "dedup_threshold": threshold}
@@ -0,0 +1,35 @@
+from typing import Any, Callable
+import asyncio
+import concurrent.futures
+import functools
+from .config import config_executors
+
+# Execution model of the route handlers
+# - All handlers are `async def` and must not block the event loop.
+# - Cassandra queries are awaited, see `cqlconn.aexecute`.
+# - Postgres queries are awaited, see `psqlconn.get_pool`.
+# - CPU-heavy numpy/numba work runs on the bounded `cpu_executor`, so
+#   that a large partition cannot stall all other requests.
+# - Blocking client libraries (e.g. `smtplib`) run on `io_executor`.
+
+cpu_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=config_executors["CPU_WORKERS"],
+    thread_name_prefix="cpu")
+
+io_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=config_executors["IO_WORKERS"],
+    thread_name_prefix="io")
+
+
+async def run_cpu(fn: Callable, *args, **kwargs) -> Any:
+    """ Run a CPU-heavy function on the CPU thread pool """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        cpu_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """ Run a blocking IO function on the IO thread pool """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        io_executor, functools.partial(fn, *args, **kwargs))
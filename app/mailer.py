@@ -0,0 +1,208 @@
+from typing import Callable, Optional
+import asyncio
+import collections
+import logging
+import smtplib
+from email.message import EmailMessage
+from .config import cfg_mailer
+from .executors import run_blocking
+
+# Outbound mail queue (e.g. the verification mails of `/auth/register`)
+# - The request handler only queues the message, i.e. it doesn't wait for
+#   the mail relay.
+# - One background task sends the queued messages one after another over
+#   a single SMTP connection. The connection is opened on demand, reused
+#   for the next messages, and closed after `idle_timeout` seconds without
+#   messages.
+# - `smtplib` is blocking, i.e. each SMTP command runs on the IO thread
+#   pool (see `app/executors.py`).
+# - Transient errors (disconnects, 4xx replies, network errors) are retried
+#   with exponential backoff on a new connection. Messages that still fail
+#   are logged and counted in `stats()`.
+# - At most `rate` messages per second are sent.
+
+logger = logging.getLogger(__name__)
+
+
+def smtp_connect() -> smtplib.SMTP:
+    """ Open an SMTP connection with the settings in `cfg_mailer` """
+    server = smtplib.SMTP(cfg_mailer["SMTP_SERVER"],
+                          cfg_mailer["SMTP_PORT"],
+                          timeout=cfg_mailer["SMTP_TIMEOUT"])
+    try:
+        if cfg_mailer["SMTP_TLS"]:
+            server.starttls()
+        if cfg_mailer["SMTP_USER"] and cfg_mailer["SMTP_PASSWORD"]:
+            server.login(cfg_mailer["SMTP_USER"], cfg_mailer["SMTP_PASSWORD"])
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def is_transient(err: Exception) -> bool:
+    """ If sending a message again might succeed """
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(err, smtplib.SMTPResponseException):
+        return 400 <= err.smtp_code < 500
+    if isinstance(err, smtplib.SMTPException):
+        return isinstance(err, smtplib.SMTPServerDisconnected)
+    return isinstance(err, OSError)
+
+
+class Mailer(object):
+    def __init__(self,
+                 connect: Callable[[], smtplib.SMTP],
+                 maxsize: int,
+                 rate: float,
+                 retries: int,
+                 backoff: float,
+                 idle_timeout: float):
+        """ Queue outbound mails, and send them in a background task
+
+        Parameters:
+        -----------
+        connect : Callable[[], smtplib.SMTP]
+            Opens a logged-in SMTP connection, e.g. `smtp_connect`
+        maxsize : int
+            The max. number of queued messages
+        rate : float
+            The max. number of messages per second
+        retries : int
+            The number of retries of a message after a transient error
+        backoff : float
+            Seconds before the 1st retry (doubled for each retry)
+        idle_timeout : float
+            Close the SMTP connection after `idle_timeout` seconds without
+              messages
+
+        Notes:
+        ------
+        - Call `start()` and `stop()` in the running event loop. `stop()`
+            sends all queued messages.
+        """
+        self.connect = connect
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.server = None
+        self.task = None
+        self.next_send = 0.0
+        self.counts = collections.Counter()
+
+    def start(self) -> None:
+        self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            await self.queue.put(None)  # send all messages, and exit
+            await self.task
+            self.task = None
+
+    def put(self, msg: EmailMessage) -> bool:
+        """ Queue a message (returns False if the queue is full) """
+        try:
+            self.queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            self.counts["rejected"] += 1
+            logger.error(f"Mail queue is full, dropped mail to {msg['To']}")
+            return False
+        self.counts["queued"] += 1
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                msg = await asyncio.wait_for(
+                    self.queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                await self._close()
+                continue
+            if msg is None:
+                await self._close()
+                return
+            await self._send(msg)
+
+    async def _send(self, msg: EmailMessage) -> None:
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            # rate limit
+            delay = self.next_send - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_send = max(self.next_send, loop.time()) + 1 / self.rate
+            try:
+                if self.server is None:
+                    self.server = await run_blocking(self.connect)
+                    self.counts["connections"] += 1
+                await run_blocking(self.server.send_message, msg)
+                self.counts["sent"] += 1
+                return
+            except Exception as err:
+                await self._close()
+                if attempt == self.retries or not is_transient(err):
+                    self.counts["failed"] += 1
+                    logger.error(f"Failed to send mail to {msg['To']}: {err}")
+                    return
+                self.counts["retries"] += 1
+                logger.warning(
+                    f"Retry mail ({attempt + 1}/{self.retries}): {err}")
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def _close(self) -> None:
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                await run_blocking(server.quit)
+            except Exception:
+                server.close()
+
+    def stats(self) -> dict:
+        return dict(self.counts, **{"queue-size": self.queue.qsize(),
+                                    "connected": self.server is not None})
+
+
+# The process-wide mail queue (see `start_mailer`, `queue_mail`)
+mailer: Optional[Mailer] = None
+
+
+def start_mailer() -> None:
+    """ Start the mail queue (FastAPI startup event) """
+    global mailer
+    if mailer is None:
+        mailer = Mailer(
+            smtp_connect,
+            maxsize=cfg_mailer["QUEUE_MAXSIZE"],
+            rate=cfg_mailer["RATE"],
+            retries=cfg_mailer["RETRIES"],
+            backoff=cfg_mailer["BACKOFF"],
+            idle_timeout=cfg_mailer["IDLE_TIMEOUT"])
+        mailer.start()
+
+
+async def stop_mailer() -> None:
+    """ Send all queued messages (FastAPI shutdown event) """
+    global mailer
+    if mailer is not None:
+        await mailer.stop()
+        mailer = None
+
+
+def queue_mail(msg: EmailMessage) -> bool:
+    """ Queue a message for sending
+
+    Return:
+    -------
+    bool
+        If the message was queued (False if the queue is full)
+
+    Notes:
+    ------
+    - The mail queue is started lazily if the startup event didn't run.
+    """
+    if mailer is None:
+        start_mailer()
+    return mailer.put(msg)
@@ -2,6 +2,9 @@ from fastapi import FastAPI, Depends
 
 from fastapi.middleware.cors import CORSMiddleware
 # from .config import config_web_app
+from . import (
+    cqlconn, psqlconn, similarity, memory, writes, mailer, ratelimit)
+from .partitions import partition_cache
 
 from .routers import (
     auth_email,
@@ -12,6 +15,7 @@ from .routers import (
     interactivity_deleted_episodes,
     interactivity_training_examples,
     similarity_matrices,
+    similarity_search,
     serialized_features,
     model_weights
 )
@@ -42,6 +46,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# count running requests (the idle GC waits for them)
+app.add_middleware(memory.InflightMiddleware)
+
+
+# background tasks of the worker
+_tasks = []
+
+
+@app.on_event("startup")
+async def startup_event():
+    memory.configure()
+    # one Cassandra connection and Postgres pool per worker, shared by all
+    # routers
+    cqlconn.startup()
+    await psqlconn.startup()
+    similarity.warmup()
+    writes.start_write_behind(cqlconn.get_session())
+    mailer.start_mailer()
+    memory.freeze()
+    task = memory.start_idle_collector()
+    if task is not None:
+        _tasks.append(task)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    while _tasks:
+        _tasks.pop().cancel()
+    await writes.stop_write_behind()
+    await mailer.stop_mailer()
+    cqlconn.shutdown()
+    await psqlconn.shutdown()
+
 
 # specify the endpoints
 @app.get(f"/{version}/")
@@ -49,6 +86,23 @@ def read_root():
     return {"msg": "Welcome to the EVIDENCE project."}
 
 
+@app.get(f"/{version}/stats",
+         dependencies=[Depends(auth_email.get_current_user)])
+def read_stats():
+    return {
+        "partition-cache": partition_cache.stats(),
+        "psql-pool": psqlconn.stats(),
+        "active-user-cache": auth_email.active_user_cache.stats(),
+        "similarity-cache": similarity_matrices.similarity_cache.stats(),
+        "write-behind": (writes.write_behind.stats()
+                         if writes.write_behind is not None else None),
+        "mailer": (mailer.mailer.stats()
+                   if mailer.mailer is not None else None),
+        "password-checks": ratelimit.password_checks.stats(),
+        "memory": memory.stats()
+    }
+
+
 app.include_router(
     auth_email.router,
     prefix=f"/{version}/auth",
@@ -124,6 +178,16 @@ app.include_router(
     responses={404: {"description": "Not found"}},
 )
 
+# POST /variation/nearest-neighbors
+# POST /variation/diverse-subset
+app.include_router(
+    similarity_search.router,
+    prefix=f"/{version}/variation",
+    tags=["variation"],
+    dependencies=[Depends(auth_email.get_current_user)],
+    responses={404: {"description": "Not found"}},
+)
+
 # POST /variation/serialized-features
 app.include_router(
     serialized_features.router,
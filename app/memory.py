@@ -0,0 +1,129 @@
+from typing import Optional
+import asyncio
+import gc
+import os
+import resource
+import time
+from .config import config_memory
+
+# Memory management of a worker
+# - No route handler calls `gc.collect()`. Reference counting frees almost
+#   everything (numpy arrays, query results), the cyclic GC only has to
+#   find reference cycles.
+# - `configure()` raises the generation-0 threshold, i.e. the GC runs less
+#   often during bursts of allocations (e.g. decoding a partition).
+# - `freeze()` moves all objects allocated at startup (modules, numba
+#   kernels, DB drivers) to the permanent generation, i.e. full collections
+#   do not traverse them anymore.
+# - `idle_collector()` runs the expensive full collection in the
+#   background when no request is being processed.
+# - `stats()` reports the RSS, its growth since startup, and the GC pauses.
+
+# number of requests being processed (see `InflightMiddleware`)
+inflight = 0
+
+_rss_start = None
+_pauses = {"count": 0, "total": 0.0, "max": 0.0}
+_pause_start = None
+_idle_collections = 0
+
+
+def rss_bytes() -> int:
+    """ The resident set size of this process in bytes """
+    try:
+        with open("/proc/self/statm", "rb") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # peak RSS as fallback (KiB on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _measure_pause(phase: str, info: dict) -> None:
+    """ `gc.callbacks` hook that records the duration of each collection """
+    global _pause_start
+    if phase == "start":
+        _pause_start = time.perf_counter()
+    elif _pause_start is not None:
+        secs = time.perf_counter() - _pause_start
+        _pauses["count"] += 1
+        _pauses["total"] += secs
+        _pauses["max"] = max(_pauses["max"], secs)
+        _pause_start = None
+
+
+def configure() -> None:
+    """ Set the GC thresholds and start measuring GC pauses """
+    global _rss_start
+    gc.set_threshold(config_memory["GC_THRESHOLD0"],
+                     config_memory["GC_THRESHOLD1"],
+                     config_memory["GC_THRESHOLD2"])
+    if _measure_pause not in gc.callbacks:
+        gc.callbacks.append(_measure_pause)
+    if _rss_start is None:
+        _rss_start = rss_bytes()
+
+
+def freeze() -> None:
+    """ Exclude all objects allocated so far from future collections
+      (call it after startup, see `gc.freeze`) """
+    if config_memory["GC_FREEZE"]:
+        gc.collect()
+        gc.freeze()
+
+
+async def idle_collector(interval: Optional[float] = None) -> None:
+    """ Run a full collection every `interval` seconds while idle
+
+    Parameters:
+    -----------
+    interval : float (Default: config_memory["GC_IDLE_INTERVAL"])
+        Seconds between two collections. The collection is postponed
+          while requests are processed.
+    """
+    global _idle_collections
+    interval = interval or config_memory["GC_IDLE_INTERVAL"]
+    while True:
+        await asyncio.sleep(interval)
+        while inflight > 0:
+            await asyncio.sleep(0.1)
+        gc.collect()
+        _idle_collections += 1
+
+
+def start_idle_collector() -> Optional[asyncio.Task]:
+    """ Start `idle_collector` in the running event loop (if enabled) """
+    if config_memory["GC_IDLE_INTERVAL"] > 0:
+        return asyncio.ensure_future(idle_collector())
+    return None
+
+
+class InflightMiddleware(object):
+    def __init__(self, app):
+        """ ASGI middleware that counts the requests being processed """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global inflight
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            inflight -= 1
+
+
+def stats() -> dict:
+    rss = rss_bytes()
+    return {
+        "rss": rss,
+        "rss-growth": rss - (_rss_start or rss),
+        "gc-threshold": gc.get_threshold(),
+        "gc-count": gc.get_count(),
+        "gc-frozen": gc.get_freeze_count(),
+        "gc-collections": [s["collections"] for s in gc.get_stats()],
+        "gc-pauses": _pauses["count"],
+        "gc-pause-total-ms": round(_pauses["total"] * 1000, 3),
+        "gc-pause-max-ms": round(_pauses["max"] * 1000, 3),
+        "idle-collections": _idle_collections
+    }
@@ -0,0 +1,417 @@
+from typing import List, Tuple
+import asyncio
+import collections
+import hashlib
+import sys
+import cassandra as cas
+import cassandra.cluster
+import numpy as np
+from .cache import TTLCache
+from .config import config_partition_cache
+from .cqlconn import aexecute_all
+from .executors import run_cpu
+from .statements import prepared
+from .transform import i2f
+from .similarity import pack_bits
+from .dedup import dedup_indices
+
+
+# The light-weight columns of a `tbl_features` row. The serialized features
+#  are stored as numpy arrays in `Partition`.
+PartitionRow = collections.namedtuple("PartitionRow", [
+    "headword", "example_id", "sentence", "sent_id", "spans",
+    "annot", "biblio", "license", "score"])
+
+
+class Partition(object):
+    def __init__(self,
+                 rows: List[PartitionRow],
+                 feats1: np.ndarray,
+                 feats: np.ndarray,
+                 hashes15: np.ndarray,
+                 hashes16: np.ndarray,
+                 hashes18: np.ndarray):
+        """ The decoded `tbl_features` partition of one headword
+
+        Parameters:
+        -----------
+        rows : List[PartitionRow]
+            The sentence examples with its meta data
+        feats1 : np.ndarray (int8)
+            The serialized SBERT hashes, i.e. the raw `feats1` column
+        feats : np.ndarray
+            The floating-point features for the TFJS model, see `i2f`
+        hashes15, hashes16, hashes18 : np.ndarray (int32)
+            The grammar, duplicate and biblio hashes
+
+        Notes:
+        ------
+        - A partition is shared between requests. The numpy arrays are
+            read-only, and the rows are immutable tuples.
+        """
+        self.rows = rows
+        self.scores = np.array([row.score for row in rows], dtype=float)
+        self.feats1 = feats1
+        self.feats = feats
+        self.hashes15 = hashes15
+        self.hashes16 = hashes16
+        self.hashes18 = hashes18
+        for arr in (self.scores, self.feats1, self.feats,
+                    self.hashes15, self.hashes16, self.hashes18):
+            arr.setflags(write=False)
+        self._positions = None
+        self._example_positions = None
+        self._words = None
+
+    @property
+    def words(self) -> np.ndarray:
+        """ The SBERT hashes packed as uint64 words (see `pack_bits`), i.e.
+          the index of the Hamming search in `app/similarity.py` """
+        if self._words is None:
+            words = pack_bits(self.feats1)
+            words.setflags(write=False)
+            self._words = words
+        return self._words
+
+    @property
+    def positions(self) -> dict:
+        """ The row number of each sentence (the clustering key) """
+        if self._positions is None:
+            self._positions = {
+                row.sentence: i for i, row in enumerate(self.rows)}
+        return self._positions
+
+    @property
+    def example_positions(self) -> dict:
+        """ The row number of each `example_id` (as str) """
+        if self._example_positions is None:
+            self._example_positions = {
+                str(row.example_id): i for i, row in enumerate(self.rows)}
+        return self._example_positions
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def top(self, limit: int) -> 'Partition':
+        """ The `limit` sentence examples with the largest scores (sorted) """
+        idx = np.argsort(-self.scores, kind="stable")[:limit]
+        return Partition(
+            [self.rows[i] for i in idx], self.feats1[idx], self.feats[idx],
+            self.hashes15[idx], self.hashes16[idx], self.hashes18[idx])
+
+    @property
+    def nbytes(self) -> int:
+        """ Approximate memory footprint (used for the cache size) """
+        nbytes = sum([arr.nbytes for arr in (
+            self.scores, self.feats1, self.feats,
+            self.hashes15, self.hashes16, self.hashes18)])
+        nbytes += self.feats1.nbytes + 8 * len(self.rows)  # packed `words`
+        for row in self.rows:
+            nbytes += sys.getsizeof(row) + 256  # UUIDs, spans, etc.
+            nbytes += sum([sys.getsizeof(s) for s in (
+                row.sentence, row.annot, row.biblio, row.license)])
+        return nbytes
+
+
+def rows_version(rows: List[PartitionRow]) -> str:
+    """ Digest of the sentence examples, e.g. to detect changed data
+
+    Notes:
+    ------
+    - Only the light-weight columns are hashed, i.e. the features of an
+        `example_id` are assumed not to change.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(repr((
+            str(row.example_id), row.sentence, row.score, row.biblio
+        )).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Process-wide partition cache, keyed by (keyspace, headword)
+partition_cache = TTLCache(
+    maxsize=config_partition_cache["MAXBYTES"],
+    ttl=config_partition_cache["TTL"],
+    getsizeof=lambda partition: partition.nbytes)
+
+
+def to_partition_row(row) -> PartitionRow:
+    """ Copy the light-weight columns of a `tbl_features` row """
+    return PartitionRow(
+        row.headword, row.example_id, row.sentence, row.sent_id,
+        row.spans, row.annot, row.biblio, row.license, row.score)
+
+
+def decode_features(rows: list) -> np.ndarray:
+    """ Convert the serialized features of `tbl_features` rows with `i2f`
+      (CPU-heavy) """
+    return i2f(*[[getattr(row, col) for row in rows] for col in (
+        "feats1", "feats2", "feats3", "feats4", "feats5", "feats6",
+        "feats7", "feats8", "feats9", "feats12", "feats13", "feats14")])
+
+
+def build_partition(rows: list) -> Partition:
+    """ Decode the `select_features` rows of a partition (CPU-heavy) """
+    if len(rows) == 0:
+        return Partition(
+            [], np.empty((0, 0), dtype=np.int8), np.empty((0, 0)),
+            *[np.empty((0, 0), dtype=np.int32) for _ in range(3)])
+
+    return Partition(
+        [to_partition_row(row) for row in rows],
+        np.array([row.feats1 for row in rows], dtype=np.int8),
+        decode_features(rows),
+        *[np.array([getattr(row, col) for row in rows], dtype=np.int32)
+          for col in ("hashes15", "hashes16", "hashes18")])
+
+
+async def fetch_partition(session: cas.cluster.Session,
+                          headword: str) -> Partition:
+    """ Download and decode the whole `tbl_features` partition of a headword
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    headword : str
+        The partition key
+
+    Return:
+    -------
+    Partition
+        The decoded partition (without any sentence examples if the
+          headword does not exist)
+    """
+    stmt = prepared(session, "select_features").bind([headword])
+    stmt.fetch_size = 5000
+    rows = await aexecute_all(session, stmt)
+    return await run_cpu(build_partition, rows)
+
+
+# running downloads, keyed by (keyspace, headword)
+_inflight = {}
+
+
+async def _load_partition(session: cas.cluster.Session,
+                          key: tuple) -> Partition:
+    partition = await fetch_partition(session, key[1])
+    if len(partition) > 0:
+        partition_cache.set(key, partition)
+    return partition
+
+
+async def get_partition(session: cas.cluster.Session,
+                        headword: str) -> Partition:
+    """ Read a `tbl_features` partition from the cache or download it
+
+    Notes:
+    ------
+    - Concurrent requests for the same headword share one download.
+    - Empty partitions are not cached, i.e. new headwords are available
+        as soon as they are inserted.
+    """
+    key = (session.keyspace, headword)
+    partition = partition_cache.get(key)
+    if partition is not None:
+        return partition
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_partition(session, key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # the download continues if this request is cancelled
+    return await asyncio.shield(task)
+
+
+async def get_top_partition(session: cas.cluster.Session,
+                            headword: str,
+                            limit: int) -> Partition:
+    """ Read the `limit` sentence examples with the largest scores
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    headword : str
+        The partition key
+    limit : int
+        The max. number of sentence examples, e.g. `n_offset + n_top`
+
+    Return:
+    -------
+    Partition
+        The sentence examples sorted by score (descending)
+
+    Notes:
+    ------
+    - A cached partition is used if available. Otherwise only `limit` rows
+        of `tbl_features_by_score` are downloaded and decoded.
+    - Headwords that are missing in `tbl_features_by_score` (e.g. not
+        indexed yet, see `app/score_index.py`) are read from `tbl_features`.
+    """
+    partition = partition_cache.get((session.keyspace, headword))
+    if partition is not None:
+        return partition.top(limit)
+    stmt = prepared(session, "select_features_by_score").bind(
+        [headword, limit])
+    stmt.fetch_size = 5000
+    rows = await aexecute_all(session, stmt)
+    if len(rows) > 0:
+        return await run_cpu(build_partition, rows)
+    partition = await get_partition(session, headword)
+    return partition.top(limit)
+
+
+def sort_by_score(rows: List[PartitionRow]) -> List[PartitionRow]:
+    """ Sort rows by score (descending, stable, missing scores last) """
+    scores = np.array([row.score for row in rows], dtype=float)
+    return [rows[i] for i in np.argsort(-scores, kind="stable")]
+
+
+async def get_top_rows(session: cas.cluster.Session,
+                       headword: str,
+                       limit: int) -> List[PartitionRow]:
+    """ Read the light-weight columns of the `limit` sentence examples with
+      the largest scores (1st phase, see `get_row_features`)
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    headword : str
+        The partition key
+    limit : int
+        The max. number of sentence examples, e.g. `n_offset + n_top`
+
+    Return:
+    -------
+    List[PartitionRow]
+        The sentence examples sorted by score (descending)
+    """
+    partition = partition_cache.get((session.keyspace, headword))
+    if partition is not None:
+        return partition.top(limit).rows
+    stmt = prepared(session, "select_rows_by_score").bind([headword, limit])
+    stmt.fetch_size = 5000
+    rows = await aexecute_all(session, stmt)
+    if len(rows) == 0:  # not indexed yet
+        stmt = prepared(session, "select_rows").bind([headword])
+        stmt.fetch_size = 5000
+        rows = sort_by_score(await aexecute_all(session, stmt))[:limit]
+    return [to_partition_row(row) for row in rows]
+
+
+# max. number of sentences per `select_features_in` query
+FEATURES_IN_CHUNKSIZE = 100
+
+
+async def get_row_features(session: cas.cluster.Session,
+                           headword: str,
+                           rows: List[PartitionRow]
+                           ) -> Tuple[List[PartitionRow], np.ndarray]:
+    """ Read and decode the features of the chosen sentence examples
+      (2nd phase, see `get_top_rows`)
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    headword : str
+        The partition key
+    rows : List[PartitionRow]
+        The chosen sentence examples of the headword
+
+    Return:
+    -------
+    rows : List[PartitionRow]
+        The sentence examples (without examples deleted in the meantime)
+    feats : np.ndarray
+        The floating-point features of each sentence example, see `i2f`
+
+    Notes:
+    ------
+    - The features are read from a cached partition if available.
+        Otherwise they are queried in chunks of `FEATURES_IN_CHUNKSIZE`
+        sentences (`IN` on the clustering key).
+    """
+    partition = partition_cache.get((session.keyspace, headword))
+    if partition is not None:
+        rows = [row for row in rows if row.sentence in partition.positions]
+        idx = [partition.positions[row.sentence] for row in rows]
+        return rows, partition.feats[idx]
+
+    found = await _select_in(session, "select_features_in", headword, rows)
+    rows = [row for row in rows if row.sentence in found]
+    if len(rows) == 0:
+        return rows, np.empty((0, 0), dtype=np.float32)
+    feats = await run_cpu(
+        decode_features, [found[row.sentence] for row in rows])
+    return rows, feats
+
+
+async def _select_in(session: cas.cluster.Session,
+                     name: str,
+                     headword: str,
+                     rows: List[PartitionRow]) -> dict:
+    """ Run the `... sentence IN ?` query `name` in chunks of
+      `FEATURES_IN_CHUNKSIZE` sentences, and return `{sentence: row}` """
+    stmt = prepared(session, name)
+    sentences = [row.sentence for row in rows]
+    chunks = await asyncio.gather(*[
+        aexecute_all(session, stmt, [
+            headword, sentences[i:(i + FEATURES_IN_CHUNKSIZE)]])
+        for i in range(0, len(sentences), FEATURES_IN_CHUNKSIZE)])
+    return {row.sentence: row for chunk in chunks for row in chunk}
+
+
+async def get_row_hashes(session: cas.cluster.Session,
+                         headword: str,
+                         rows: List[PartitionRow]
+                         ) -> Tuple[List[PartitionRow], np.ndarray]:
+    """ Read the duplicate hashes (`hashes16`) of the chosen sentence
+      examples, e.g. to filter duplicates (see `app/dedup.py`) before the
+      features are read
+
+    Return:
+    -------
+    rows : List[PartitionRow]
+        The sentence examples (without examples deleted in the meantime)
+    hashes16 : np.ndarray (int32)
+        The duplicate hashes of each sentence example
+    """
+    partition = partition_cache.get((session.keyspace, headword))
+    if partition is not None:
+        rows = [row for row in rows if row.sentence in partition.positions]
+        idx = [partition.positions[row.sentence] for row in rows]
+        return rows, partition.hashes16[idx]
+
+    found = await _select_in(session, "select_hashes16_in", headword, rows)
+    rows = [row for row in rows if row.sentence in found]
+    if len(rows) == 0:
+        return rows, np.empty((0, 0), dtype=np.int32)
+    return rows, np.array(
+        [found[row.sentence].hashes16 for row in rows], dtype=np.int32)
+
+
+async def dedup_rows(session: cas.cluster.Session,
+                     headword: str,
+                     rows: List[PartitionRow],
+                     threshold: float = None) -> List[PartitionRow]:
+    """ Drop near-duplicates, i.e. keep the 1st row of each group of rows
+      with (mostly) equal `hashes16` (see `app/dedup.py`)
+
+    Parameters:
+    -----------
+    rows : List[PartitionRow]
+        The sentence examples, e.g. sorted by score
+    threshold : float
+        Min. share of equal hashes (Default: DEDUP_THRESHOLD)
+
+    Notes:
+    ------
+    - The grouping runs on the CPU thread pool (see `app/executors.py`).
+    """
+    rows, hashes16 = await get_row_hashes(session, headword, rows)
+    keep = await run_cpu(dedup_indices, hashes16, threshold)
+    return [rows[i] for i in keep]
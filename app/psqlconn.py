@@ -0,0 +1,63 @@
+import asyncio
+import psycopg_pool
+from .config import config_auth_psql, config_auth_psql_pool
+
+
+# The process-wide Postgres connection pool, shared by all routers.
+# (see `startup`, `shutdown`, `get_pool`)
+_pool = None
+_pool_lock = None  # asyncio.Lock, created in the running event loop
+
+
+def _conninfo_kwargs(cfg_psql: dict) -> dict:
+    """ Convert `config_auth_psql` to libpq connection parameters """
+    kwargs = {k: v for k, v in cfg_psql.items() if v is not None}
+    if "database" in kwargs:
+        kwargs["dbname"] = kwargs.pop("database")
+    return kwargs
+
+
+async def startup() -> None:
+    """ Open the Postgres connection pool (FastAPI startup event) """
+    global _pool, _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            pool = psycopg_pool.AsyncConnectionPool(
+                conninfo="",
+                kwargs=_conninfo_kwargs(config_auth_psql),
+                min_size=config_auth_psql_pool["MIN_SIZE"],
+                max_size=config_auth_psql_pool["MAX_SIZE"],
+                timeout=config_auth_psql_pool["TIMEOUT"],
+                name="dbauth",
+                open=False)
+            await pool.open()
+            _pool = pool
+
+
+async def shutdown() -> None:
+    """ Close the Postgres connection pool (FastAPI shutdown event) """
+    global _pool, _pool_lock
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+    _pool_lock = None
+
+
+async def get_pool() -> psycopg_pool.AsyncConnectionPool:
+    """ Return the shared Postgres connection pool (FastAPI dependency)
+
+    Notes:
+    ------
+    - The pool is opened lazily if the startup event didn't run. It is
+        bound to the event loop, i.e. use `TestClient` as context manager.
+    """
+    if _pool is None:
+        await startup()
+    return _pool
+
+
+def stats() -> dict:
+    """ Pool statistics, e.g. `pool_size`, `requests_waiting` """
+    return _pool.get_stats() if _pool is not None else {}
@@ -0,0 +1,119 @@
+from typing import Optional
+import asyncio
+import collections
+import contextlib
+import math
+import time
+import fastapi
+from .config import config_login
+
+# Throttling of the password checks (`/auth/login`, `/auth/register`)
+# - The password hashing (bcrypt via pgcrypto) runs in Postgres, and costs
+#   a lot of CPU per attempt. At most `config_login["CONCURRENCY"]` checks
+#   of a worker run at once, i.e. a login storm can't take all pooled
+#   Postgres connections, and the other requests keep their latency.
+#   Requests wait up to `config_login["QUEUE_TIMEOUT"]` seconds for a free
+#   slot (503 otherwise).
+# - Bursts of attempts per account and per client IP are limited with
+#   token buckets (429 with `Retry-After`).
+# - The limits are per worker process.
+
+RATE_LIMIT_EXCEEDED = fastapi.status.HTTP_429_TOO_MANY_REQUESTS
+
+
+class TokenBuckets(object):
+    def __init__(self, rate: float, burst: int, maxkeys: int = 10000):
+        """ One token bucket per key (e.g. account or IP)
+
+        Parameters:
+        -----------
+        rate : float
+            Tokens added per second
+        burst : int
+            Max. number of tokens, i.e. attempts in a burst
+        maxkeys : int
+            Max. number of tracked keys. The least recently used buckets
+              are dropped (i.e. they start full again).
+        """
+        self.rate = rate
+        self.burst = burst
+        self.maxkeys = maxkeys
+        self.buckets = collections.OrderedDict()  # key -> (tokens, time)
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """ Take 1 token of the bucket `key`
+
+        Return:
+        -------
+        float
+            0.0 if a token was taken, or the seconds till the next token
+        """
+        now = time.monotonic() if now is None else now
+        tokens, last = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1.0:
+            tokens, wait = tokens - 1.0, 0.0
+        else:
+            wait = (1.0 - tokens) / self.rate
+        self.buckets[key] = (tokens, now)
+        while len(self.buckets) > self.maxkeys:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimit(object):
+    def __init__(self, limit: int, timeout: float):
+        """ At most `limit` concurrent tasks, wait `timeout` seconds """
+        self.limit = limit
+        self.timeout = timeout
+        self.semaphore = None  # created in the running event loop
+        self.counts = collections.Counter()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """ Wait for a free slot (503 after `timeout` seconds) """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.limit)
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+            raise fastapi.HTTPException(
+                status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins",
+                headers={"Retry-After": "1"})
+        self.counts["running"] += 1
+        try:
+            yield
+        finally:
+            self.counts["running"] -= 1
+            self.semaphore.release()
+
+    def stats(self) -> dict:
+        return dict(self.counts, limit=self.limit)
+
+
+def throttle(buckets: TokenBuckets, key: str) -> None:
+    """ Take a token of the bucket `key`, or raise 429 """
+    wait = buckets.acquire(key)
+    if wait > 0:
+        raise fastapi.HTTPException(
+            status_code=RATE_LIMIT_EXCEEDED,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(math.ceil(wait))})
+
+
+def client_ip(request: fastapi.Request) -> str:
+    """ The client IP (see `uvicorn --proxy-headers` behind a proxy) """
+    return request.client.host if request.client else "unknown"
+
+
+# The process-wide limits of the password checks
+password_checks = ConcurrencyLimit(
+    config_login["CONCURRENCY"], config_login["QUEUE_TIMEOUT"])
+account_buckets = TokenBuckets(
+    config_login["ACCOUNT_RATE"], config_login["ACCOUNT_BURST"],
+    config_login["MAXKEYS"])
+ip_buckets = TokenBuckets(
+    config_login["IP_RATE"], config_login["IP_BURST"],
+    config_login["MAXKEYS"])
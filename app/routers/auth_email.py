@@ -9,23 +9,24 @@ from ..config import config_auth_token
 from typing import Optional, Union, List
 from datetime import datetime, timedelta
 
-import psycopg2
-import psycopg2.extras
-from ..config import config_auth_psql
-import gc
+from psycopg_pool import AsyncConnectionPool
+from ..psqlconn import get_pool
+from ..cache import TTLCache, redis_client
+from ..config import config_active_user_cache, config_shared_cache
 import uuid
 import logging
 
-import smtplib
 from email.message import EmailMessage
 from ..config import cfg_mailer
+from ..mailer import queue_mail
+from ..ratelimit import (
+    password_checks, account_buckets, ip_buckets, throttle, client_ip)
 
 logging.info(cfg_mailer)
 
 # Settings
 router = fastapi.APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-psycopg2.extras.register_uuid()  # to process UUIDs
 
 
 #
@@ -47,129 +48,160 @@ class GapiUserMeta(BaseModel):
 
 
 class PsqlDb(object):
-    def __init__(self, cfg_psql: dict):
-        self.cfg_psql = cfg_psql
+    def __init__(self, pool: AsyncConnectionPool):
+        self.pool = pool
 
     def is_configured(self):
-        return True if self.cfg_psql else False
+        return True if self.pool else False
 
-    def validate_user(self, email, plain_password) -> uuid.UUID:
+    async def _fetch_value(self, query: str, params: list):
+        """ Run a query on a pooled connection and return the 1st value """
+        async with self.pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return (await cur.fetchone())[0]
+
+    async def validate_user(self, email, plain_password) -> uuid.UUID:
+        user_id = None
         try:
-            conn = psycopg2.connect(**self.cfg_psql)
-            cur = conn.cursor()
-            cur.execute(
+            user_id = await self._fetch_value(
                 "SELECT auth.validate_email_password2(%s::text, %s::text);",
                 [email, plain_password])
-            user_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            del cur, conn
             user_id = str(uuid.UUID(str(user_id)))  # trigger Error or not
         except Exception as e:
             logging.error(f"UserId: {user_id} / Type: {type(user_id)}")
             logging.error(e)
             user_id = None
         finally:
-            gc.collect()
             return user_id
 
-    def is_active_user(self, user_id: uuid.UUID) -> bool:
+    async def is_active_user(self, user_id: uuid.UUID) -> bool:
+        """ Check if the user account is active (None if the check failed) """
         try:
-            conn = psycopg2.connect(**self.cfg_psql)
-            cur = conn.cursor()
-            cur.execute(
+            isactive = await self._fetch_value(
                 "SELECT auth.email_isactive(%s::uuid);", [user_id])
-            isactive = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            del cur, conn
         except Exception as e:
             logging.error(e)
-            isactive = False
+            isactive = None
         finally:
-            gc.collect()
             return isactive
 
-    def add_new_email_account(self, email, plain_password) -> uuid.UUID:
+    async def add_new_email_account(self, email, plain_password) -> uuid.UUID:
         try:
-            conn = psycopg2.connect(**self.cfg_psql)
-            cur = conn.cursor()
-            cur.execute(
+            user_id = await self._fetch_value(
                 "SELECT auth.add_new_email_account(%s::text, %s::text);",
                 [email, plain_password])
-            user_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            del cur, conn
         except Exception as e:
             logging.error(e)
             user_id = None
         finally:
-            gc.collect()
             return user_id
 
-    def issue_verification_token(self, user_id: uuid.UUID) -> uuid.UUID:
+    async def issue_verification_token(self,
+                                       user_id: uuid.UUID) -> uuid.UUID:
         try:
-            conn = psycopg2.connect(**self.cfg_psql)
-            cur = conn.cursor()
-            cur.execute(
+            verify_token = await self._fetch_value(
                 "SELECT auth.issue_verification_token(%s::uuid);",
                 [user_id])
-            verify_token = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            del cur, conn
         except Exception as e:
             logging.error(e)
             verify_token = None
         finally:
-            gc.collect()
             return verify_token
 
-    def check_verification_token(self, verify_token: uuid.UUID) -> uuid.UUID:
+    async def check_verification_token(self,
+                                       verify_token: uuid.UUID) -> uuid.UUID:
         try:
-            conn = psycopg2.connect(**self.cfg_psql)
-            cur = conn.cursor()
-            cur.execute(
+            user_id = await self._fetch_value(
                 "SELECT auth.check_verification_token(%s::uuid);",
                 [verify_token])
-            user_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            del cur, conn
         except Exception as e:
             logging.error(e)
             user_id = None
         finally:
-            gc.collect()
             return user_id
 
-    def upsert_google_signin(self, gid: str, email: str) -> uuid.UUID:
+    async def upsert_google_signin(self, gid: str, email: str) -> uuid.UUID:
         try:
-            conn = psycopg2.connect(**self.cfg_psql)
-            cur = conn.cursor()
-            cur.execute(
+            user_id = await self._fetch_value(
                 "SELECT auth.upsert_google_signin(%s::text, %s::text);",
                 [gid, email])
-            user_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            del cur, conn
             user_id = str(uuid.UUID(str(user_id)))  # trigger Error or not
         except Exception as e:
             logging.error(e)
             user_id = None
         finally:
-            gc.collect()
             return user_id
 
 
+# Cache of the `is_active_user` checks in `get_current_user`
+# - inactive users are cached with a shorter TTL (negative caching)
+# - the entries are shared between workers if `CACHE_REDIS_URL` is set
+active_user_cache = TTLCache(
+    maxsize=config_active_user_cache["MAXSIZE"],
+    ttl=config_active_user_cache["TTL"])
+active_user_redis = redis_client(config_shared_cache["REDIS_URL"])
+
+
+async def is_active_user_cached(db: PsqlDb, user_id: str) -> bool:
+    """ Check if the user account is active (cached)
+
+    Parameters:
+    -----------
+    db : PsqlDb
+        The authentication database, queried on a cache miss
+    user_id : str
+        The user_id as string (not uuid.UUID)
+
+    Return:
+    -------
+    bool
+        True if the user account is active
+    """
+    isactive = active_user_cache.get(user_id)
+    if isactive is not None:
+        return isactive
+    # read the shared cache
+    if active_user_redis is not None:
+        try:
+            value = await active_user_redis.get(f"isactive:{user_id}")
+            if value is not None:
+                isactive = value == b"1"
+                ttl = config_active_user_cache[
+                    "TTL" if isactive else "NEGATIVE_TTL"]
+                active_user_cache.set(user_id, isactive, ttl=ttl)
+                return isactive
+        except Exception as e:
+            logging.error(e)
+    # query the database, and don't cache failed checks
+    isactive = await db.is_active_user(user_id)
+    if isactive is None:
+        return False
+    ttl = config_active_user_cache[
+        "TTL" if isactive else "NEGATIVE_TTL"]
+    active_user_cache.set(user_id, isactive, ttl=ttl)
+    if active_user_redis is not None:
+        try:
+            await active_user_redis.set(
+                f"isactive:{user_id}", b"1" if isactive else b"0",
+                ex=max(1, int(ttl)))
+        except Exception as e:
+            logging.error(e)
+    return isactive
+
+
+async def invalidate_active_user(user_id: str) -> None:
+    """ Remove a user from the `is_active_user` cache, e.g. after the
+      account was verified, deactivated or deleted """
+    user_id = str(user_id)
+    active_user_cache.pop(user_id)
+    if active_user_redis is not None:
+        try:
+            await active_user_redis.delete(f"isactive:{user_id}")
+        except Exception as e:
+            logging.error(e)
+
+
 def create_access_token(data: dict,
                         expires_delta: Optional[timedelta] = None):
     """ Create a serialized JSON Web Token (JWT) as Access Token
@@ -209,7 +241,9 @@ def create_access_token(data: dict,
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           pool: AsyncConnectionPool = Depends(get_pool)
+                           ) -> str:
     """Get meta information about a user
 
     Parameters:
@@ -217,12 +251,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
     token : str
         The decoded access token
 
+    pool : AsyncConnectionPool
+        The connection pool of the authentication database
+
     Global Variables:
     -----------------
         status
         oauth2_scheme
         config_auth_token['SECRET_KEY']
         config_auth_token['ALGORITHM']
+        active_user_cache
 
     Return:
     -------
@@ -248,8 +286,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
         raise credentials_exception
 
     # check if the token's user_id exists in the PSQL DB (isactive)
-    db = PsqlDb(config_auth_psql)
-    if db.is_active_user(user_id):
+    db = PsqlDb(pool)
+    if await is_active_user_cached(db, user_id):
         return user_id
 
     # otherwise
@@ -257,7 +295,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
 
 
 @router.post("/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
+async def login(request: fastapi.Request,
+                form_data: OAuth2PasswordRequestForm = Depends(),
+                pool: AsyncConnectionPool = Depends(get_pool)) -> dict:
     """ Process login data
 
     Parameters:
@@ -276,11 +316,23 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
         -H "accept: application/json" \
         -H "Content-Type: application/x-www-form-urlencoded" \
         -d "username=${EMAIL}&password=${PASSWORD}" > mytokendata
+
+    Notes:
+    ------
+    - Too many attempts per client IP or account are rejected with 429,
+        and the concurrent password checks are capped (see
+        `app/ratelimit.py`).
     """
+    # throttle bursts of login attempts
+    throttle(ip_buckets, client_ip(request))
+    throttle(account_buckets, form_data.username.strip().lower())
+
     # validate email/password in PSQL DB
-    db = PsqlDb(config_auth_psql)
-    # validate email/password
-    user_id = db.validate_user(form_data.username, form_data.password)
+    db = PsqlDb(pool)
+    # validate email/password (bcrypt in Postgres)
+    async with password_checks.slot():
+        user_id = await db.validate_user(
+            form_data.username, form_data.password)
 
     # throw an exception
     if user_id is None:
@@ -300,14 +352,21 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
 
 
 @router.post("/register")
-async def register(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
+async def register(request: fastapi.Request,
+                   form_data: OAuth2PasswordRequestForm = Depends(),
+                   pool: AsyncConnectionPool = Depends(get_pool)) -> dict:
+    # throttle bursts of sign-ups
+    throttle(ip_buckets, client_ip(request))
+
     # validate email/password in PSQL DB
-    db = PsqlDb(config_auth_psql)
+    db = PsqlDb(pool)
 
-    # add new email/password based account
-    user_id = db.add_new_email_account(form_data.username, form_data.password)
+    # add new email/password based account (bcrypt in Postgres)
+    async with password_checks.slot():
+        user_id = await db.add_new_email_account(
+            form_data.username, form_data.password)
     # create a verification token
-    verify_token = db.issue_verification_token(user_id)
+    verify_token = await db.issue_verification_token(user_id)
 
     if verify_token is None:
         return {"status": "failed", "msg": "Cannot create token."}
@@ -320,38 +379,36 @@ async def register(form_data: OAuth2PasswordRequestForm = Depends()) -> dict:
     msg['From'] = cfg_mailer["FROM_EMAIL"]
     msg['To'] = form_data.username   # Is the Email
 
-    # Send Verification Mail
-    with smtplib.SMTP(cfg_mailer["SMTP_SERVER"],
-                      cfg_mailer["SMTP_PORT"]) as server:
-        if cfg_mailer["SMTP_TLS"]:
-            server.starttls()
-        if cfg_mailer["SMTP_USER"] and cfg_mailer["SMTP_PASSWORD"]:
-            server.login(cfg_mailer["SMTP_USER"], cfg_mailer["SMTP_PASSWORD"])
-        server.send_message(msg)
+    # Send Verification Mail (in the background, see `app/mailer.py`)
+    if not queue_mail(msg):
+        return {"status": "failed", "msg": "Cannot send verification mail."}
 
     return {"status": "sucess", "msg": "Verfication mail sent."}
 
 
 @router.get("/verify/{verify_token}")
-async def verify(verify_token: uuid.UUID) -> dict:
+async def verify(verify_token: uuid.UUID,
+                 pool: AsyncConnectionPool = Depends(get_pool)) -> dict:
     # validate email/password in PSQL DB
-    db = PsqlDb(config_auth_psql)
+    db = PsqlDb(pool)
     # check v. token
-    user_id = db.check_verification_token(verify_token)
+    user_id = await db.check_verification_token(verify_token)
     # return the result
     if user_id is None:
         return {"status": "failed", "msg": "Invalid verification token."}
     else:
+        await invalidate_active_user(user_id)
         return {"status": "success", "msg": "New account verified."}
 
 
 # Requires: TOKEN_EXPIRY, authenticate_user
 @router.post("/google-signin")
-async def google_signin(params: GapiUserMeta) -> dict:
+async def google_signin(params: GapiUserMeta,
+                        pool: AsyncConnectionPool = Depends(get_pool)) -> dict:
     # validate email/password in PSQL DB
-    db = PsqlDb(config_auth_psql)
+    db = PsqlDb(pool)
     # validate email/password
-    user_id = db.upsert_google_signin(params.gid, params.email)
+    user_id = await db.upsert_google_signin(params.gid, params.email)
 
     # throw an exception
     if user_id is None:
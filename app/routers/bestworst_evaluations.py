@@ -2,13 +2,18 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Any
 from .auth_email import get_current_user
 
-from ..cqlconn import CqlConn
+from ..cqlconn import get_session
 import cassandra as cas
+from cassandra.cluster import Session
+from ..writes import store_rows
 import cassandra.query
+import logging
 import uuid
-import gc
 import json
 
+# start logger
+logger = logging.getLogger(__name__)
+
 
 # Summary
 #   GET     n.a.
@@ -19,14 +24,10 @@ import json
 router = APIRouter()
 
 
-# connect to Cassandra DB
-conn = CqlConn()
-session = conn.get_session()
-
-
 @router.post("")
 async def save_evaluated_examplesets(data: List[Any],
-                                     user_id: str = Depends(get_current_user)
+                                     user_id: str = Depends(get_current_user),
+                                     session: Session = Depends(get_session)
                                      ) -> dict:
     """Save evaluated example sets to database
 
@@ -60,26 +61,15 @@ async def save_evaluated_examplesets(data: List[Any],
         expected that the WebApp sends the data as it should be stored in
         the database.
     - How to JSON: https://www.psycopg.org/docs/extras.html#json-adaptation
+    - The response lists the set IDs that were stored ("stored-setids"),
+        and that were not stored ("failed-setids"), see `app/writes.py`.
+        Example sets that exist already count as stored.
     """
-    try:
-        # prepare insert statement
-        stmt = session.prepare("""
-        INSERT INTO evidence.evaluated_bestworst
-        (set_id, user_id, ui_name,
-        headword, event_history, state_sentid_map, tracking_data)
-        VALUES (?, ?, ?, ?, ?, ?, ?) IF NOT EXISTS;
-        """)
-
-        # init batch statements
-        headwords = set([exset['headword'] for exset in data])
-        batch_stmts = {}
-        for headword in headwords:
-            batch_stmts[headword] = cas.query.BatchStatement(
-                consistency_level=cas.query.ConsistencyLevel.ANY)
-
-        # read data and add to batch statement
-        for exset in data:
-            batch_stmts[exset['headword']].add(stmt, [
+    # read data (invalid example sets are not stored)
+    rows, failed_setids = [], []
+    for exset in data:
+        try:
+            rows.append((exset['set-id'], exset['headword'], [
                 uuid.UUID(exset['set-id']),
                 uuid.UUID(user_id),
                 exset['ui-name'],
@@ -87,20 +77,24 @@ async def save_evaluated_examplesets(data: List[Any],
                 json.dumps(exset['event-history']),
                 json.dumps(exset['state-sentid-map']),
                 json.dumps(exset['tracking-data'])
-            ])
-        # excute statments
-        for headword in headwords:
-            session.execute_async(batch_stmts[headword])
+            ]))
+        except Exception as err:
+            logger.error(f"Invalid example set: {err}")
+            failed_setids.append(
+                exset.get('set-id') if isinstance(exset, dict) else None)
 
-        # confirm setIDs for deletion within the app
-        stored_setids = [exset['set-id'] for exset in data]
-        flag = True
+    # write and await the batches (or queue the rows, see `store_rows`)
+    try:
+        stored = await store_rows(session, "insert_evaluated_bestworst", rows)
     except Exception as err:
-        print(err)
-        stored_setids = []
-        flag = False
-    finally:
-        gc.collect()
-        return {
-            'status': 'success' if flag else 'failed',
-            'stored-setids': stored_setids}
+        logger.error(err)
+        stored = {setid: False for setid, _, _ in rows}
+
+    # confirm setIDs for deletion within the app
+    stored_setids = [setid for setid, flag in stored.items() if flag]
+    failed_setids += [setid for setid, flag in stored.items() if not flag]
+    return {
+        'status': ('success' if len(failed_setids) == 0
+                   else 'partial' if len(stored_setids) > 0 else 'failed'),
+        'stored-setids': stored_setids,
+        'failed-setids': failed_setids}
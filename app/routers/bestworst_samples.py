@@ -1,11 +1,14 @@
-from fastapi import APIRouter
-from ..cqlconn import CqlConn
+from fastapi import APIRouter, Depends
+from ..cqlconn import get_session
 import cassandra as cas
-import gc
+from cassandra.cluster import Session
 import uuid
 import bwsample as bws
 import logging
-from ..transform import i2f
+from ..partitions import get_top_rows, get_row_features, dedup_rows
+from ..wire import negotiate, binary_response, MEDIA_JSON
+from ..batch import read_headwords, map_headwords, batch_response
+from ..dedup import read_dedup
 
 # start logger
 logger = logging.getLogger(__name__)
@@ -18,17 +21,14 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-# connect to Cassandra DB
-conn = CqlConn()
-session = conn.get_session()
-
-
 @router.post("/{n_sentences}/{n_examplesets}/{n_top}/{n_offset}")
 async def get_bestworst_example_sets(n_sentences: int,
                                      n_examplesets: int,
                                      n_top: int,
                                      n_offset: int,
-                                     params: dict):
+                                     params: dict,
+                                     session: Session = Depends(get_session),
+                                     media: str = Depends(negotiate)):
     """ Query sentence examples with the top N scores (or with offset)
       and sample BWS sets from it.
 
@@ -47,7 +47,16 @@ async def get_bestworst_example_sets(n_sentences: int,
         Query for the 1+offset to N+offset scores
 
     params : dict
-        Payload as json. `params['headword'] : str` is expected
+        Payload as json. `params['headword'] : str` is expected.
+          Set `params['dedup'] : bool` to drop near-duplicates, and
+          optionally `params['dedup_threshold'] : float` (see
+          `app/dedup.py`).
+
+    media : str
+        The response format requested with the `Accept` header. The
+          features are sent as one float32 matrix "features" if a binary
+          format is requested (see `app/wire.py`). Each example has a
+          "feature-index" into this matrix instead of "features".
 
     Usage:
     ------
@@ -69,74 +78,137 @@ async def get_bestworst_example_sets(n_sentences: int,
         return {"status": "failed", "num": 0,
                 "msg": f"No headword='{headword}' provided"}
 
-    # query database for example items
     try:
-        # prepare statement to download the whole partion
-        stmt = cas.query.SimpleStatement(f"""
-            SELECT headword, example_id, sentence, sent_id
-                 , spans, annot, biblio, license, score
-                 , feats1
-                 , feats2, feats3, feats4, feats5
-                 , feats6, feats7, feats8, feats9
-                 , feats12, feats13, feats14
-            FROM {session.keyspace}.tbl_features
-            WHERE headword='{headword}';
-            """, fetch_size=5000)
-
-        # fetch partition
-        dat = session.execute(stmt)
-        # read data to list of json
-        items = []
-        feats = [[] for i in range(12)]
-        for row in dat:
-            feats[0].append(row.feats1)
-            feats[1].append(row.feats2)
-            feats[2].append(row.feats3)
-            feats[3].append(row.feats4)
-            feats[4].append(row.feats5)
-            feats[5].append(row.feats6)
-            feats[6].append(row.feats7)
-            feats[7].append(row.feats8)
-            feats[8].append(row.feats9)
-            feats[9].append(row.feats12)
-            feats[10].append(row.feats13)
-            feats[11].append(row.feats14)
-            items.append({
-                "example_id": str(row.example_id),
-                "text": row.sentence,
-                "headword": row.headword,
-                "spans": row.spans,
-                "context": {
-                    "license": row.license,
-                    "sentence_id": str(row.sent_id)},
-                "score": row.score
-            })
-        feats = i2f(*feats)
-        feats = feats.tolist()
-        for i, feat in enumerate(feats):
-            items[i]["features"] = feat
+        dedup = read_dedup(params)
+    except ValueError as err:
+        return {"status": "failed", "num": 0, "msg": str(err)}
+
+    result = await sample_example_sets(
+        session, headword, n_sentences, n_top, n_offset, media, **dedup)
+    if result["status"] != "success":
+        return result
+
+    if media != MEDIA_JSON:
+        return binary_response(
+            result["data"], {"features": result["features"]}, media)
+    return result["data"]
+
+    # Add this somewhere!
+    # int(n_examplesets * n_sentences * 1.5)
 
+
+@router.post("/batch/{n_sentences}/{n_examplesets}/{n_top}/{n_offset}")
+async def get_bestworst_example_sets_batch(n_sentences: int,
+                                           n_examplesets: int,
+                                           n_top: int,
+                                           n_offset: int,
+                                           params: dict,
+                                           session: Session = Depends(
+                                               get_session),
+                                           media: str = Depends(negotiate)):
+    """ Sample BWS sets for several headwords (see
+      `get_bestworst_example_sets` and `app/batch.py`)
+
+    Parameters:
+    -----------
+    params : dict
+        Payload as json. `params['headwords'] : List[str]` is expected
+
+    Examples:
+    ---------
+        TOKEN="..."
+        curl -X POST \
+            "http://localhost:55017/v1/bestworst/samples/batch/4/3/100/0" \
+            -H  "accept: application/json" \
+            -H "Content-Type: application/json" \
+            -H "Authorization: Bearer ${TOKEN}" \
+            -d '{"headwords": ["Fahrrad", "Internet"]}'
+    """
+    try:
+        headwords = read_headwords(params)
+        dedup = read_dedup(params)
+    except ValueError as err:
+        return {"status": "failed", "msg": str(err)}
+
+    results = await map_headwords(
+        lambda headword: sample_example_sets(
+            session, headword, n_sentences, n_top, n_offset, media, **dedup),
+        headwords)
+    return batch_response(headwords, results, media)
+
+
+async def sample_example_sets(session: Session,
+                              headword: str,
+                              n_sentences: int,
+                              n_top: int,
+                              n_offset: int,
+                              media: str,
+                              dedup: bool = False,
+                              dedup_threshold: float = None) -> dict:
+    """ Query the sentence examples of a headword and sample BWS sets
+
+    Parameters:
+    -----------
+    dedup : bool
+        Drop near-duplicates (`hashes16`) before sampling, i.e. keep the
+          example with the largest score (see `app/dedup.py`)
+    dedup_threshold : float
+        Min. share of equal hashes of duplicates (Default: DEDUP_THRESHOLD)
+
+    Return:
+    -------
+    dict
+        {"status": "success", "data": example_sets, "features": feats},
+          or {"status": "failed", "msg": ...}
+    """
+    # query database for example items
+    try:
+        # read the light-weight columns of the `n_offset + n_top` examples
+        #  with the largest scores (sorted by score)
+        rows = await get_top_rows(session, headword, n_offset + n_top)
+        # skip the n_offset largest scores, and keep the next n_top
+        if len(rows) > n_sentences:
+            if (len(rows) > n_offset) and (n_offset > 0):
+                rows = rows[n_offset:]
+            rows = rows[:n_top]
+        # drop near-duplicates
+        if dedup:
+            rows = await dedup_rows(session, headword, rows, dedup_threshold)
+        # read and decode the features of the remaining sentences only
+        rows, feats = await get_row_features(session, headword, rows)
     except cas.ReadTimeout as err:
         logger.error(f"Read Timeout problems with '{headword}': {err}")
-        return {"status": "failed", "msg": err}
+        return {"status": "failed", "msg": str(err)}
     except Exception as err:
         logger.error(f"Unknown problems with '{headword}': {err}")
-        return {"status": "failed", "msg": err}
-    finally:
-        gc.collect()
-
-    # sort by largest score n_top, n_offset
-    if len(items) > n_sentences:
-        items = sorted(items, key=lambda x: x["score"], reverse=True)
-        if (len(items) > n_offset) and (n_offset > 0):
-            items = items[n_offset:]
-        if len(items) > n_top:
-            items = items[:n_top]
+        return {"status": "failed", "msg": str(err)}
 
     # abort if less than `n_sentences`
-    if len(items) < n_sentences:
+    if len(rows) < n_sentences:
         return {"status": "failed", "msg": "not enough sentences found."}
 
+    # read data to list of json
+    items = []
+    for row in rows:
+        items.append({
+            "example_id": str(row.example_id),
+            "text": row.sentence,
+            "headword": row.headword,
+            "spans": row.spans,
+            "context": {
+                "license": row.license,
+                "sentence_id": str(row.sent_id)},
+            "score": row.score
+        })
+
+    # add the features
+    if media == MEDIA_JSON:
+        for item, feat in zip(items, feats.tolist()):
+            item["features"] = feat
+    else:
+        for i, item in enumerate(items):
+            item["feature-index"] = i  # row in the "features" array
+
     # Sample overlapping example sets, each shuffled
     # - see https://github.com/satzbeleg/bwsample#sampling
     sampled_sets = bws.sample(
@@ -151,7 +223,4 @@ async def get_bestworst_example_sets(n_sentences: int,
             "examples": bwset
         })
 
-    return example_sets
-
-    # Add this somewhere!
-    # int(n_examplesets * n_sentences * 1.5)
+    return {"status": "success", "data": example_sets, "features": feats}
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+from typing import List, Dict, Any
 from .auth_email import get_current_user
-from ..cqlconn import CqlConn
+from ..cqlconn import get_session
 import cassandra as cas
+from cassandra.cluster import Session
+from ..writes import store_rows
 import cassandra.query
-import gc
 import logging
 import uuid
 
@@ -14,34 +15,32 @@ logger = logging.getLogger(__name__)
 # POST /interactivity/deleted-episodes with params
 router = APIRouter()
 
-# connect to Cassandra DB
-conn = CqlConn()
-session = conn.get_session()
-
 
 @router.post("")
-async def save_deleted_episodes(data: Dict[str, Any],
-                                user_id: str = Depends(get_current_user)
+async def save_deleted_episodes(data: List[Dict[str, Any]],
+                                user_id: str = Depends(get_current_user),
+                                session: Session = Depends(get_session)
                                 ) -> dict:
-    try:
-        # prepare insert statement
-        stmt = session.prepare("""
-        INSERT INTO evidence.interactivity_convergence
-        (episode_id, training_score_history, model_score_history, displayed,
-         user_id, sentence_text, headword)
-        VALUES (?, ?, ?, ?, ?, ?, ?) IF NOT EXISTS;
-        """)
+    """ Save the convergence data of deleted training examples
 
-        # init batch statements
-        headwords = set([episode['headword'] for episode in data])
-        batch_stmts = {}
-        for headword in headwords:
-            batch_stmts[headword] = cas.query.BatchStatement(
-                consistency_level=cas.query.ConsistencyLevel.ANY)
+    Parameters:
+    -----------
+    data: List[Dict[str, Any]]
+        The episodes with the keys "example-id", "headword",
+          "sentence-text", "training-score-history",
+          "model-score-history" and "displayed"
 
-        # read data and add to batch statement
-        for episode in data:
-            batch_stmts[episode['headword']].add(stmt, [
+    Return:
+    -------
+    dict
+        The example IDs that were stored ("stored-example-ids") and that
+          were not stored ("failed-example-ids"), see `app/writes.py`.
+    """
+    # read data (invalid episodes are not stored)
+    rows, failed_example_ids = [], []
+    for episode in data:
+        try:
+            rows.append((episode['example-id'], episode['headword'], [
                 uuid.uuid4(),  # episode_id
                 episode['training-score-history'],
                 episode['model-score-history'],
@@ -49,21 +48,27 @@ async def save_deleted_episodes(data: Dict[str, Any],
                 uuid.UUID(user_id),
                 episode['sentence-text'],
                 episode['headword']
-            ])
-
-        # excute statments
-        for headword in headwords:
-            session.execute_async(batch_stmts[headword])
+            ]))
+        except Exception as err:
+            logger.error(f"Invalid episode: {err}")
+            failed_example_ids.append(
+                episode.get('example-id') if isinstance(episode, dict)
+                else None)
 
-        # confirm exampleIDs for deletion within the app
-        stored_example_ids = [episode['example-id'] for episode in data]
-        flag = True
+    # write and await the batches (or queue the rows, see `store_rows`)
+    try:
+        stored = await store_rows(
+            session, "insert_interactivity_convergence", rows)
     except Exception as err:
         logger.error(err)
-        flag = False
-        stored_example_ids = []
-    finally:
-        gc.collect()
-        return {
-            'status': 'success' if flag else 'failed',
-            'stored-example-ids': stored_example_ids}
+        stored = {example_id: False for example_id, _, _ in rows}
+
+    # confirm exampleIDs for deletion within the app
+    stored_example_ids = [k for k, flag in stored.items() if flag]
+    failed_example_ids += [k for k, flag in stored.items() if not flag]
+    return {
+        'status': ('success' if len(failed_example_ids) == 0
+                   else 'partial' if len(stored_example_ids) > 0
+                   else 'failed'),
+        'stored-example-ids': stored_example_ids,
+        'failed-example-ids': failed_example_ids}
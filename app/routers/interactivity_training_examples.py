@@ -1,10 +1,13 @@
-from fastapi import APIRouter
-from ..cqlconn import CqlConn
+from fastapi import APIRouter, Depends
+from ..cqlconn import get_session
 import cassandra as cas
-import gc
+from cassandra.cluster import Session
 import logging
 import numpy as np
-from ..transform import i2f
+from ..partitions import get_top_rows, get_row_features, dedup_rows
+from ..wire import negotiate, binary_response, MEDIA_JSON
+from ..batch import read_headwords, map_headwords, batch_response
+from ..dedup import read_dedup
 
 # start logger
 logger = logging.getLogger(__name__)
@@ -12,92 +15,140 @@ logger = logging.getLogger(__name__)
 # POST /interactivity/training-examples/{n_top}/{n_offset}
 router = APIRouter()
 
-# connect to Cassandra DB
-conn = CqlConn()
-session = conn.get_session()
-
 
 @router.post("/{n_examples}/{n_top}/{n_offset}")
 async def get_examples_with_features(n_examples: int,
                                      n_top: int,
                                      n_offset: int,
-                                     params: dict) -> list:
+                                     params: dict,
+                                     session: Session = Depends(get_session),
+                                     media: str = Depends(negotiate)
+                                     ) -> list:
     # read the headword key value
     headword = params.get('headword')
     if headword is None:
         return {"status": "failed", "num": 0,
                 "msg": f"No headword='{headword}' provided"}
 
-    # query database for example items
     try:
-        # prepare statement to download the whole partion
-        stmt = cas.query.SimpleStatement(f"""
-            SELECT headword, example_id, sentence, sent_id
-                 , spans, annot, biblio, license, score
-                 , feats1
-                 , feats2, feats3, feats4, feats5
-                 , feats6, feats7, feats8, feats9
-                 , feats12, feats13, feats14
-            FROM {session.keyspace}.tbl_features
-            WHERE headword='{headword}';
-            """, fetch_size=5000)
-
-        # fetch partition
-        dat = session.execute(stmt)
-        # read data to list of json
-        items = []
-        feats = [[] for i in range(12)]
-        for row in dat:
-            feats[0].append(row.feats1)
-            feats[1].append(row.feats2)
-            feats[2].append(row.feats3)
-            feats[3].append(row.feats4)
-            feats[4].append(row.feats5)
-            feats[5].append(row.feats6)
-            feats[6].append(row.feats7)
-            feats[7].append(row.feats8)
-            feats[8].append(row.feats9)
-            feats[9].append(row.feats12)
-            feats[10].append(row.feats13)
-            feats[11].append(row.feats14)
-            items.append({
-                "example_id": str(row.example_id),
-                "text": row.sentence,
-                "headword": row.headword,
-                "spans": row.spans,
-                "context": {
-                    "license": row.license,
-                    "biblio": row.biblio,
-                    "sentence_id": str(row.sent_id)},
-                "score": row.score
-            })
-        feats = i2f(*feats)
-        feats = feats.tolist()
-        for i, feat in enumerate(feats):
-            items[i]["features"] = feat
+        dedup = read_dedup(params)
+    except ValueError as err:
+        return {"status": "failed", "num": 0, "msg": str(err)}
+
+    result = await sample_training_examples(
+        session, headword, n_examples, n_top, n_offset, media, **dedup)
+    if result["status"] != "success":
+        return result
+
+    if media != MEDIA_JSON:
+        return binary_response(
+            result["data"], {"features": result["features"]}, media)
+    return result["data"]
+
+
+@router.post("/batch/{n_examples}/{n_top}/{n_offset}")
+async def get_examples_with_features_batch(n_examples: int,
+                                           n_top: int,
+                                           n_offset: int,
+                                           params: dict,
+                                           session: Session = Depends(
+                                               get_session),
+                                           media: str = Depends(negotiate)):
+    """ Sample training examples for several headwords (see
+      `get_examples_with_features` and `app/batch.py`)
+
+    Parameters:
+    -----------
+    params : dict
+        Payload as json. `params['headwords'] : List[str]` is expected
+    """
+    try:
+        headwords = read_headwords(params)
+        dedup = read_dedup(params)
+    except ValueError as err:
+        return {"status": "failed", "msg": str(err)}
 
+    results = await map_headwords(
+        lambda headword: sample_training_examples(
+            session, headword, n_examples, n_top, n_offset, media, **dedup),
+        headwords)
+    return batch_response(headwords, results, media)
+
+
+async def sample_training_examples(session: Session,
+                                   headword: str,
+                                   n_examples: int,
+                                   n_top: int,
+                                   n_offset: int,
+                                   media: str,
+                                   dedup: bool = False,
+                                   dedup_threshold: float = None) -> dict:
+    """ Randomly sample sentence examples of a headword with features
+
+    Parameters:
+    -----------
+    dedup : bool
+        Drop near-duplicates (`hashes16`) before sampling, i.e. keep the
+          example with the largest score (see `app/dedup.py`)
+    dedup_threshold : float
+        Min. share of equal hashes of duplicates (Default: DEDUP_THRESHOLD)
+
+    Return:
+    -------
+    dict
+        {"status": "success", "data": items, "features": feats},
+          or {"status": "failed", "msg": ...}
+    """
+    # query database for example items
+    try:
+        # read the light-weight columns of the `n_offset + n_top` examples
+        #  with the largest scores (sorted by score)
+        rows = await get_top_rows(session, headword, n_offset + n_top)
+        # skip the n_offset largest scores, and keep the next n_top
+        if len(rows) > n_examples:
+            if (len(rows) > n_offset) and (n_offset > 0):
+                rows = rows[n_offset:]
+            rows = rows[:n_top]
+        # drop near-duplicates
+        if dedup:
+            rows = await dedup_rows(session, headword, rows, dedup_threshold)
+        # randomly sample items
+        rowidx = np.random.choice(
+            len(rows), min(len(rows), n_examples), replace=False)
+        rows = [rows[i] for i in rowidx]
+        # read and decode the features of the sampled sentences only
+        rows, feats = await get_row_features(session, headword, rows)
     except cas.ReadTimeout as err:
         logger.error(f"Read Timeout problems with '{headword}': {err}")
-        return {"status": "failed", "msg": err}
+        return {"status": "failed", "msg": str(err)}
     except Exception as err:
         logger.error(f"Unknown problems with '{headword}': {err}")
-        return {"status": "failed", "msg": err}
-    finally:
-        gc.collect()
-
-    # sort by largest score n_top, n_offset
-    if len(items) > n_examples:
-        items = sorted(items, key=lambda x: x["score"], reverse=True)
-        if (len(items) > n_offset) and (n_offset > 0):
-            items = items[n_offset:]
-        if len(items) > n_top:
-            items = items[:n_top]
+        return {"status": "failed", "msg": str(err)}
 
     # abort if no query results
-    if len(items) == 0:
+    if len(rows) == 0:
         return {"status": "failed", "msg": "no sentences found."}
 
-    # randomly sample items
-    return np.random.choice(
-        items, min(len(items), n_examples),
-        replace=False).tolist()
+    # read data to list of json
+    items = []
+    for row in rows:
+        items.append({
+            "example_id": str(row.example_id),
+            "text": row.sentence,
+            "headword": row.headword,
+            "spans": row.spans,
+            "context": {
+                "license": row.license,
+                "biblio": row.biblio,
+                "sentence_id": str(row.sent_id)},
+            "score": row.score
+        })
+
+    # add the features of the sampled sentences
+    if media != MEDIA_JSON:
+        for i, item in enumerate(items):
+            item["feature-index"] = i  # row in the "features" array
+    else:
+        for item, feat in zip(items, feats.tolist()):
+            item["features"] = feat
+    return {"status": "success", "data": items, "features": feats}
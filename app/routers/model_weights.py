@@ -1,11 +1,21 @@
 from fastapi import APIRouter, Depends
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .auth_email import get_current_user
 
-from ..cqlconn import CqlConn
+from ..cqlconn import get_session, aexecute, aexecute_all
 import cassandra as cas
+from cassandra.cluster import Session
+from ..statements import prepared
+from ..config import config_model_weights
+from ..weights import (
+    encode_weights, read_weights, read_weights_arrays, weights_info)
+from ..cursors import encode_cursor, decode_cursor, InvalidCursor
+from ..partitions import get_partition
+from ..scoring import get_scorer, ACTIVATIONS
+from ..executors import run_cpu
+import numpy as np
+from ..wire import negotiate, binary_response, MEDIA_JSON
 import cassandra.query
-import gc
 import logging
 import datetime
 import uuid
@@ -18,98 +28,253 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-# connect to Cassandra DB
-conn = CqlConn()
-session = conn.get_session()
-
-
 @router.post("/save")
 async def save_model_weights(data: Dict[str, Any],
-                             user_id: str = Depends(get_current_user)
+                             user_id: str = Depends(get_current_user),
+                             session: Session = Depends(get_session)
                              ) -> dict:
+    """ Save the TFJS model weights of the user
+
+    Parameters:
+    -----------
+    data: Dict[str, Any]
+        'weights' : list
+            The model weights
+        'activation' : str
+            The activation of the hidden layers, e.g. "relu" (see
+              `app/scoring.py:ACTIVATIONS`). Required to score with
+              multi-layer weights (see `/score`).
+
+    Notes:
+    ------
+    - Numeric weights are stored as binary blob with a manifest (see
+        `app/weights.py`). Other weights are stored as JSON text.
+    - Older snapshots are deleted if MODEL_WEIGHTS_KEEP_LAST is set, and
+        expire after MODEL_WEIGHTS_TTL seconds if set.
+    """
+    activation = data.get("activation")
+    if activation is not None and activation not in ACTIVATIONS:
+        return {'status': 'failed',
+                'msg': f"Unknown activation '{activation}'"}
+
     try:
-        # prepare insert statement
-        stmt = session.prepare(f"""
-        INSERT INTO {session.keyspace}.model_weights
-        (user_id, updated_at, weights)
-        VALUES (?, ?, ?) IF NOT EXISTS;
-        """)
-
-        print(data['weights'], type(data['weights']))
-
-        # init batch statements
-        res = session.execute(stmt, [
-            uuid.UUID(user_id), 
-            datetime.datetime.now(), 
-            json.dumps(data['weights'])
-        ])
+        try:
+            blob, manifest = encode_weights(
+                data['weights'],
+                dtype=config_model_weights["DTYPE"],
+                compress=config_model_weights["COMPRESS"],
+                activation=activation)
+            stmt = prepared(session, "insert_model_weights_blob")
+            values = [blob, manifest, len(blob)]
+        except ValueError:
+            stmt = prepared(session, "insert_model_weights")
+            weights = json.dumps(data['weights'])
+            values = [weights, len(weights.encode("utf-8"))]
+
+        res = await aexecute(session, stmt, [
+            uuid.UUID(user_id),
+            datetime.datetime.now()
+        ] + values + [config_model_weights["TTL"]])
         flag = res[0].applied
+        if flag:
+            await prune_model_weights(session, uuid.UUID(user_id))
     except Exception as err:
         logger.error(err)
         flag = False
     finally:
-        gc.collect()
         return {'status': 'success' if flag else 'failed'}
 
 
+async def prune_model_weights(session: Session,
+                              user_id: uuid.UUID) -> None:
+    """ Delete all but the last MODEL_WEIGHTS_KEEP_LAST snapshots
+
+    Notes:
+    ------
+    - One range tombstone per save, i.e. the partition doesn't grow, and
+        reads don't skip over a tombstone per deleted snapshot.
+    """
+    keep_last = config_model_weights["KEEP_LAST"]
+    if keep_last <= 0:
+        return
+    res = await aexecute(
+        session, prepared(session, "select_model_weights_timestamps"),
+        [user_id, keep_last])
+    rows = res.current_rows
+    if len(rows) == keep_last:
+        await aexecute(
+            session, prepared(session, "delete_model_weights_before"),
+            [user_id, rows[-1].updated_at])
+
+
+def weights_response(row, media: str) -> Any:
+    """ The response of a `model_weights` row (see `/load`) """
+    # send the tensors as typed arrays
+    if media != MEDIA_JSON:
+        try:
+            meta, arrays = read_weights_arrays(row)
+            return binary_response({
+                'status': 'success',
+                'timestamp': row.updated_at.isoformat(),
+                'weights': meta
+            }, {name: arr for name, arr in zip(meta["tensors"], arrays)},
+                media)
+        except ValueError:
+            pass  # old JSON weights that are no tensors
+
+    # done
+    return {
+        'status': 'success',
+        'timestamp': row.updated_at,
+        'weights': read_weights(row)
+    }
+
+
 @router.post("/load")
-async def load_model_weights(user_id: str = Depends(get_current_user)
+async def load_model_weights(user_id: str = Depends(get_current_user),
+                             session: Session = Depends(get_session),
+                             media: str = Depends(negotiate)
                              ) -> dict:
+    """ Load the latest TFJS model weights of the user
+
+    Parameters:
+    -----------
+    media : str
+        The response format requested with the `Accept` header. The
+          tensors are sent as float32 arrays "weights-0", "weights-1", ...
+          if a binary format is requested (see `app/wire.py`).
+    """
     try:
         # prepare statement
-        stmt = cas.query.SimpleStatement(f"""
-            SELECT updated_at, weights
-            FROM {session.keyspace}.model_weights
-            WHERE user_id=%s LIMIT 1;
-            """)
+        stmt = prepared(session, "select_model_weights_latest")
         # find last model weights
-        timestamp, weights = None, None
-        for row in session.execute(stmt, [uuid.UUID(user_id)]):
-            timestamp = row.updated_at
-            weights = json.loads(row.weights)
-            break
-        # delete
-        del stmt
-        gc.collect()
+        res = await aexecute(session, stmt, [uuid.UUID(user_id)])
+        row = res.current_rows[0] if res.current_rows else None
     except Exception as err:
         logger.error(err)
-        gc.collect()
         return {"status": "failed"}
 
-    if weights is None:
+    if row is None:
         return {"status": "no-data"}
+    return weights_response(row, media)
 
-    # done
+
+@router.post("/load-at")
+async def load_model_weights_at(params: Dict[str, Any],
+                                user_id: str = Depends(get_current_user),
+                                session: Session = Depends(get_session),
+                                media: str = Depends(negotiate)
+                                ) -> dict:
+    """ Load the TFJS model weights of the user saved at a timestamp
+
+    Parameters:
+    -----------
+    params: Dict[str, Any]
+        'timestamp' : str
+            The ISO timestamp of the snapshot, i.e. "updated_at" in the
+              response of `/list`
+
+    media : str
+        The response format, see `/load`
+    """
+    try:
+        timestamp = datetime.datetime.fromisoformat(
+            str(params.get("timestamp")).replace("Z", "+00:00"))
+    except ValueError:
+        return {"status": "failed", "msg": "No valid timestamp provided"}
+
+    try:
+        stmt = prepared(session, "select_model_weights_at")
+        res = await aexecute(session, stmt, [uuid.UUID(user_id), timestamp])
+        row = res.current_rows[0] if res.current_rows else None
+    except Exception as err:
+        logger.error(err)
+        return {"status": "failed"}
+
+    if row is None:
+        return {"status": "no-data"}
+    return weights_response(row, media)
+
+
+@router.post("/list")
+async def list_model_weights(params: Optional[Dict[str, Any]] = None,
+                             user_id: str = Depends(get_current_user),
+                             session: Session = Depends(get_session)
+                             ) -> dict:
+    """ List the saved snapshots of the user (without the weights)
+
+    Parameters:
+    -----------
+    params: Dict[str, Any]
+        'limit' : int
+            Maximum number of snapshots per page (Default:
+              MODEL_WEIGHTS_LIST_LIMIT)
+        'cursor' : str
+            The "cursor" of the previous response to retrieve the next
+              page. The first page is returned without cursor.
+
+    Return:
+    -------
+    dict
+        "data" with "updated_at", "nbytes", "format", ... of each snapshot
+          (latest first), and the "cursor" of the next page (None after the
+          last page), see `app/cursors.py`.
+    """
+    params = params or {}
+    try:
+        paging_state = decode_cursor(
+            params.get("cursor"), user=user_id, list="model_weights")
+    except InvalidCursor as err:
+        return {"status": "failed", "num": 0, "msg": str(err)}
+
+    try:
+        stmt = prepared(session, "select_model_weights_list").bind(
+            [uuid.UUID(user_id)])
+        stmt.fetch_size = int(params.get(
+            "limit", config_model_weights["LIST_LIMIT"]))
+        res = await aexecute(session, stmt, paging_state=paging_state)
+        data = [weights_info(row) for row in res.current_rows]
+        cursor = encode_cursor(
+            res.paging_state, user=user_id, list="model_weights")
+    except Exception as err:
+        logger.error(err)
+        return {"status": "failed", "num": 0}
+
+    if len(data) == 0:
+        return {"status": "no-data", "num": 0}
     return {
         'status': 'success',
-        'timestamp': timestamp,
-        'weights': weights
+        'num': len(data),
+        'data': data,
+        'cursor': cursor
     }
 
 
 @router.post("/load-all")
-async def load_model_weights(user_id: str = Depends(get_current_user)
-                             ) -> dict:
+async def load_all_model_weights(user_id: str = Depends(get_current_user),
+                                 session: Session = Depends(get_session)
+                                 ) -> dict:
+    """ Load all TFJS model weights of the user
+
+    Notes:
+    ------
+    - The response contains every snapshot. Use `/list` and `/load-at`
+        to page through the snapshots instead.
+    """
     try:
         # prepare statement
-        stmt = cas.query.SimpleStatement(f"""
-            SELECT updated_at, weights
-            FROM {session.keyspace}.model_weights
-            WHERE user_id=%s ;
-            """)
+        stmt = prepared(session, "select_model_weights_all")
         # find last model weights
         results = []
-        for row in session.execute(stmt, [uuid.UUID(user_id)]):
+        for row in await aexecute_all(session, stmt, [uuid.UUID(user_id)]):
             results.append({
-                'updated_at': row.updated_at, 
-                'weights': json.loads(row.weights)
+                'updated_at': row.updated_at,
+                'weights': read_weights(row)
             })
         # delete
         del stmt
-        gc.collect()
     except Exception as err:
         logger.error(err)
-        gc.collect()
         return {"status": "failed"}
 
     if len(results) == 0:
@@ -120,3 +285,81 @@ async def load_model_weights(user_id: str = Depends(get_current_user)
         'status': 'success',
         'data': results
     }
+
+
+@router.post("/score")
+async def score_examples(params: Dict[str, Any],
+                         user_id: str = Depends(get_current_user),
+                         session: Session = Depends(get_session)
+                         ) -> dict:
+    """ Rank the sentence examples of a headword with the user's model
+
+    Parameters:
+    -----------
+    params: Dict[str, Any]
+        'headword' : str
+            The headword
+        'n_top' : int
+            The number of returned sentence examples (Default: 20)
+        'limit' : int
+            Only score the `limit` sentence examples with the largest
+              scores in the database (Default: all sentence examples)
+
+    Return:
+    -------
+    dict
+        "data" with "example_id" and "score" of the `n_top` examples with
+          the largest model scores (sorted), and the "timestamp" of the
+          used model weights.
+
+    Examples:
+    ---------
+    TOKEN="..."
+    curl -X POST "http://localhost:55017/v1/model/score" \
+        -H  "accept: application/json" \
+        -H "Content-Type: application/json" \
+        -H "Authorization: Bearer ${TOKEN}" \
+        -d '{"headword": "Stichwort", "n_top": 10}'
+
+    Notes:
+    ------
+    - The latest model weights (see `/save`) are evaluated on the cached
+        feature matrix of the headword (see `app/scoring.py`), i.e. the
+        features don't need to be downloaded to rank the examples.
+    - Multi-layer weights are only evaluated if they were saved with the
+        activation of the hidden layers (see `/save`).
+    """
+    headword = params.get("headword")
+    if headword is None:
+        return {"status": "failed", "num": 0,
+                "msg": f"No headword='{headword}' provided"}
+
+    try:
+        n_top = int(params.get("n_top", 20))
+        partition = await get_partition(session, headword)
+        if len(partition) == 0:
+            return {"status": "failed", "num": 0,
+                    "msg": "no sentences found."}
+        if params.get("limit") is not None:
+            partition = partition.top(int(params["limit"]))
+        scorer = await get_scorer(
+            session, uuid.UUID(user_id), partition.feats.shape[1])
+        if scorer is None:
+            return {"status": "no-data", "num": 0,
+                    "msg": "No model weights saved"}
+        scores = await run_cpu(scorer, partition.feats)
+    except ValueError as err:
+        return {"status": "failed", "num": 0, "msg": str(err)}
+    except Exception as err:
+        logger.error(f"Unknown problems with '{headword}': {err}")
+        return {"status": "failed", "num": 0, "msg": str(err)}
+
+    idx = np.argsort(-scores, kind="stable")[:n_top]
+    data = [{"example_id": str(partition.rows[i].example_id),
+             "score": float(scores[i])} for i in idx.tolist()]
+    return {
+        'status': 'success',
+        'timestamp': scorer.updated_at,
+        'num': len(data),
+        'data': data
+    }
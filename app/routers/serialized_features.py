@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any
 from .auth_email import get_current_user
 
-from ..cqlconn import CqlConn
+from ..cqlconn import get_session, aexecute
 import cassandra as cas
+from cassandra.cluster import Session
+from ..statements import prepared
+from ..wire import negotiate, binary_response, MEDIA_JSON
+from ..cursors import encode_cursor, decode_cursor, InvalidCursor
 import cassandra.query
-import gc
 import logging
-import time
 import json
+import numpy as np
 
 # start logger
 logger = logging.getLogger(__name__)
@@ -16,30 +20,107 @@ logger = logging.getLogger(__name__)
 # POST /variation/serialized-features
 router = APIRouter()
 
+# Number of rows per CQL page in the streaming mode
+STREAM_FETCH_SIZE = 100
 
-# connect to Cassandra DB
-conn = CqlConn()
-session = conn.get_session()
+# The serialized features and hashes in `tbl_features`
+FEATURE_DTYPES = {
+    "feats1": np.int8, "feats2": np.int8, "feats3": np.int8,
+    "feats4": np.int8, "feats5": np.int16, "feats6": np.int16,
+    "feats7": np.int16, "feats8": np.int8, "feats9": np.int8,
+    "feats12": np.int16, "feats13": np.int8, "feats14": np.int8,
+    "hashes15": np.int32, "hashes16": np.int32, "hashes18": np.int32
+}
 
 
-# Store this in a user session
-paging_states = {}
+def row_to_dict(row, feats: bool = True) -> dict:
+    """ Convert a `select_features` row to a JSON serializable dict
 
+    Parameters:
+    -----------
+    row : cassandra.util.Row
+        A row of the `select_features` query
+    feats : bool (Default: True)
+        Add the serialized features, i.e. the columns of `FEATURE_DTYPES`
+    """
+    example = {
+        "headword": row.headword,
+        "example_id": str(row.example_id),
+        "sentence": row.sentence,
+        "sentence_id": str(row.sent_id),
+        "spans": json.dumps(row.spans),
+        "annot": row.annot,
+        "biblio": row.biblio,
+        "license": row.license,
+        "score": row.score
+    }
+    if feats:
+        for col in FEATURE_DTYPES:
+            example[col] = getattr(row, col)
+    return example
+
+
+def rows_to_arrays(rows: list) -> Dict[str, np.ndarray]:
+    """ Stack the serialized features of all rows as (N, width) arrays """
+    return {
+        col: np.array([getattr(row, col) for row in rows], dtype=dtype)
+        for col, dtype in FEATURE_DTYPES.items()}
+
+
+def stream_examples(session: Session,
+                    headword: str,
+                    user_id: str,
+                    limit: int,
+                    paging_state: bytes):
+    """ Yield the next `limit` examples as NDJSON lines
 
-def delete_old_paging_states():
-    """Delete old paging states"""
-    global paging_states
-    for user_id in list(paging_states):
-        for headword in list(paging_states[user_id]):
-            d = time.time() - paging_states[user_id][headword]['timestamp']
-            if d > 86400:
-                del paging_states[user_id][headword]
-    gc.collect()
+    Notes:
+    ------
+    - The rows are downloaded in pages of `STREAM_FETCH_SIZE` rows, and
+        the next page is requested before the current one is serialized.
+    - The last line is `{"status": "success", "num": ..., "cursor": ...}`
+        with the cursor of the next page.
+    - Errors cannot change the HTTP status anymore, i.e. the last line
+        is `{"status": "failed", ...}` if the download failed. A prefetched
+        page is dropped (the driver can't cancel a running request).
+    """
+    def fetch_page(paging_state, remaining):
+        stmt = prepared(session, "select_features").bind([headword])
+        stmt.fetch_size = min(STREAM_FETCH_SIZE, remaining)
+        return session.execute_async(stmt, paging_state=paging_state)
+
+    remaining = limit
+    future = None
+    try:
+        future = fetch_page(paging_state, remaining)
+        while future is not None:
+            results = future.result()
+            rows = results.current_rows
+            remaining -= len(rows)
+            paging_state = results.paging_state
+            # request the next page
+            future = None
+            if (paging_state is not None) and (remaining > 0):
+                future = fetch_page(paging_state, remaining)
+            for row in rows:
+                yield json.dumps(row_to_dict(row)) + "\n"
+        yield json.dumps({
+            "status": "success",
+            "num": limit - remaining,
+            "cursor": encode_cursor(
+                paging_state, user=user_id, headword=headword)
+        }) + "\n"
+    except Exception as err:
+        logger.error(err)
+        future = None  # drop the prefetched page, i.e. don't wait for it
+        yield json.dumps({"status": "failed", "msg": "Unknown error"}) + "\n"
 
 
 @router.post("")
 async def get_serialized_features(params: Dict[str, Any],
-                                  user_id: str = Depends(get_current_user)
+                                  user_id: str = Depends(get_current_user),
+                                  session: Session = Depends(get_session),
+                                  media: str = Depends(negotiate)
                                   ) -> dict:
     """Retrieve serialized features from database
 
@@ -52,9 +133,17 @@ async def get_serialized_features(params: Dict[str, Any],
             The headword to retrieve features for
         'limit' : int
             Maximum number of sentences to retrieve from CQL on 1 page
-        'reset-pagination' : bool
-            Reset the pagination state
-        
+        'cursor' : str
+            The "cursor" of the previous response to retrieve the next
+              page. The first page is returned without cursor.
+        'stream' : bool
+            Stream the examples as NDJSON, i.e. one example per line
+
+    media : str
+        The response format requested with the `Accept` header. The
+          serialized features are sent as int8/int16/int32 arrays
+          "feats1", ..., "hashes18" if a binary format is requested
+          (see `app/wire.py`). Not available in the streaming mode.
 
     user_id: str
         The UUID4 user_id stored in the JWT token.
@@ -75,6 +164,9 @@ async def get_serialized_features(params: Dict[str, Any],
         expected that the WebApp sends the data as it should be stored in
         the database.
     - How to JSON: https://www.psycopg.org/docs/extras.html#json-adaptation
+    - The pagination is stateless, i.e. the response contains the signed
+        "cursor" of the next page (None after the last page), see
+        `app/cursors.py`.
     """
     # read headword
     headword = params.get('headword')
@@ -85,96 +177,54 @@ async def get_serialized_features(params: Dict[str, Any],
     # max number of sentences to fetch per page
     limit = params.get("limit", 500)
 
-    # init pagination
-    global paging_states
-    if paging_states.get(user_id) is None:
-        paging_states[user_id] = {}
-    if paging_states[user_id].get(headword) is None:
-        paging_states[user_id][headword] = {
-            'paging_state': None, 'timestamp': time.time()}
+    # read the pagination state of the previous page
+    try:
+        paging_state = decode_cursor(
+            params.get("cursor"), user=user_id, headword=headword)
+    except InvalidCursor as err:
+        return {"status": "failed", "num": 0, "msg": str(err)}
 
-    # reset pagination
-    if params.get("reset-pagination", False):
-        paging_states[user_id][headword] = {
-            'paging_state': None, 'timestamp': time.time()}
+    # stream examples while the pages arrive
+    if params.get("stream", False):
+        return StreamingResponse(
+            stream_examples(session, headword, user_id, limit, paging_state),
+            media_type="application/x-ndjson")
 
     # download data
     try:
-        # prepare statement
-        stmt = cas.query.SimpleStatement(f"""
-            SELECT headword, example_id, sentence, sent_id
-                 , spans, annot, biblio, license, score
-                 , feats1
-                 , feats2, feats3, feats4, feats5
-                 , feats6, feats7, feats8, feats9
-                 , feats12, feats13, feats14
-                 , hashes15, hashes16, hashes18
-            FROM {session.keyspace}.tbl_features
-            WHERE headword='{headword}';
-            """, fetch_size=limit)
-
-        # read fetched rows
-        examples = []
-
-        # read async fetched rows
-        def process_results(results):
-            for row in results:
-                examples.append({
-                    "headword": row.headword, 
-                    "example_id": str(row.example_id), 
-                    "sentence": row.sentence, 
-                    "sentence_id": str(row.sent_id), 
-                    "spans": json.dumps(row.spans), 
-                    "annot": row.annot, 
-                    "biblio": row.biblio, 
-                    "license": row.license, 
-                    "score": row.score,
-                    "feats1": row.feats1,
-                    "feats2": row.feats2,
-                    "feats3": row.feats3,
-                    "feats4": row.feats4,
-                    "feats5": row.feats5,
-                    "feats6": row.feats6,
-                    "feats7": row.feats7,
-                    "feats8": row.feats8,
-                    "feats9": row.feats9,
-                    "feats12": row.feats12,
-                    "feats13": row.feats13,
-                    "feats14": row.feats14,
-                    "hashes15": row.hashes15,
-                    "hashes16": row.hashes16,
-                    "hashes18": row.hashes18,
-                })
+        # prepared statement
+        stmt = prepared(session, "select_features").bind([headword])
+        stmt.fetch_size = limit
 
         # download 1 page of 'limit' sentences
-        future = session.execute_async(
-            stmt,
-            paging_state=paging_states[user_id][headword]['paging_state'])
-        future.add_callback(process_results)
-        results = future.result()
-
-        # update paging state
-        paging_states[user_id][headword] = {
-            'paging_state': results.paging_state, 'timestamp': time.time()}
-        delete_old_paging_states()
-        # print(paging_states, results.paging_state)
-
-        # delete
-        del stmt
-        gc.collect()
+        results = await aexecute(session, stmt, paging_state=paging_state)
+        rows = results.current_rows
+        cursor = encode_cursor(
+            results.paging_state, user=user_id, headword=headword)
     except Exception as err:
         logger.error(err)
-        gc.collect()
-        return {"status": "failed", "num": 0, "error": err,
+        return {"status": "failed", "num": 0, "error": str(err),
                 "msg": "Unknown error"}
 
-    if len(examples) == 0:
+    if len(rows) == 0:
         return {"status": "failed", "num": 0,
                 "msg": "No sentence examples"}
 
+    # send the serialized features as typed arrays
+    if media != MEDIA_JSON:
+        examples = [row_to_dict(row, feats=False) for row in rows]
+        return binary_response({
+            'status': 'success',
+            'num': len(examples),
+            'examples': examples,
+            'cursor': cursor
+        }, rows_to_arrays(rows), media)
+
     # done
+    examples = [row_to_dict(row) for row in rows]
     return {
         'status': 'success',
         'num': len(examples),
-        'examples': examples
+        'examples': examples,
+        'cursor': cursor
     }
@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, Header, Response
+from fastapi.responses import JSONResponse
+from typing import List, Dict, Any, Optional
 from .auth_email import get_current_user
-from ..cqlconn import CqlConn
+from ..cqlconn import get_session
 import cassandra as cas
+from cassandra.cluster import Session
 import cassandra.query
-import gc
 import numpy as np
-import numba
 import logging
-from ..transform import i2f
+import hashlib
+from ..partitions import (
+    get_top_partition, get_top_rows, rows_version, Partition)
+from ..similarity import semantic_simi_matrix, hash_simi_matrix
+from ..executors import run_cpu
+from ..cache import ResponseCache, redis_client
+from ..config import config_similarity_cache, config_shared_cache
+from ..wire import negotiate, binary_response, etag_matches, MEDIA_JSON
 
 # start logger
 logger = logging.getLogger(__name__)
@@ -16,32 +23,33 @@ logger = logging.getLogger(__name__)
 # POST /variation/similarity-matrices
 router = APIRouter()
 
-# connect to Cassandra DB
-conn = CqlConn()
-session = conn.get_session()
+# serialized responses, keyed by their ETag
+similarity_cache = ResponseCache(
+    prefix="simi",
+    maxbytes=config_similarity_cache["MAXBYTES"],
+    ttl=config_similarity_cache["TTL"],
+    redis=redis_client(config_shared_cache["REDIS_URL"]))
 
 
-@numba.njit
-def compute_simi_matrix(x):
-    n = x.shape[0]
-    y = np.diag(np.ones(n, dtype=np.float32))
-    for i in range(n):
-        for j in range(i + 1, n):
-            y[i, j] = np.mean(x[i] == x[j])
-            y[j, i] = y[i, j]
-    return y
-
-
-# https://github.com/satzbeleg/keras-hrp/blob/main/keras_hrp/serialize.py#L11
-def int8_to_bool(serialized: List[np.int8]) -> List[bool]:
-    return np.unpackbits(
-        serialized.astype(np.uint8),
-        bitorder='big').reshape(-1)
+def response_etag(keyspace: str,
+                  headword: str,
+                  limit: int,
+                  version: str,
+                  media: str) -> str:
+    """ The ETag of a response, i.e. of the request and the data version """
+    digest = hashlib.blake2b(repr((
+        keyspace, headword, limit, version, media)).encode("utf-8"),
+        digest_size=16)
+    return f'"{digest.hexdigest()}"'
 
 
 @router.post("")
 async def create_similarity_matrices(data: Dict[str, Any],
-                                     user_id: str = Depends(get_current_user)
+                                     user_id: str = Depends(get_current_user),
+                                     session: Session = Depends(get_session),
+                                     media: str = Depends(negotiate),
+                                     if_none_match: Optional[str] = Header(
+                                         None)
                                      ) -> dict:
     """Return similarity matrices for a given headword
 
@@ -56,6 +64,15 @@ async def create_similarity_matrices(data: Dict[str, Any],
         The UUID4 user_id stored in the JWT token.
         See `app/routers/token.py:get_current_user`
 
+    media : str
+        The response format requested with the `Accept` header. The
+          matrices and features are sent as float32 arrays if a binary
+          format is requested (see `app/wire.py`).
+
+    if_none_match : str
+        The `ETag` of a previous response. The response is empty (304) if
+          the sentence examples didn't change.
+
     Examples:
     ---------
     TOKEN="..."
@@ -71,6 +88,8 @@ async def create_similarity_matrices(data: Dict[str, Any],
         expected that the WebApp sends the data as it should be stored in
         the database.
     - How to JSON: https://www.psycopg.org/docs/extras.html#json-adaptation
+    - The responses are cached (`similarity_cache`). The data version is
+        a digest of the top `limit` sentence examples, see `rows_version`.
     """
     # read headword
     headword = data.get('headword')
@@ -81,92 +100,95 @@ async def create_similarity_matrices(data: Dict[str, Any],
     # max number of sentences
     limit = data.get("limit", 30)
 
-    # download data
+    # check the data version of the `limit` examples with the largest scores
     try:
-        # prepare statement
-        stmt = cas.query.SimpleStatement(f"""
-            SELECT sentence, biblio, score
-                 , feats1, hashes15, hashes16, hashes18
-                 , feats2, feats3, feats4, feats5, feats6, feats7
-                 , feats8, feats9, feats12, feats13, feats14
-            FROM {session.keyspace}.tbl_features
-            WHERE headword='{headword}';
-            """, fetch_size=5000)
-        # read fetched rows
-        sentences = []
-        biblio = []
-        scores = []
-        feats_semantic = []
-        hashes_grammar = []
-        hashes_duplicate = []
-        hashes_biblio = []
-        feats = [[] for _ in range(12)]  # for TFJS model
-        for row in session.execute(stmt):
-            sentences.append(row.sentence)
-            biblio.append(row.biblio)
-            scores.append(row.score)
-            feats_semantic.append(row.feats1)
-            hashes_grammar.append(row.hashes15)
-            hashes_duplicate.append(row.hashes16)
-            hashes_biblio.append(row.hashes18)
-            feats[0].append(row.feats1)  # for TFJS model
-            feats[1].append(row.feats2)
-            feats[2].append(row.feats3)
-            feats[3].append(row.feats4)
-            feats[4].append(row.feats5)
-            feats[5].append(row.feats6)
-            feats[6].append(row.feats7)
-            feats[7].append(row.feats8)
-            feats[8].append(row.feats9)
-            feats[9].append(row.feats12)
-            feats[10].append(row.feats13)
-            feats[11].append(row.feats14)
-        feats = i2f(*feats)
-        # delete
-        del stmt
-        gc.collect()
+        rows = await get_top_rows(session, headword, limit)
     except Exception as err:
         logger.error(err)
-        gc.collect()
-        return {"status": "failed", "num": 0, "error": err,
+        return {"status": "failed", "num": 0, "error": str(err),
                 "msg": "Unknown error"}
 
-    if len(sentences) == 0:
+    if len(rows) == 0:
         return {"status": "failed", "num": 0,
                 "msg": "No sentence examples"}
 
-    # convert and enforce data type
-    sentences = np.array(sentences)
-    biblio = np.array(biblio)
-    scores = np.array(scores)
-    feats_semantic = np.vstack(
-        [int8_to_bool(np.array(enc)) for enc in feats_semantic])
-    hashes_grammar = np.array(hashes_grammar, dtype=np.int32)
-    hashes_duplicate = np.array(hashes_duplicate, dtype=np.int32)
-    hashes_biblio = np.array(hashes_biblio, dtype=np.int32)
-
-    # chop the smallest scores
-    idx = np.flip(np.argsort(scores))
-    idx = idx[:limit]
-    sentences = sentences[idx]
-    biblio = biblio[idx]
-    scores = scores[idx]
-    feats_semantic = feats_semantic[idx]
-    hashes_grammar = hashes_grammar[idx]
-    hashes_duplicate = hashes_duplicate[idx]
-    hashes_biblio = hashes_biblio[idx]
-    feats = feats[idx]
+    etag = response_etag(
+        session.keyspace, headword, limit, rows_version(rows), media)
+    headers = {"ETag": etag, "Vary": "Accept", "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # read the cached response (or compute it)
+    content = await similarity_cache.get(etag)
+    if content is None:
+        try:
+            partition = await get_top_partition(session, headword, limit)
+        except Exception as err:
+            logger.error(err)
+            return {"status": "failed", "num": 0, "error": str(err),
+                    "msg": "Unknown error"}
+        content = await compute_similarity_matrices(partition, media)
+        # the data might have changed in the meantime
+        etag = response_etag(session.keyspace, headword, limit,
+                             rows_version(partition.rows), media)
+        headers["ETag"] = etag
+        await similarity_cache.set(etag, content)
+
+    return Response(content=content, media_type=media, headers=headers)
+
+
+async def compute_similarity_matrices(partition: Partition,
+                                      media: str) -> bytes:
+    """ Compute the similarity matrices and serialize the response
+
+    Parameters:
+    -----------
+    partition : Partition
+        The sentence examples sorted by score, see `get_top_partition`
+    media : str
+        The response format, see `negotiate`
+
+    Return:
+    -------
+    bytes
+        The response body
+    """
+    # convert and enforce data type (sorted by score)
+    sentences = np.array([row.sentence for row in partition.rows])
+    biblio = np.array([row.biblio for row in partition.rows])
+    scores = partition.scores
+    feats_semantic = partition.feats1
+    hashes_grammar = partition.hashes15
+    hashes_duplicate = partition.hashes16
+    hashes_biblio = partition.hashes18
+    feats = partition.feats
 
     # Compute Similarity matrices
-    mat_semantic = compute_simi_matrix(feats_semantic)
-    mat_grammar = compute_simi_matrix(hashes_grammar)
-    mat_duplicate = compute_simi_matrix(hashes_duplicate)
-    mat_biblio = compute_simi_matrix(hashes_biblio)
+    mat_semantic = await run_cpu(semantic_simi_matrix, feats_semantic)
+    mat_grammar = await run_cpu(hash_simi_matrix, hashes_grammar)
+    mat_duplicate = await run_cpu(hash_simi_matrix, hashes_duplicate)
+    mat_biblio = await run_cpu(hash_simi_matrix, hashes_biblio)
+
+    # send the matrices as typed arrays
+    if media != MEDIA_JSON:
+        return binary_response({
+            'status': 'success',
+            'num': len(partition),
+            'sentences': sentences.tolist(),
+            'biblio': biblio.tolist(),
+            'scores': scores.tolist()
+        }, {
+            'simi-semantic': mat_semantic,
+            'simi-grammar': mat_grammar,
+            'simi-duplicate': mat_duplicate,
+            'simi-biblio': mat_biblio,
+            'features': feats
+        }, media).body
 
     # done
-    return {
+    return JSONResponse({
         'status': 'success',
-        'num': idx.shape[0],
+        'num': len(partition),
         'sentences': sentences.tolist(),
         'biblio': biblio.tolist(),
         'scores': scores.tolist(),
@@ -175,4 +197,4 @@ async def create_similarity_matrices(data: Dict[str, Any],
         'simi-duplicate': mat_duplicate.tolist(),
         'simi-biblio': mat_biblio.tolist(),
         'features': feats.tolist(),
-    }
+    }).body
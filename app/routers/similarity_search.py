@@ -0,0 +1,154 @@
+from fastapi import APIRouter, Depends
+from typing import Dict, Any
+from ..cqlconn import get_session
+import cassandra as cas
+from cassandra.cluster import Session
+import logging
+from ..partitions import get_partition, Partition, PartitionRow
+from ..similarity import hamming_neighbors, diverse_subset
+from ..executors import run_cpu
+
+# start logger
+logger = logging.getLogger(__name__)
+
+# POST /variation/nearest-neighbors
+# POST /variation/diverse-subset
+router = APIRouter()
+
+
+def row_to_item(row: PartitionRow) -> dict:
+    return {
+        "example_id": str(row.example_id),
+        "text": row.sentence,
+        "headword": row.headword,
+        "spans": row.spans,
+        "context": {
+            "license": row.license,
+            "biblio": row.biblio,
+            "sentence_id": str(row.sent_id)},
+        "score": row.score
+    }
+
+
+def find_example(partition: Partition, example_id: str) -> int:
+    """ The row number of a sentence example (-1 if missing) """
+    return partition.example_positions.get(example_id, -1)
+
+
+@router.post("/nearest-neighbors")
+async def nearest_neighbors(params: Dict[str, Any],
+                            session: Session = Depends(get_session)
+                            ) -> dict:
+    """ The sentence examples with the most similar SBERT hashes
+
+    Parameters:
+    -----------
+    params: Dict[str, Any]
+        'headword' : str
+            The headword of the sentence example
+        'example_id' : str
+            The sentence example to search neighbours for
+        'k' : int
+            The number of neighbours (Default: 10)
+
+    Examples:
+    ---------
+    TOKEN="..."
+    curl -X POST "http://localhost:55017/v1/variation/nearest-neighbors" \
+        -H  "accept: application/json" \
+        -H "Content-Type: application/json" \
+        -H "Authorization: Bearer ${TOKEN}" \
+        -d '{"headword": "Stichwort", "example_id": "...", "k": 5}'
+
+    Notes:
+    ------
+    - The Hamming distances to all sentence examples of the (cached)
+        partition are computed in O(N), i.e. without similarity matrix.
+    - "similarity" is the share of equal bits, i.e. the same value as in
+        the `semantic` matrix of `/variation/similarity-matrices`.
+    """
+    headword = params.get("headword")
+    example_id = params.get("example_id")
+    if headword is None or example_id is None:
+        return {"status": "failed", "num": 0,
+                "msg": "No headword or example_id provided"}
+
+    try:
+        k = int(params.get("k", 10))
+        partition = await get_partition(session, headword)
+        i = find_example(partition, str(example_id))
+        if i < 0:
+            return {"status": "failed", "num": 0,
+                    "msg": f"No example_id='{example_id}' found"}
+        idx, simi = await run_cpu(
+            lambda: hamming_neighbors(
+                partition.words, partition.feats1.shape[1] * 8, i, k))
+    except cas.ReadTimeout as err:
+        logger.error(f"Read Timeout problems with '{headword}': {err}")
+        return {"status": "failed", "num": 0, "msg": str(err)}
+    except Exception as err:
+        logger.error(f"Unknown problems with '{headword}': {err}")
+        return {"status": "failed", "num": 0, "msg": str(err)}
+
+    data = []
+    for j, s in zip(idx.tolist(), simi.tolist()):
+        data.append(dict(row_to_item(partition.rows[j]), similarity=s))
+    return {"status": "success", "num": len(data), "data": data}
+
+
+@router.post("/diverse-subset")
+async def maximally_diverse_subset(params: Dict[str, Any],
+                                   session: Session = Depends(get_session)
+                                   ) -> dict:
+    """ A subset of sentence examples with dissimilar SBERT hashes
+
+    Parameters:
+    -----------
+    params: Dict[str, Any]
+        'headword' : str
+            The headword
+        'n' : int
+            The number of sentence examples (Default: 10)
+        'limit' : int
+            Select from the `limit` sentence examples with the largest
+              scores (Default: all sentence examples)
+
+    Examples:
+    ---------
+    TOKEN="..."
+    curl -X POST "http://localhost:55017/v1/variation/diverse-subset" \
+        -H  "accept: application/json" \
+        -H "Content-Type: application/json" \
+        -H "Authorization: Bearer ${TOKEN}" \
+        -d '{"headword": "Stichwort", "n": 10, "limit": 1000}'
+
+    Notes:
+    ------
+    - Greedy max-min selection in Hamming space, starting with the example
+        of the largest score (see `app/similarity.py:max_min_subset`).
+        The examples are returned in the order of selection.
+    """
+    headword = params.get("headword")
+    if headword is None:
+        return {"status": "failed", "num": 0,
+                "msg": f"No headword='{headword}' provided"}
+
+    try:
+        n = int(params.get("n", 10))
+        limit = params.get("limit")
+        partition = await get_partition(session, headword)
+        candidates = partition.top(
+            len(partition) if limit is None else int(limit))
+        idx = await run_cpu(lambda: diverse_subset(candidates.words, n))
+    except cas.ReadTimeout as err:
+        logger.error(f"Read Timeout problems with '{headword}': {err}")
+        return {"status": "failed", "num": 0, "msg": str(err)}
+    except Exception as err:
+        logger.error(f"Unknown problems with '{headword}': {err}")
+        return {"status": "failed", "num": 0, "msg": str(err)}
+
+    if len(idx) == 0:
+        return {"status": "failed", "num": 0,
+                "msg": "no sentences found."}
+    data = [row_to_item(candidates.rows[j]) for j in idx.tolist()]
+    return {"status": "success", "num": len(data), "data": data}
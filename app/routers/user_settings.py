@@ -3,10 +3,9 @@ from typing import Dict, Any
 # from pydantic import BaseModel
 from .auth_email import get_current_user
 
-import psycopg2
+from psycopg_pool import AsyncConnectionPool
+from ..psqlconn import get_pool
 import json
-from ..config import config_auth_psql
-import gc
 import logging
 
 # start logger
@@ -18,7 +17,8 @@ router = APIRouter()
 
 @router.post("")
 async def upsert_user_settings(settings: Dict[Any, Any] = None,
-                               user_id: str = Depends(get_current_user)
+                               user_id: str = Depends(get_current_user),
+                               pool: AsyncConnectionPool = Depends(get_pool)
                                ) -> dict:
     """ Store user settings from App into the database
 
@@ -30,35 +30,32 @@ async def upsert_user_settings(settings: Dict[Any, Any] = None,
     user_id : str (uuid.UUID4)
         User ID
 
+    pool : AsyncConnectionPool
+        The connection pool of the authentication database
+
     Return:
     -------
     dict
         Status message
     """
     try:
-        # connect to DB
-        conn = psycopg2.connect(**config_auth_psql)
-        cur = conn.cursor()
-        # run queries
-        cur.execute(
-            "SELECT userdata.upsert_user_settings(%s::uuid, %s::jsonb);",
-            [user_id, json.dumps(settings)])
-        flag = cur.fetchone()[0]
-        conn.commit()
-        # clean up
-        cur.close()
-        conn.close()
-        del cur, conn
+        # borrow a pooled connection (commits on exit)
+        async with pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT userdata.upsert_user_settings(%s::uuid, %s::jsonb);",
+                [user_id, json.dumps(settings)])
+            flag = (await cur.fetchone())[0]
     except Exception as err:
         logging.error(err)
         flag = False
     finally:
-        gc.collect()
         return {'status': 'success' if flag else 'failed'}
 
 
 @router.get("")
-async def get_user_settings(user_id: str = Depends(get_current_user)) -> dict:
+async def get_user_settings(user_id: str = Depends(get_current_user),
+                            pool: AsyncConnectionPool = Depends(get_pool)
+                            ) -> dict:
     """ Load user settings from the database
 
     Parameters:
@@ -66,29 +63,24 @@ async def get_user_settings(user_id: str = Depends(get_current_user)) -> dict:
     user_id : str (uuid.UUID4)
         User ID
 
+    pool : AsyncConnectionPool
+        The connection pool of the authentication database
+
     Return:
     -------
     data : dict
         The JSON with all the user settings stored in the database
     """
     try:
-        # connect to DB
-        conn = psycopg2.connect(**config_auth_psql)
-        cur = conn.cursor()
-        # run queries
-        cur.execute('''
-            SELECT settings FROM userdata.user_settings
-            WHERE user_id=%s::uuid;''', [user_id])
-        data = cur.fetchone()[0]
-        conn.commit()
-        # clean up
-        cur.close()
-        conn.close()
-        del cur, conn
+        # borrow a pooled connection (commits on exit)
+        async with pool.connection() as conn:
+            cur = await conn.execute('''
+                SELECT settings FROM userdata.user_settings
+                WHERE user_id=%s::uuid;''', [user_id])
+            data = (await cur.fetchone())[0]
     except Exception as err:
         logging.error(err)
         data = {}
     finally:
-        gc.collect()
         # print("Debug:", user_id, data)
         return data
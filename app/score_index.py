@@ -0,0 +1,115 @@
+from typing import List, Optional
+import argparse
+import logging
+import sys
+import cassandra as cas
+import cassandra.cluster
+import cassandra.concurrent
+from .cqlconn import CqlConn
+from .statements import prepared
+
+# Maintain `tbl_features_by_score`, i.e. a copy of `tbl_features` that is
+# clustered by `score DESC`. The sampling endpoints read only the top rows
+# of a headword from it (see `partitions.get_top_rows`).
+#
+# Run it after `tbl_features` was (re-)imported or re-scored:
+#
+#     python -m app.score_index                 # all headwords
+#     python -m app.score_index Fahrrad Internet
+#
+# (A materialized view is not used because they are disabled by default
+#  since Cassandra 4.0.)
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_score_index(session: cas.cluster.Session,
+                        headword: str,
+                        concurrency: int = 64) -> int:
+    """ Copy the `tbl_features` partition of a headword to
+      `tbl_features_by_score`
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    headword : str
+        The partition key
+    concurrency : int
+        The max. number of concurrent INSERT requests
+
+    Return:
+    -------
+    int
+        The number of indexed sentence examples
+
+    Notes:
+    ------
+    - The new rows are written before the stale rows (i.e. old scores or
+        deleted sentences) are deleted, i.e. a reindexed partition is
+        never partly filled. Until the stale rows are deleted, a request
+        can read old and new rows side by side.
+    - The fallback to `tbl_features` (see `partitions.get_top_rows`) only
+        applies to empty partitions, i.e. while a headword is indexed for
+        the first time, requests can read a partly written partition.
+        Index new headwords right after the import.
+    - Rows without a score are not indexed.
+    """
+    stmt = prepared(session, "select_keys_by_score").bind([headword])
+    stmt.fetch_size = 5000
+    stale = {(row.score, row.sentence) for row in session.execute(stmt)}
+
+    stmt = prepared(session, "select_features").bind([headword])
+    stmt.fetch_size = 1000
+    params = []
+    for row in session.execute(stmt):
+        if row.score is None:
+            continue
+        params.append((
+            row.headword, row.example_id, row.sentence, row.sent_id,
+            row.spans, row.annot, row.biblio, row.license, row.score,
+            row.feats1,
+            row.feats2, row.feats3, row.feats4, row.feats5,
+            row.feats6, row.feats7, row.feats8, row.feats9,
+            row.feats12, row.feats13, row.feats14,
+            row.hashes15, row.hashes16, row.hashes18))
+
+    results = cas.concurrent.execute_concurrent_with_args(
+        session, prepared(session, "insert_features_by_score"), params,
+        concurrency=concurrency, raise_on_first_error=True)
+
+    stale -= {(p[8], p[2]) for p in params}  # both `score` are FLOAT
+    cas.concurrent.execute_concurrent_with_args(
+        session, prepared(session, "delete_feature_by_score"),
+        [(headword, score, sentence) for score, sentence in stale],
+        concurrency=concurrency, raise_on_first_error=True)
+    return len(results)
+
+
+def all_headwords(session: cas.cluster.Session) -> List[str]:
+    """ The partition keys of `tbl_features` """
+    stmt = prepared(session, "select_headwords").bind([])
+    stmt.fetch_size = 5000
+    return [row.headword for row in session.execute(stmt)]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild `tbl_features_by_score` from `tbl_features`")
+    parser.add_argument("headwords", nargs="*",
+                        help="headwords to index (default: all)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    conn = CqlConn()
+    try:
+        session = conn.get_session()
+        for headword in (args.headwords or all_headwords(session)):
+            num = rebuild_score_index(session, headword)
+            logger.info(f"'{headword}': {num} sentence examples indexed")
+    finally:
+        conn.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
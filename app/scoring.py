@@ -0,0 +1,184 @@
+from typing import List, Optional, Tuple
+import datetime
+import uuid
+import cassandra as cas
+import cassandra.cluster
+import numpy as np
+from .cache import TTLCache
+from .config import config_scoring
+from .cqlconn import aexecute
+from .statements import prepared
+from .weights import read_weights_arrays
+
+# Server-side scoring with the TFJS model weights of a user
+# - The saved weights (see `app/weights.py`) are read as a stack of dense
+#   layers: a kernel (2D) optionally followed by its bias (1D). A single
+#   vector is a linear model (with the bias as last element if it has one
+#   more element than the features).
+# - The hidden layers use the activation stored with the snapshot (see
+#   `/model/save`). Multi-layer weights without activation are rejected.
+#   The output layer is linear, i.e. the ranking is the same as with a
+#   sigmoid output.
+# - The layers of each user are cached, and reloaded if a newer snapshot
+#   was saved (`updated_at`).
+
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0.0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "linear": lambda x: x
+}
+
+
+class Scorer(object):
+    def __init__(self,
+                 updated_at: datetime.datetime,
+                 layers: List[Tuple[np.ndarray, Optional[np.ndarray]]],
+                 activation: Optional[str] = None):
+        """ The dense layers `(kernel, bias)` of a model snapshot
+
+        Parameters:
+        -----------
+        updated_at : datetime.datetime
+            The timestamp of the snapshot
+        layers : List[Tuple[np.ndarray, Optional[np.ndarray]]]
+            The dense layers, see `dense_layers`
+        activation : str
+            The activation of the hidden layers, see `ACTIVATIONS`
+
+        Raises:
+        -------
+        ValueError
+            If a model with hidden layers has no (or an unknown) activation
+        """
+        if len(layers) > 1 and activation not in ACTIVATIONS:
+            raise ValueError(
+                f"Unknown activation '{activation}' of the hidden layers. "
+                "Save the model weights with an activation.")
+        self.updated_at = updated_at
+        self.layers = layers
+        self.activation = activation
+
+    @property
+    def nbytes(self) -> int:
+        return sum([w.nbytes + (0 if b is None else b.nbytes)
+                    for w, b in self.layers])
+
+    def __call__(self, feats: np.ndarray) -> np.ndarray:
+        """ Score each row of the feature matrix (see `i2f`)
+
+        Raises:
+        -------
+        ValueError
+            If the number of features doesn't match the model
+        """
+        if feats.shape[1] != self.layers[0][0].shape[0]:
+            raise ValueError(
+                f"The model expects {self.layers[0][0].shape[0]} features, "
+                f"but there are {feats.shape[1]}")
+        x = feats
+        for i, (w, b) in enumerate(self.layers):
+            x = x @ w
+            if b is not None:
+                x = x + b
+            if i < len(self.layers) - 1:
+                x = ACTIVATIONS[self.activation](x)
+        return x[:, 0]
+
+
+def dense_layers(arrays: List[np.ndarray], n_features: int
+                 ) -> List[Tuple[np.ndarray, Optional[np.ndarray]]]:
+    """ Read the saved tensors as dense layers
+
+    Parameters:
+    -----------
+    arrays : List[np.ndarray]
+        The float32 tensors, see `read_weights_arrays`
+    n_features : int
+        The number of features, i.e. the input size of the model
+
+    Raises:
+    -------
+    ValueError
+        If the tensors are no stack of dense layers with 1 output
+    """
+    if len(arrays) == 1 and arrays[0].ndim == 1:
+        w = arrays[0]
+        if len(w) == n_features + 1:  # with bias
+            return [(w[:-1].reshape(-1, 1), w[-1:])]
+        return [(w.reshape(-1, 1), None)]
+
+    layers = []
+    for arr in arrays:
+        if arr.ndim == 2:
+            layers.append((arr, None))
+            continue
+        is_bias = arr.ndim == 1 and len(layers) > 0
+        is_bias = is_bias and layers[-1][1] is None
+        if is_bias and len(arr) == layers[-1][0].shape[1]:
+            layers[-1] = (layers[-1][0], arr)
+        else:
+            raise ValueError(f"Unexpected tensor of shape {arr.shape}")
+    if len(layers) == 0:
+        raise ValueError("No dense layers")
+    for (w1, _), (w2, _) in zip(layers[:-1], layers[1:]):
+        if w1.shape[1] != w2.shape[0]:
+            raise ValueError("The layers don't fit together")
+    if layers[-1][0].shape[1] != 1:
+        raise ValueError("The model must have 1 output")
+    return layers
+
+
+# Process-wide cache of the scorers, keyed by (keyspace, user_id)
+scorer_cache = TTLCache(
+    maxsize=config_scoring["CACHE_MAXBYTES"],
+    ttl=config_scoring["CACHE_TTL"],
+    getsizeof=lambda scorer: scorer.nbytes)
+
+
+async def get_scorer(session: cas.cluster.Session,
+                     user_id: uuid.UUID,
+                     n_features: int) -> Optional[Scorer]:
+    """ The scorer of the latest model weights of a user
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    user_id : uuid.UUID
+        The user
+    n_features : int
+        The number of features, see `dense_layers`
+
+    Return:
+    -------
+    Scorer
+        The scorer, or None if the user didn't save any model weights
+
+    Notes:
+    ------
+    - Only the timestamp of the latest snapshot is queried if the scorer
+        is cached already.
+    """
+    res = await aexecute(
+        session, prepared(session, "select_model_weights_timestamps"),
+        [user_id, 1])
+    if not res.current_rows:
+        return None
+    updated_at = res.current_rows[0].updated_at
+
+    key = (session.keyspace, user_id)
+    scorer = scorer_cache.get(key)
+    if scorer is not None and scorer.updated_at == updated_at:
+        return scorer
+
+    res = await aexecute(
+        session, prepared(session, "select_model_weights_at"),
+        [user_id, updated_at])
+    if not res.current_rows:
+        return None  # deleted in the meantime
+    meta, arrays = read_weights_arrays(res.current_rows[0])
+    scorer = Scorer(updated_at, dense_layers(arrays, n_features),
+                    meta.get("activation"))
+    scorer_cache.set(key, scorer)
+    return scorer
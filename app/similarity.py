@@ -0,0 +1,247 @@
+from typing import Tuple
+import numba
+import numpy as np
+import threading
+
+# Similarity kernels for `similarity_matrices`
+# - All kernels are compiled with `cache=True`, i.e. the machine code is
+#   stored in `__pycache__` and loaded by every worker. Call `warmup()` at
+#   startup to load or compile them before the first request.
+# - The rows are processed in parallel (`numba.prange`). The default numba
+#   threading layer (workqueue) must not be entered by two threads at once,
+#   i.e. the wrappers run one kernel at a time (`_kernel_lock`).
+# - The Hamming search kernels (`hamming_distances`, `max_min_subset`) scan
+#   the packed SBERT hashes in O(N) per query without any N x N matrix.
+#   They are not parallel, i.e. they don't need the `_kernel_lock`.
+
+
+# constants for `popcount64` (must be uint64 to avoid float promotion)
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0f0f0f0f0f0f0f0f)
+_H01 = np.uint64(0x0101010101010101)
+
+
+@numba.njit(cache=True, nogil=True)
+def popcount64(x):
+    """ Number of set bits of an uint64 word (SWAR algorithm) """
+    x = x - ((x >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+def pack_bits(feats1: np.ndarray) -> np.ndarray:
+    """ View the serialized SBERT hashes as uint64 words
+
+    Parameters:
+    -----------
+    feats1 : np.ndarray (int8)
+        (N, n_bytes) matrix of serialized SBERT hashes, i.e. 8 bits per int8
+
+    Return:
+    -------
+    np.ndarray (uint64)
+        (N, ceil(n_bytes / 8)) matrix. The last word is padded with zeros.
+    """
+    n, nbytes = feats1.shape
+    nwords = -(-nbytes // 8)
+    buf = np.zeros((n, nwords * 8), dtype=np.uint8)
+    buf[:, :nbytes] = feats1.view(np.uint8)
+    return buf.view(np.uint64)
+
+
+@numba.njit(parallel=True, cache=True, nogil=True)
+def hamming_simi_matrix(words, nbits):
+    """ Share of equal bits between all pairs of packed bit vectors
+
+    Parameters:
+    -----------
+    words : np.ndarray (uint64)
+        (N, n_words) matrix of packed bits, see `pack_bits`
+    nbits : int
+        The number of bits per row (without padding)
+
+    Return:
+    -------
+    np.ndarray (float32)
+        (N, N) similarity matrix, i.e. `mean(x[i] == x[j])` of the
+          unpacked bits
+    """
+    n, m = words.shape
+    y = np.ones((n, n), dtype=np.float32)
+    for i in numba.prange(n):
+        for j in range(i + 1, n):
+            d = 0
+            for k in range(m):
+                d += popcount64(words[i, k] ^ words[j, k])
+            y[i, j] = (nbits - d) / nbits
+            y[j, i] = y[i, j]
+    return y
+
+
+@numba.njit(parallel=True, cache=True, nogil=True)
+def equality_simi_matrix(x):
+    """ Share of equal elements between all pairs of rows
+
+    Parameters:
+    -----------
+    x : np.ndarray
+        (N, d) matrix, e.g. int32 hashes
+
+    Return:
+    -------
+    np.ndarray (float32)
+        (N, N) similarity matrix, i.e. `mean(x[i] == x[j])`
+    """
+    n, m = x.shape
+    y = np.ones((n, n), dtype=np.float32)
+    for i in numba.prange(n):
+        for j in range(i + 1, n):
+            c = 0
+            for k in range(m):
+                if x[i, k] == x[j, k]:
+                    c += 1
+            y[i, j] = c / m
+            y[j, i] = y[i, j]
+    return y
+
+
+@numba.njit(cache=True, nogil=True)
+def hamming_distances(words, query):
+    """ Number of different bits between each row and a query
+
+    Parameters:
+    -----------
+    words : np.ndarray (uint64)
+        (N, n_words) matrix of packed bits, see `pack_bits`
+    query : np.ndarray (uint64)
+        (n_words,) packed bits, e.g. a row of `words`
+
+    Return:
+    -------
+    np.ndarray (int64)
+        (N,) Hamming distances
+    """
+    n, m = words.shape
+    d = np.zeros(n, dtype=np.int64)
+    for i in range(n):
+        for k in range(m):
+            d[i] += popcount64(words[i, k] ^ query[k])
+    return d
+
+
+@numba.njit(cache=True, nogil=True)
+def max_min_subset(words, n_select, start):
+    """ Greedy max-min diverse subset in Hamming space
+
+    Parameters:
+    -----------
+    words : np.ndarray (uint64)
+        (N, n_words) matrix of packed bits, see `pack_bits`
+    n_select : int
+        The subset size
+    start : int
+        The 1st selected row
+
+    Return:
+    -------
+    np.ndarray (int64)
+        The row indices in the order of selection. Each row has the largest
+          distance to its nearest selected row (ties: the lower index).
+
+    Notes:
+    ------
+    - Farthest-point traversal, i.e. O(N * n_select) distances.
+    """
+    n, m = words.shape
+    n_select = min(n_select, n)
+    selected = np.empty(n_select, dtype=np.int64)
+    mindist = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    if n_select == 0:
+        return selected
+    last = start
+    for t in range(n_select):
+        selected[t] = last
+        mindist[last] = -1
+        best = -1
+        for i in range(n):
+            if mindist[i] < 0:
+                continue
+            d = 0
+            for k in range(m):
+                d += popcount64(words[i, k] ^ words[last, k])
+            if d < mindist[i]:
+                mindist[i] = d
+            if best < 0 or mindist[i] > mindist[best]:
+                best = i
+        last = best
+    return selected
+
+
+# serializes the parallel kernels (see above)
+_kernel_lock = threading.Lock()
+
+
+def semantic_simi_matrix(feats1: np.ndarray) -> np.ndarray:
+    """ Hamming similarity of the serialized SBERT hashes (int8) """
+    words = pack_bits(feats1)
+    with _kernel_lock:
+        return hamming_simi_matrix(words, feats1.shape[1] * 8)
+
+
+def hash_simi_matrix(hashes: np.ndarray) -> np.ndarray:
+    """ Share of identical hashes (int32) """
+    x = np.ascontiguousarray(hashes, np.int32)
+    with _kernel_lock:
+        return equality_simi_matrix(x)
+
+
+def hamming_neighbors(words: np.ndarray,
+                      nbits: int,
+                      i: int,
+                      k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ The `k` nearest rows of row `i` in Hamming space (without `i`)
+
+    Parameters:
+    -----------
+    words : np.ndarray (uint64)
+        (N, n_words) matrix of packed bits, see `pack_bits`
+    nbits : int
+        The number of bits per row (without padding)
+    i : int
+        The query row
+    k : int
+        The number of neighbours
+
+    Return:
+    -------
+    idx : np.ndarray (int64)
+        The row indices of the neighbours (nearest first)
+    simi : np.ndarray (float32)
+        The share of equal bits, see `semantic_simi_matrix`
+    """
+    d = hamming_distances(words, words[i])
+    d[i] = nbits + 1  # exclude the query itself
+    k = min(k, len(d) - 1)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    idx = np.argpartition(d, k - 1)[:k]
+    idx = idx[np.lexsort((idx, d[idx]))]  # sort by distance, then row
+    return idx, ((nbits - d[idx]) / nbits).astype(np.float32)
+
+
+def diverse_subset(words: np.ndarray,
+                   n_select: int,
+                   start: int = 0) -> np.ndarray:
+    """ A maximally diverse subset of rows, see `max_min_subset` """
+    return max_min_subset(words, n_select, start)
+
+
+def warmup() -> None:
+    """ Load (or compile) the numba kernels """
+    semantic_simi_matrix(np.zeros((2, 8), dtype=np.int8))
+    hash_simi_matrix(np.zeros((2, 4), dtype=np.int32))
+    words = pack_bits(np.zeros((2, 8), dtype=np.int8))
+    hamming_neighbors(words, 64, 0, 1)
+    diverse_subset(words, 2)
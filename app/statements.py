@@ -0,0 +1,205 @@
+import cassandra as cas
+import cassandra.cluster
+import cassandra.query
+import threading
+import weakref
+
+
+# CQL queries of the hot paths. `{keyspace}` is replaced with the session's
+#  keyspace before the query is prepared.
+QUERIES = {
+    # read a whole `tbl_features` partition
+    "select_features": """
+        SELECT headword, example_id, sentence, sent_id
+             , spans, annot, biblio, license, score
+             , feats1
+             , feats2, feats3, feats4, feats5
+             , feats6, feats7, feats8, feats9
+             , feats12, feats13, feats14
+             , hashes15, hashes16, hashes18
+        FROM {keyspace}.tbl_features
+        WHERE headword=?;
+        """,
+    # read the sentence examples with the largest scores
+    "select_features_by_score": """
+        SELECT headword, example_id, sentence, sent_id
+             , spans, annot, biblio, license, score
+             , feats1
+             , feats2, feats3, feats4, feats5
+             , feats6, feats7, feats8, feats9
+             , feats12, feats13, feats14
+             , hashes15, hashes16, hashes18
+        FROM {keyspace}.tbl_features_by_score
+        WHERE headword=? LIMIT ?;
+        """,
+    # read the light-weight columns to choose sentence examples
+    "select_rows": """
+        SELECT headword, example_id, sentence, sent_id
+             , spans, annot, biblio, license, score
+        FROM {keyspace}.tbl_features
+        WHERE headword=?;
+        """,
+    "select_rows_by_score": """
+        SELECT headword, example_id, sentence, sent_id
+             , spans, annot, biblio, license, score
+        FROM {keyspace}.tbl_features_by_score
+        WHERE headword=? LIMIT ?;
+        """,
+    # read the features of the chosen sentence examples
+    "select_features_in": """
+        SELECT sentence
+             , feats1
+             , feats2, feats3, feats4, feats5
+             , feats6, feats7, feats8, feats9
+             , feats12, feats13, feats14
+        FROM {keyspace}.tbl_features
+        WHERE headword=? AND sentence IN ?;
+        """,
+    "select_hashes16_in": """
+        SELECT sentence, hashes16
+        FROM {keyspace}.tbl_features
+        WHERE headword=? AND sentence IN ?;
+        """,
+    # maintain `tbl_features_by_score` (see `app/score_index.py`)
+    "select_headwords": """
+        SELECT DISTINCT headword FROM {keyspace}.tbl_features;
+        """,
+    "select_keys_by_score": """
+        SELECT score, sentence
+        FROM {keyspace}.tbl_features_by_score
+        WHERE headword=?;
+        """,
+    "delete_feature_by_score": """
+        DELETE FROM {keyspace}.tbl_features_by_score
+        WHERE headword=? AND score=? AND sentence=?;
+        """,
+    "insert_features_by_score": """
+        INSERT INTO {keyspace}.tbl_features_by_score
+        (headword, example_id, sentence, sent_id
+         , spans, annot, biblio, license, score
+         , feats1
+         , feats2, feats3, feats4, feats5
+         , feats6, feats7, feats8, feats9
+         , feats12, feats13, feats14
+         , hashes15, hashes16, hashes18)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                ?, ?, ?, ?);
+        """,
+    "insert_evaluated_bestworst": """
+        INSERT INTO {keyspace}.evaluated_bestworst
+        (set_id, user_id, ui_name,
+        headword, event_history, state_sentid_map, tracking_data)
+        VALUES (?, ?, ?, ?, ?, ?, ?) IF NOT EXISTS;
+        """,
+    "insert_interactivity_convergence": """
+        INSERT INTO {keyspace}.interactivity_convergence
+        (episode_id, training_score_history, model_score_history, displayed,
+         user_id, sentence_text, headword)
+        VALUES (?, ?, ?, ?, ?, ?, ?) IF NOT EXISTS;
+        """,
+    "insert_model_weights": """
+        INSERT INTO {keyspace}.model_weights
+        (user_id, updated_at, weights, nbytes)
+        VALUES (?, ?, ?, ?) IF NOT EXISTS USING TTL ?;
+        """,
+    "insert_model_weights_blob": """
+        INSERT INTO {keyspace}.model_weights
+        (user_id, updated_at, weights_blob, manifest, nbytes)
+        VALUES (?, ?, ?, ?, ?) IF NOT EXISTS USING TTL ?;
+        """,
+    "select_model_weights_latest": """
+        SELECT updated_at, weights, weights_blob, manifest
+        FROM {keyspace}.model_weights
+        WHERE user_id=? LIMIT 1;
+        """,
+    "select_model_weights_all": """
+        SELECT updated_at, weights, weights_blob, manifest
+        FROM {keyspace}.model_weights
+        WHERE user_id=?;
+        """,
+    "select_model_weights_at": """
+        SELECT updated_at, weights, weights_blob, manifest
+        FROM {keyspace}.model_weights
+        WHERE user_id=? AND updated_at=?;
+        """,
+    "select_model_weights_list": """
+        SELECT updated_at, nbytes, manifest
+        FROM {keyspace}.model_weights
+        WHERE user_id=?;
+        """,
+    "select_model_weights_timestamps": """
+        SELECT updated_at
+        FROM {keyspace}.model_weights
+        WHERE user_id=? LIMIT ?;
+        """,
+    "delete_model_weights_before": """
+        DELETE FROM {keyspace}.model_weights
+        WHERE user_id=? AND updated_at<?;
+        """,
+}
+
+
+class StatementRegistry(object):
+    def __init__(self, session: cas.cluster.Session):
+        """ Prepare each query of `QUERIES` once per session
+
+        Parameters:
+        -----------
+        session : cas.cluster.Session
+            A Cassandra Session object, i.e., an existing DB connection.
+
+        Notes:
+        ------
+        - Statements are prepared lazily on first use.
+        - Cassandra drops prepared statements if a table is altered. The
+            driver reprepares them transparently (`UNPREPARED` response), and
+            re-prepares all statements on hosts that come back up.
+        - `invalidate()` is called after DDL that changes the selected
+            columns, see `cqlconn._cas_add_columns`.
+        """
+        self.session = session
+        self.statements = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> cas.query.PreparedStatement:
+        stmt = self.statements.get(name)
+        if stmt is None:
+            with self.lock:
+                stmt = self.statements.get(name)
+                if stmt is None:
+                    stmt = self.session.prepare(
+                        QUERIES[name].format(keyspace=self.session.keyspace))
+                    self.statements[name] = stmt
+        return stmt
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.statements = {}
+
+
+# one registry per session
+_registries = weakref.WeakKeyDictionary()
+_registries_lock = threading.Lock()
+
+
+def get_registry(session: cas.cluster.Session) -> StatementRegistry:
+    registry = _registries.get(session)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(session)
+            if registry is None:
+                registry = StatementRegistry(session)
+                _registries[session] = registry
+    return registry
+
+
+def prepared(session: cas.cluster.Session,
+             name: str) -> cas.query.PreparedStatement:
+    """ Return the prepared statement `name` of the session
+
+    Example:
+    --------
+        stmt = prepared(session, "select_features")
+        session.execute(stmt, [headword])
+    """
+    return get_registry(session).get(name)
@@ -7,17 +7,15 @@ import numpy as np
 
 
 # evf.utils.py
-def divide_by_1st_col(feats: List[List[float]]):
-    n_feats = feats.shape[-1] - 1
-    denom = np.maximum(feats[:, 0], 1)
-    return feats[:, 1:] / np.tile(denom.reshape(-1, 1), n_feats)
+def divide_by_1st_col(feats: np.ndarray, out: np.ndarray = None):
+    denom = np.maximum(feats[:, :1], 1)
+    return np.divide(feats[:, 1:], denom, out=out)
 
 
 # evf.utils.py
-def divide_by_sum(feats: List[List[float]]):
-    n_feats = feats.shape[-1]
-    denom = np.maximum(feats.sum(axis=1), 1)
-    return feats / np.tile(denom.reshape(-1, 1), n_feats)
+def divide_by_sum(feats: np.ndarray, out: np.ndarray = None):
+    denom = np.maximum(feats.sum(axis=1, keepdims=True), 1)
+    return np.divide(feats, denom, out=out)
 
 
 # https://github.com/satzbeleg/keras-hrp/blob/main/keras_hrp/serialize.py
@@ -29,12 +27,13 @@ def int8_to_bool(serialized: List[np.int8]) -> List[bool]:
 
 # evf.transform_sbert.py
 def sbert_i2b(encoded):
-    return np.vstack([int8_to_bool(enc) for enc in encoded])
+    encoded = np.asarray(encoded, dtype=np.int8)
+    return np.unpackbits(encoded.view(np.uint8), axis=1, bitorder='big')
 
 
 # ev.transform_sqlen.py
-def seqlen_i2f(feats):
-    return np.log(feats + 1.)
+def seqlen_i2f(feats, out: np.ndarray = None):
+    return np.log(feats + 1., out=out)
 
 
 # evf.transform_fasttext176.py
@@ -44,44 +43,86 @@ def int8_to_scaledfloat(idx: np.int8) -> float:
     return x
 
 
+# lookup table of `int8_to_scaledfloat`, i.e. `FASTTEXT176_LUT[idx + 128]`
+FASTTEXT176_LUT = np.array(
+    [int8_to_scaledfloat(idx) for idx in range(-128, 128)], dtype=float)
+
+
 # evf.transform_fasttext176.py
-def fasttext176_i2f(encoded):
-    pdf = [[int8_to_scaledfloat(i) for i in tmp] for tmp in encoded]
-    return np.vstack(pdf).astype(float)
+def fasttext176_i2f(encoded, out: np.ndarray = None):
+    idx = np.clip(np.asarray(encoded, dtype=np.int16), -128, 127) + 128
+    if out is None:
+        return FASTTEXT176_LUT[idx]
+    out[...] = FASTTEXT176_LUT[idx]
+    return out
 
 
 # evf.transform_all.py
 def i2f(feats1, feats2, feats3, feats4,
         feats5, feats6, feats7, feats8,
-        feats9, feats12, feats13, feats14):
+        feats9, feats12, feats13, feats14,
+        out: np.ndarray = None,
+        dtype: np.dtype = np.float32) -> np.ndarray:
+    """ Convert the int8/int16 features of N sentences to floating-point
+
+    Parameters:
+    -----------
+    feats1, ..., feats14 : List[List[int]] or np.ndarray
+        The serialized features (`tbl_features` columns) of N sentences
+
+    out : np.ndarray (Default: None)
+        Preallocated output array of shape (N, n_features)
+
+    dtype : np.dtype (Default: np.float32)
+        Data type of the output array if `out` is not provided
+
+    Return:
+    -------
+    np.ndarray
+        The (N, n_features) feature matrix for the TFJS model
+
+    Notes:
+    ------
+    - Each feature group is computed in float64 and written directly into
+        its columns of the output array, i.e. the values are the same as
+        `np.hstack` of all groups casted to `dtype`.
+    """
     # convert to numpy
-    feats1 = np.array(feats1, dtype=np.int8)
-    feats2 = np.array(feats2, dtype=np.int8)
-    feats3 = np.array(feats3, dtype=np.int8)
-    feats4 = np.array(feats4, dtype=np.int8)
-    feats5 = np.array(feats5, dtype=np.int16)
-    feats6 = np.array(feats6, dtype=np.int16)
-    feats7 = np.array(feats7, dtype=np.int16)
-    feats8 = np.array(feats8, dtype=np.int8)
-    feats9 = np.array(feats9, dtype=np.int8)
-    feats12 = np.array(feats12, dtype=np.int16)
-    feats13 = np.array(feats13, dtype=np.int8)
-    feats14 = np.array(feats14, dtype=np.int8)
+    feats1 = np.asarray(feats1, dtype=np.int8)
+    if feats1.shape[0] == 0:
+        return np.empty((0, 0), dtype=dtype) if out is None else out
+    groups = [
+        (divide_by_1st_col, np.asarray(feats2, dtype=np.int8)),  # trankit
+        (divide_by_1st_col, np.asarray(feats3, dtype=np.int8)),  # trankit
+        (divide_by_sum, np.asarray(feats4, dtype=np.int8)),  # trankit
+        (divide_by_1st_col, np.asarray(feats5, dtype=np.int16)),  # consonant
+        (divide_by_1st_col, np.asarray(feats6, dtype=np.int16)),  # char
+        (divide_by_1st_col, np.asarray(feats7, dtype=np.int16)),  # bigram
+        (divide_by_1st_col, np.asarray(feats8, dtype=np.int8)),  # cow
+        (divide_by_1st_col, np.asarray(feats9, dtype=np.int8)),  # smor
+        (seqlen_i2f, np.asarray(feats12, dtype=np.int16)),  # seqlen
+        (fasttext176_i2f, np.asarray(feats13, dtype=np.int8)),  # fasttext176
+        (divide_by_1st_col, np.asarray(feats14, dtype=np.int8))  # emoji
+    ]
+
+    # allocate the output array
+    n_sbert = feats1.shape[1] * 8
+    widths = [
+        feats.shape[1] - 1 if fn is divide_by_1st_col else feats.shape[1]
+        for fn, feats in groups]
+    shape = (feats1.shape[0], n_sbert + sum(widths))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f"out.shape={out.shape} but expected {shape}")
+
     # convert to floating-point features
-    return np.hstack([
-        sbert_i2b(feats1),  # sbert
-        divide_by_1st_col(feats2),  # trankit
-        divide_by_1st_col(feats3),  # trankit
-        divide_by_sum(feats4),  # trankit
-        divide_by_1st_col(feats5),  # consonant
-        divide_by_1st_col(feats6),  # char
-        divide_by_1st_col(feats7),  # bigram
-        divide_by_1st_col(feats8),  # cow
-        divide_by_1st_col(feats9),  # smor
-        seqlen_i2f(feats12),  # seqlen
-        fasttext176_i2f(feats13),   # fasttext176 langdetect
-        divide_by_1st_col(feats14)   # emoji
-    ])
+    out[:, :n_sbert] = sbert_i2b(feats1)  # sbert
+    start = n_sbert
+    for (fn, feats), width in zip(groups, widths):
+        fn(feats, out=out[:, start:(start + width)])
+        start += width
+    return out
 
 
 # items = []
@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import numbers
+import zlib
+import numpy as np
+
+# Binary storage format of the model weights (`model_weights.weights_blob`)
+# - The TFJS weights are sent as a list of numbers (one tensor), or as a
+#   list of (nested) lists (one tensor per element).
+# - All tensors are concatenated as little-endian float32 or float16, and
+#   optionally compressed with zlib.
+# - The manifest (`model_weights.manifest`, JSON) stores how to read the
+#   blob: `{"version": 1, "layout": "single"|"list", "dtype": ...,
+#   "compression": "zlib"|null, "tensors": [{"shape": [...]}, ...],
+#   "activation": ...}` (the activation of the hidden layers, if sent)
+# - Rows saved before this format have the JSON text column `weights`.
+
+MANIFEST_VERSION = 1
+
+
+def _is_number(x: Any) -> bool:
+    return isinstance(x, numbers.Real) and not isinstance(x, bool)
+
+
+def encode_weights(weights: Any,
+                   dtype: str = "float32",
+                   compress: bool = False,
+                   activation: Optional[str] = None) -> Tuple[bytes, str]:
+    """ Serialize the weights as binary blob
+
+    Parameters:
+    -----------
+    weights : list
+        A list of numbers, or a list of rectangular nested lists
+    dtype : str
+        "float32" or "float16"
+    compress : bool
+        Compress the blob with zlib
+    activation : str
+        The activation of the hidden layers, e.g. "relu" (see
+          `app/scoring.py`). Stored in the manifest.
+
+    Return:
+    -------
+    blob : bytes
+        The concatenated tensors
+    manifest : str
+        The JSON manifest to read the blob
+
+    Raises:
+    -------
+    ValueError
+        If the weights are not numeric or not rectangular, i.e. they must
+          be stored as JSON.
+    """
+    if not isinstance(weights, list) or len(weights) == 0:
+        raise ValueError("The weights must be a non-empty list")
+    if all([_is_number(x) for x in weights]):
+        layout, tensors = "single", [weights]
+    else:
+        layout, tensors = "list", weights
+    arrays = []
+    for tensor in tensors:
+        arr = np.asarray(tensor)
+        if arr.dtype.kind not in "iuf":
+            raise ValueError("The weights must be rectangular numeric lists")
+        arrays.append(arr.astype(np.dtype(dtype).newbyteorder("<")))
+    blob = b"".join([arr.tobytes() for arr in arrays])
+    if compress:
+        blob = zlib.compress(blob, 1)
+    manifest = json.dumps({
+        "version": MANIFEST_VERSION,
+        "layout": layout,
+        "dtype": dtype,
+        "compression": "zlib" if compress else None,
+        "tensors": [{"shape": list(arr.shape)} for arr in arrays],
+        "activation": activation
+    })
+    return blob, manifest
+
+
+def weights_arrays(blob: bytes, manifest: str) -> List[np.ndarray]:
+    """ Read the tensors of a blob (see `encode_weights`) """
+    meta = json.loads(manifest)
+    if meta.get("compression") == "zlib":
+        blob = zlib.decompress(blob)
+    dtype = np.dtype(meta["dtype"]).newbyteorder("<")
+    arrays, offset = [], 0
+    for tensor in meta["tensors"]:
+        count = int(np.prod(tensor["shape"]))
+        arrays.append(np.frombuffer(
+            blob, dtype=dtype, count=count, offset=offset
+        ).reshape(tensor["shape"]))
+        offset += count * dtype.itemsize
+    return arrays
+
+
+def decode_weights(blob: bytes, manifest: str) -> list:
+    """ Convert a blob back to the JSON weights (see `encode_weights`) """
+    arrays = weights_arrays(blob, manifest)
+    if json.loads(manifest)["layout"] == "single":
+        return arrays[0].astype(np.float32).tolist()
+    return [arr.astype(np.float32).tolist() for arr in arrays]
+
+
+def read_weights(row) -> Any:
+    """ The JSON weights of a `model_weights` row (binary or old JSON) """
+    if row.weights_blob is not None:
+        return decode_weights(row.weights_blob, row.manifest)
+    return json.loads(row.weights)
+
+
+def read_weights_arrays(row) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    """ The manifest and float32 tensors of a `model_weights` row
+
+    Raises:
+    -------
+    ValueError
+        If an old JSON row can't be converted to tensors
+    """
+    if row.weights_blob is not None:
+        blob, manifest = row.weights_blob, row.manifest
+    else:
+        blob, manifest = encode_weights(json.loads(row.weights))
+    meta = json.loads(manifest)
+    arrays = [arr.astype(np.float32) for arr in weights_arrays(blob, manifest)]
+    return {"layout": meta["layout"],
+            "tensors": [f"weights-{i}" for i in range(len(arrays))],
+            "activation": meta.get("activation")}, arrays
+
+
+def weights_info(row) -> Dict[str, Any]:
+    """ The metadata of a `model_weights` row (without the weights)
+
+    Return:
+    -------
+    dict
+        "updated_at", "nbytes" (stored size, None for old rows), "format"
+          ("binary" or "json"), and "dtype", "compression" of binary rows
+    """
+    info = {"updated_at": row.updated_at, "nbytes": row.nbytes}
+    if row.manifest is None:
+        return dict(info, format="json")
+    meta = json.loads(row.manifest)
+    return dict(info, format="binary", dtype=meta["dtype"],
+                compression=meta["compression"])
@@ -0,0 +1,131 @@
+from fastapi import Header, Response
+from typing import Any, Dict, Optional, Tuple
+import json
+import msgpack
+import numpy as np
+import struct
+
+# Binary wire formats for feature payloads
+#
+# The JSON response stays the default. A client can request a binary
+# response with the `Accept` header:
+#
+# - `application/octet-stream` ("frame"):
+#     uint32 LE    length H of the JSON header
+#     H bytes      UTF-8 JSON header (padded with spaces to 8-byte alignment)
+#                  `{"data": ..., "arrays": [{"name", "dtype", "shape",
+#                    "offset", "nbytes"}, ...]}`
+#     payload      little-endian arrays, each starts at an 8-byte aligned
+#                  `offset` (relative to the payload)
+#   i.e. a JS client can create typed arrays without copying, e.g.
+#   `new Float32Array(buf, 4 + H + offset, nbytes / 4)`
+#
+# - `application/x-msgpack`:
+#     `{"data": ..., "arrays": {name: {"dtype", "shape", "data": <bin>}}}`
+#
+# `data` is the JSON response without the arrays.
+
+MEDIA_JSON = "application/json"
+MEDIA_FRAME = "application/octet-stream"
+MEDIA_MSGPACK = "application/x-msgpack"
+
+
+def negotiate(accept: Optional[str] = Header(None)) -> str:
+    """ Return the requested media type (FastAPI dependency) """
+    if accept:
+        for media in (MEDIA_FRAME, MEDIA_MSGPACK):
+            if media in accept:
+                return media
+    return MEDIA_JSON
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """ Check the `If-None-Match` header against an ETag, e.g. '"abc"' """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+def _little_endian(arr: np.ndarray) -> np.ndarray:
+    arr = np.asarray(arr)
+    return np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+
+
+def pack_frame(data: Any, arrays: Dict[str, np.ndarray]) -> bytes:
+    """ Serialize JSON data and numpy arrays as binary frame """
+    meta, chunks, offset = [], [], 0
+    for name, arr in arrays.items():
+        arr = _little_endian(arr)
+        padding = -offset % 8
+        chunks.append(b"\0" * padding)
+        offset += padding
+        meta.append({"name": name, "dtype": arr.dtype.name,
+                     "shape": list(arr.shape), "offset": offset,
+                     "nbytes": arr.nbytes})
+        chunks.append(arr.tobytes())
+        offset += arr.nbytes
+    header = json.dumps({"data": data, "arrays": meta}).encode("utf-8")
+    header += b" " * (-(4 + len(header)) % 8)
+    return b"".join([struct.pack("<I", len(header)), header] + chunks)
+
+
+def unpack_frame(buf: bytes) -> Tuple[Any, Dict[str, np.ndarray]]:
+    """ Deserialize a binary frame (see `pack_frame`) """
+    hlen, = struct.unpack_from("<I", buf, 0)
+    header = json.loads(buf[4:(4 + hlen)].decode("utf-8"))
+    arrays = {}
+    for meta in header["arrays"]:
+        arrays[meta["name"]] = np.frombuffer(
+            buf, dtype=np.dtype(meta["dtype"]).newbyteorder('<'),
+            count=int(np.prod(meta["shape"])),
+            offset=4 + hlen + meta["offset"]).reshape(meta["shape"])
+    return header["data"], arrays
+
+
+def pack_msgpack(data: Any, arrays: Dict[str, np.ndarray]) -> bytes:
+    """ Serialize JSON data and numpy arrays with msgpack """
+    packed = {}
+    for name, arr in arrays.items():
+        arr = _little_endian(arr)
+        packed[name] = {"dtype": arr.dtype.name, "shape": list(arr.shape),
+                        "data": arr.tobytes()}
+    return msgpack.packb({"data": data, "arrays": packed})
+
+
+def unpack_msgpack(buf: bytes) -> Tuple[Any, Dict[str, np.ndarray]]:
+    """ Deserialize a msgpack response (see `pack_msgpack`) """
+    obj = msgpack.unpackb(buf)
+    arrays = {}
+    for name, meta in obj["arrays"].items():
+        arrays[name] = np.frombuffer(
+            meta["data"], dtype=np.dtype(meta["dtype"]).newbyteorder('<')
+        ).reshape(meta["shape"])
+    return obj["data"], arrays
+
+
+def binary_response(data: Any,
+                    arrays: Dict[str, np.ndarray],
+                    media: str) -> Response:
+    """ Return JSON data and numpy arrays in a binary wire format
+
+    Parameters:
+    -----------
+    data : Any
+        JSON serializable data without the arrays
+    arrays : Dict[str, np.ndarray]
+        Numeric arrays, e.g. the feature matrix
+    media : str
+        MEDIA_FRAME or MEDIA_MSGPACK, see `negotiate`
+    """
+    if media == MEDIA_MSGPACK:
+        content = pack_msgpack(data, arrays)
+    else:
+        content = pack_frame(data, arrays)
+    return Response(content=content, media_type=media,
+                    headers={"Vary": "Accept"})
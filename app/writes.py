@@ -0,0 +1,291 @@
+from typing import Hashable, List, Tuple
+import asyncio
+import collections
+import logging
+import cassandra as cas
+import cassandra.cluster
+import cassandra.query
+from .config import config_writes, config_write_behind
+from .cqlconn import aexecute
+from .statements import prepared
+
+# Write pipeline for the `IF NOT EXISTS` inserts of the annotation data
+# - The rows are grouped by partition key, and split into batches of at
+#   most `config_writes["BATCH_SIZE"]` statements, i.e. every batch is a
+#   single-partition LWT batch.
+# - At most `config_writes["CONCURRENCY"]` batches are in flight per call.
+# - Every batch is awaited, i.e. a row is reported as stored after
+#   Cassandra confirmed the write.
+# - Timeouts and unavailable replicas are retried with exponential backoff.
+#   All inserts are conditional, i.e. a retry is idempotent: a row that
+#   already exists (e.g. written by a timed out attempt, or sent twice by
+#   the app) counts as stored.
+# - Optionally, the rows of many requests are queued and written in groups
+#   by a background task (`WriteBehindQueue`, see `store_rows`).
+
+logger = logging.getLogger(__name__)
+
+# errors with a possibly transient cause
+RETRYABLE_ERRORS = (
+    cas.WriteTimeout, cas.Unavailable, cas.OperationTimedOut,
+    cas.CoordinationFailure, cas.cluster.NoHostAvailable)
+
+
+def _batch(stmt: cas.query.PreparedStatement,
+           params: List[list]) -> cas.query.BatchStatement:
+    batch = cas.query.BatchStatement(
+        consistency_level=getattr(
+            cas.ConsistencyLevel, config_writes["CONSISTENCY"]),
+        serial_consistency_level=getattr(
+            cas.ConsistencyLevel, config_writes["SERIAL_CONSISTENCY"]))
+    for p in params:
+        batch.add(stmt, p)
+    return batch
+
+
+async def _execute_with_retries(session: cas.cluster.Session,
+                                query) -> cas.cluster.ResultSet:
+    """ Execute an idempotent query, and retry on transient errors """
+    retries = config_writes["RETRIES"]
+    for attempt in range(retries + 1):
+        try:
+            return await aexecute(session, query)
+        except RETRYABLE_ERRORS as err:
+            if attempt == retries:
+                raise
+            logger.warning(f"Retry write ({attempt + 1}/{retries}): {err}")
+            await asyncio.sleep(config_writes["BACKOFF"] * 2 ** attempt)
+
+
+async def _write_chunk(session: cas.cluster.Session,
+                       stmt: cas.query.PreparedStatement,
+                       chunk: List[Tuple[Hashable, list]]) -> List[bool]:
+    """ Write the rows of one partition as conditional batch """
+    res = await _execute_with_retries(
+        session, _batch(stmt, [p for _, p in chunk]))
+    if res.was_applied:
+        return [True] * len(chunk)
+    # Some rows exist already, i.e. nothing was applied. Write each row
+    #  on its own, and count existing rows as stored.
+    if len(chunk) == 1:
+        return [True]
+    results = await asyncio.gather(*[
+        _execute_with_retries(session, _batch(stmt, [p]))
+        for _, p in chunk], return_exceptions=True)
+    return [not isinstance(r, Exception) for r in results]
+
+
+async def write_rows(session: cas.cluster.Session,
+                     stmt: cas.query.PreparedStatement,
+                     rows: List[Tuple[Hashable, str, list]]) -> dict:
+    """ Insert rows with a conditional (`IF NOT EXISTS`) statement
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    stmt : cas.query.PreparedStatement
+        The prepared `INSERT ... IF NOT EXISTS` statement
+    rows : List[Tuple[Hashable, str, list]]
+        The tuples `(key, partition_key, params)`. The `key` identifies a
+          row in the result, e.g. the `set_id`.
+
+    Return:
+    -------
+    dict
+        `{key: True/False}` if a row was stored or not
+    """
+    partitions = collections.defaultdict(list)
+    for key, partition_key, params in rows:
+        partitions[partition_key].append((key, params))
+    n = config_writes["BATCH_SIZE"]
+    chunks = [items[i:(i + n)] for items in partitions.values()
+              for i in range(0, len(items), n)]
+
+    semaphore = asyncio.Semaphore(config_writes["CONCURRENCY"])
+
+    async def run(chunk):
+        async with semaphore:
+            try:
+                return await _write_chunk(session, stmt, chunk)
+            except Exception as err:
+                logger.error(f"Failed to write {len(chunk)} rows: {err}")
+                return [False] * len(chunk)
+
+    results = await asyncio.gather(*[run(chunk) for chunk in chunks])
+    stored = {}
+    for chunk, flags in zip(chunks, results):
+        for (key, _), flag in zip(chunk, flags):
+            stored[key] = flag
+    return stored
+
+
+class WriteBehindQueue(object):
+    def __init__(self,
+                 session: cas.cluster.Session,
+                 maxsize: int,
+                 flush_size: int,
+                 flush_interval: float,
+                 put_timeout: float):
+        """ Buffer inserts across requests, and write them in groups
+
+        Parameters:
+        -----------
+        session : cas.cluster.Session
+            A Cassandra Session object, i.e., an existing DB connection.
+        maxsize : int
+            The max. number of queued rows. Requests wait for free space
+              (backpressure).
+        flush_size : int
+            Write the queued rows if there are `flush_size` rows ...
+        flush_interval : float
+            ... or `flush_interval` seconds after the first queued row.
+        put_timeout : float
+            Seconds a request waits for free space before its rows are
+              rejected
+
+        Notes:
+        ------
+        - Rows are reported as stored as soon as they are queued. Rows that
+            can't be written later are logged and counted in `stats()`, i.e.
+            queued rows are lost if the worker crashes.
+        - Call `start()` and `stop()` in the running event loop. `stop()`
+            writes all queued rows.
+        """
+        self.session = session
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.task = None
+        self.counts = collections.Counter()
+
+    def start(self) -> None:
+        self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            await self.queue.put(None)  # flush all rows, and exit
+            await self.task
+            self.task = None
+
+    async def put_many(self,
+                       name: str,
+                       rows: List[Tuple[Hashable, str, list]]) -> dict:
+        """ Queue rows for the statement `name` (see `write_rows`)
+
+        Return:
+        -------
+        dict
+            `{key: True/False}` if a row was queued or rejected
+        """
+        queued = {}
+        for key, partition_key, params in rows:
+            try:
+                await asyncio.wait_for(
+                    self.queue.put((name, key, partition_key, params)),
+                    timeout=self.put_timeout)
+                queued[key] = True
+            except asyncio.TimeoutError:
+                self.counts["rejected"] += 1
+                queued[key] = False
+        self.counts["queued"] += sum(queued.values())
+        return queued
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            items = []
+            deadline = loop.time() + self.flush_interval
+            while item is not None:
+                items.append(item)
+                if len(items) >= self.flush_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            stopping = item is None
+            if items:
+                await self._flush(items)
+
+    async def _flush(self, items: list) -> None:
+        groups = collections.defaultdict(list)
+        for name, key, partition_key, params in items:
+            groups[name].append((key, partition_key, params))
+        for name, rows in groups.items():
+            try:
+                stored = await write_rows(
+                    self.session, prepared(self.session, name), rows)
+                n_failed = sum([1 for key, _, _ in rows if not stored[key]])
+            except Exception as err:
+                logger.error(err)
+                n_failed = len(rows)
+            if n_failed > 0:
+                logger.error(f"Write-behind: {n_failed} rows of '{name}' "
+                             "were not stored")
+            self.counts["flushes"] += 1
+            self.counts["written"] += len(rows) - n_failed
+            self.counts["failed"] += n_failed
+
+    def stats(self) -> dict:
+        return dict(self.counts, **{"queue-size": self.queue.qsize()})
+
+
+# The process-wide write-behind queue (if enabled)
+write_behind = None
+
+
+def start_write_behind(session: cas.cluster.Session) -> None:
+    """ Start the write-behind queue if enabled (FastAPI startup event) """
+    global write_behind
+    if config_write_behind["ENABLED"] and write_behind is None:
+        write_behind = WriteBehindQueue(
+            session,
+            maxsize=config_write_behind["MAXSIZE"],
+            flush_size=config_write_behind["FLUSH_SIZE"],
+            flush_interval=config_write_behind["FLUSH_INTERVAL"],
+            put_timeout=config_write_behind["PUT_TIMEOUT"])
+        write_behind.start()
+
+
+async def stop_write_behind() -> None:
+    """ Write all queued rows (FastAPI shutdown event) """
+    global write_behind
+    if write_behind is not None:
+        await write_behind.stop()
+        write_behind = None
+
+
+async def store_rows(session: cas.cluster.Session,
+                     name: str,
+                     rows: List[Tuple[Hashable, str, list]]) -> dict:
+    """ Queue the rows if the write-behind queue is enabled, or write them
+
+    Parameters:
+    -----------
+    session : cas.cluster.Session
+        A Cassandra Session object, i.e., an existing DB connection.
+    name : str
+        The name of the insert statement, see `QUERIES`
+    rows : List[Tuple[Hashable, str, list]]
+        The tuples `(key, partition_key, params)`, see `write_rows`
+
+    Return:
+    -------
+    dict
+        `{key: True/False}` if a row was stored (or queued) or not
+    """
+    if write_behind is not None:
+        return await write_behind.put_many(name, rows)
+    return await write_rows(session, prepared(session, name), rows)
@@ -0,0 +1,63 @@
+""" Latency and memory of request handling with and without per-request
+  `gc.collect()` (in-process, no database required)
+
+Usage:
+------
+    python -m test.bench_gc [n_rows] [n_requests]
+
+The heap is filled with `PartitionRow` objects as in the partition cache.
+Each simulated request builds the JSON items of a sampling endpoint.
+- "collect": the former policy, i.e. `gc.collect()` after each request
+- "tuned": `app.memory.configure()` and `app.memory.freeze()`
+"""
+from app import memory
+from app.partitions import PartitionRow
+import gc
+import sys
+import time
+import uuid
+import numpy as np
+
+
+def fill_heap(n_rows):
+    return [PartitionRow(
+        "headword", uuid.uuid4(), f"sentence {i} " * 10, uuid.uuid4(),
+        [[0, 8]], {"tag": "x"}, "biblio", "CC-BY", float(i))
+        for i in range(n_rows)]
+
+
+def request(rows):
+    items = []
+    for row in rows[:500]:
+        items.append({"id": str(row.example_id), "text": row.sentence,
+                      "spans": row.spans, "context": {"license": row.license}})
+    return len(items)
+
+
+def run(rows, n_requests, collect):
+    secs = []
+    for _ in range(n_requests):
+        t = time.perf_counter()
+        request(rows)
+        if collect:
+            gc.collect()
+        secs.append(time.perf_counter() - t)
+    return np.array(secs)
+
+
+def main(n_rows=200000, n_requests=300):
+    rows = fill_heap(n_rows)
+    before = memory.rss_bytes()
+    for name in ("collect", "tuned"):
+        if name == "tuned":
+            memory.configure()
+            memory.freeze()
+        secs = run(rows, n_requests, collect=(name == "collect"))
+        print((f"{name:8s} p50={np.percentile(secs, 50) * 1000:7.2f} ms  "
+               f"p99={np.percentile(secs, 99) * 1000:7.2f} ms  "
+               f"rss-growth={(memory.rss_bytes() - before) / 2**20:6.1f} MiB"))
+    print(memory.stats())
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,79 @@
+""" Concurrency benchmark against a running server (mixed heavy/light load)
+
+Usage:
+------
+    export API_URL=http://localhost:55017
+    export API_TOKEN=...  # see `POST /v1/auth/login`
+    python -m test.bench_load [n_requests] [n_threads]
+
+The heavy requests (similarity matrices, training examples) download and
+decode whole partitions, the light requests only return random sentences.
+The p99 latency of the light requests must not collapse while heavy
+requests are running. The RSS and GC pauses of the serving worker are
+read from `GET /v1/stats` before and after the run.
+"""
+import concurrent.futures
+import os
+import random
+import requests
+import sys
+import time
+import numpy as np
+
+
+API_URL = os.environ.get("API_URL", "http://localhost:55017")
+API_TOKEN = os.environ.get("API_TOKEN", "")
+HEADWORDS = os.environ.get("BENCH_HEADWORDS", "Internet,Fahrrad").split(",")
+
+
+def heavy_request(session):
+    headword = random.choice(HEADWORDS)
+    if random.random() < 0.5:
+        return session.post(
+            f"{API_URL}/v1/variation/similarity-matrices",
+            json={"headword": headword, "limit": 1000})
+    return session.post(
+        f"{API_URL}/v1/interactivity/training-examples/100/1000/0",
+        json={"headword": headword})
+
+
+def light_request(session):
+    return session.get(f"{API_URL}/v1/bestworst/random/5")
+
+
+def timed(kind):
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {API_TOKEN}"
+    fn = heavy_request if kind == "heavy" else light_request
+    t = time.perf_counter()
+    res = fn(session)
+    return kind, res.status_code, time.perf_counter() - t
+
+
+def memory_stats():
+    res = requests.get(f"{API_URL}/v1/stats",
+                       headers={"Authorization": f"Bearer {API_TOKEN}"})
+    return res.json().get("memory", {}) if res.status_code == 200 else {}
+
+
+def main(n_requests=200, n_threads=16):
+    before = memory_stats()
+    kinds = ["heavy" if i % 4 == 0 else "light" for i in range(n_requests)]
+    with concurrent.futures.ThreadPoolExecutor(n_threads) as executor:
+        results = list(executor.map(timed, kinds))
+    for kind in ("heavy", "light"):
+        secs = np.array([s for k, _, s in results if k == kind])
+        errors = sum([1 for k, c, _ in results if k == kind and c != 200])
+        print((f"{kind:5s} n={len(secs):4d} errors={errors:3d}  "
+               f"p50={np.percentile(secs, 50) * 1000:8.1f} ms  "
+               f"p99={np.percentile(secs, 99) * 1000:8.1f} ms"))
+    after = memory_stats()
+    if before and after:
+        print((f"rss={after['rss'] / 2**20:.1f} MiB "
+               f"(+{(after['rss'] - before['rss']) / 2**20:.1f} MiB)  "
+               f"gc-pauses={after['gc-pauses'] - before['gc-pauses']}  "
+               f"gc-pause-max={after['gc-pause-max-ms']} ms"))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,78 @@
+""" Login storm against a running server
+
+Usage:
+------
+    export API_URL=http://localhost:55017
+    export API_TOKEN=...  # see `POST /v1/auth/login`
+    export BENCH_EMAIL=... BENCH_PASSWORD=...  # a test account
+    python -m test.bench_login [n_logins] [n_threads]
+
+Measures the latency of annotation requests (random sentences) without
+load, and while `n_logins` logins are sent from `n_threads` threads. The
+p99 latency of the annotation requests must not collapse during the
+login storm. Rejected logins (429/503, see `app/ratelimit.py`) are
+counted separately.
+"""
+import collections
+import concurrent.futures
+import os
+import requests
+import sys
+import threading
+import time
+import numpy as np
+
+
+API_URL = os.environ.get("API_URL", "http://localhost:55017")
+API_TOKEN = os.environ.get("API_TOKEN", "")
+BENCH_EMAIL = os.environ.get("BENCH_EMAIL", "nobody@example.com")
+BENCH_PASSWORD = os.environ.get("BENCH_PASSWORD", "supersecret")
+
+
+def login(i):
+    # the same account (throttled), or other accounts (wrong password)
+    email = BENCH_EMAIL if i % 2 == 0 else f"bench{i}@example.com"
+    res = requests.post(f"{API_URL}/v1/auth/login",
+                        data={"username": email, "password": BENCH_PASSWORD})
+    return res.status_code
+
+
+def annotation_latencies(stop, secs=None):
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {API_TOKEN}"
+    latencies = []
+    t_end = time.perf_counter() + secs if secs else None
+    while not stop.is_set():
+        if t_end and time.perf_counter() > t_end:
+            break
+        t = time.perf_counter()
+        session.get(f"{API_URL}/v1/bestworst/random/5")
+        latencies.append(time.perf_counter() - t)
+    return np.array(latencies)
+
+
+def report(name, secs):
+    print((f"{name:12s} n={len(secs):5d}  "
+           f"p50={np.percentile(secs, 50) * 1000:8.1f} ms  "
+           f"p99={np.percentile(secs, 99) * 1000:8.1f} ms"))
+
+
+def main(n_logins=500, n_threads=32):
+    # baseline
+    report("idle", annotation_latencies(threading.Event(), secs=5.0))
+
+    # login storm
+    stop = threading.Event()
+    with concurrent.futures.ThreadPoolExecutor(n_threads + 1) as executor:
+        annotations = executor.submit(annotation_latencies, stop)
+        t = time.perf_counter()
+        codes = collections.Counter(executor.map(login, range(n_logins)))
+        elapsed = time.perf_counter() - t
+        stop.set()
+        report("login storm", annotations.result())
+    print(f"{n_logins} logins in {elapsed:.1f} s, status codes: "
+          f"{dict(sorted(codes.items()))}")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,27 @@
+""" Micro-benchmark of `app.transform.i2f` against the former implementation
+
+Usage:
+------
+    python -m test.bench_transform
+"""
+from app.transform import i2f
+from test.test_transform import i2f_reference, random_features
+import numpy as np
+import timeit
+
+
+def main():
+    for n in (100, 1000, 5000):
+        feats = random_features(n)
+        out = np.empty(i2f(*feats).shape, dtype=np.float32)
+        runs = max(3, 3000 // n)
+        for name, fn in [
+                ("reference", lambda: i2f_reference(*feats)),
+                ("i2f", lambda: i2f(*feats)),
+                ("i2f(out=...)", lambda: i2f(*feats, out=out))]:
+            secs = min(timeit.repeat(fn, number=runs, repeat=3)) / runs
+            print(f"n={n:5d}  {name:14s} {secs * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+""" Throughput of the write pipeline `app.writes.write_rows`, and request
+  latency with and without the write-behind queue against a local
+  stand-in for Cassandra (fixed latency per request)
+
+Usage:
+------
+    python -m test.bench_writes [n_rows] [latency_ms]
+"""
+from app.config import config_writes
+from app.writes import write_rows, WriteBehindQueue
+from test.test_writes import FakeCqlSession, rows
+import app.writes
+import asyncio
+import sys
+import time
+import numpy as np
+
+
+async def requests_latency(session, queue, n_requests=200, n_rows=3):
+    """ Latency of concurrent small requests (3 rows each) """
+    async def request(i):
+        t = time.perf_counter()
+        payload = [(f"{i}-{j}", f"headword{i % 10}", [f"{i}-{j}"])
+                   for j in range(n_rows)]
+        if queue is not None:
+            await queue.put_many("insert_evaluated_bestworst", payload)
+        else:
+            await write_rows(session, "INSERT %s", payload)
+        return time.perf_counter() - t
+
+    if queue is not None:
+        queue.start()
+    secs = await asyncio.gather(*[request(i) for i in range(n_requests)])
+    if queue is not None:
+        await queue.stop()
+    return np.array(secs)
+
+
+def main(n_rows=2000, latency_ms=5):
+    payload = [row for i in range(10) for row in rows(
+        n_rows // 10, headword=f"headword{i}")]
+    for batch_size, concurrency in [
+            (1, 1), (1, 8), (20, 1), (20, 8), (50, 8), (20, 32)]:
+        config_writes["BATCH_SIZE"] = batch_size
+        config_writes["CONCURRENCY"] = concurrency
+        session = FakeCqlSession(latency=latency_ms / 1000)
+        t = time.perf_counter()
+        stored = asyncio.run(write_rows(session, "INSERT %s", payload))
+        secs = time.perf_counter() - t
+        assert all(stored.values())
+        print((f"batch_size={batch_size:3d} concurrency={concurrency:3d}  "
+               f"{len(session.batch_sizes):5d} requests  "
+               f"{len(payload) / secs:9.0f} rows/s"))
+
+    config_writes["BATCH_SIZE"] = 20
+    config_writes["CONCURRENCY"] = 8
+    app.writes.prepared = lambda session, name: "INSERT %s"
+    for name in ("direct", "write-behind"):
+        session = FakeCqlSession(latency=latency_ms / 1000)
+        queue = None if name == "direct" else WriteBehindQueue(
+            session, maxsize=10000, flush_size=200, flush_interval=0.05,
+            put_timeout=1.0)
+        secs = asyncio.run(requests_latency(session, queue))
+        print((f"{name:12s} p50={np.percentile(secs, 50) * 1000:7.2f} ms  "
+               f"p99={np.percentile(secs, 99) * 1000:7.2f} ms  "
+               f"{len(session.batch_sizes):4d} Cassandra requests"))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
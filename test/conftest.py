@@ -0,0 +1,22 @@
+from app.partitions import build_partition, partition_cache
+from test.test_partitions import FakeSession
+import pytest
+
+
+@pytest.fixture
+def cached_partition():
+    """ Put the partition of `rows` into `partition_cache`, i.e.
+      `cached_partition(rows, headword="Fahrrad")` returns the partition.
+      The cached partitions are removed after the test. """
+    keys = []
+
+    def cache(rows: list, headword: str = "Fahrrad"):
+        key = (FakeSession.keyspace, headword)
+        partition = build_partition(rows)
+        partition_cache.set(key, partition)
+        keys.append(key)
+        return partition
+
+    yield cache
+    for key in keys:
+        partition_cache.pop(key)
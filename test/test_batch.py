@@ -0,0 +1,78 @@
+from app.batch import read_headwords, map_headwords, batch_response
+from app.routers.interactivity_training_examples import (
+    get_examples_with_features_batch, sample_training_examples)
+from app.routers.bestworst_samples import sample_example_sets
+from app.wire import MEDIA_JSON, MEDIA_FRAME, unpack_frame
+from test.test_partitions import random_rows, FakeSession
+import asyncio
+import pytest
+import numpy as np
+
+
+def test_read_headwords():
+    assert read_headwords({"headwords": ["a", "b"]}) == ["a", "b"]
+    with pytest.raises(ValueError):
+        read_headwords({"headword": "a"})
+    with pytest.raises(ValueError):
+        read_headwords({"headwords": ["a"] * 1000})
+
+
+def test_map_headwords_concurrency():
+    running, peak = [0], [0]
+
+    async def fn(headword):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        if headword == "b":
+            raise RuntimeError("boom")
+        return {"status": "success", "data": headword}
+
+    results = asyncio.run(map_headwords(fn, list("abcdefghij")))
+    assert [r["status"] for r in results].count("failed") == 1
+    assert results[1] == {"status": "failed", "msg": "boom"}
+    assert results[0]["data"] == "a"
+    assert 1 < peak[0] <= 4
+
+
+def test_batch_response():
+    results = [
+        {"status": "success", "data": [1], "features": np.ones((1, 2))},
+        {"status": "failed", "msg": "no sentences found."}]
+    data = batch_response(["a", "b"], results, MEDIA_JSON)
+    assert data["status"] == "partial"
+    assert data["results"][0] == {
+        "status": "success", "data": [1], "headword": "a"}
+    res = batch_response(["a", "b"], results, MEDIA_FRAME)
+    data, arrays = unpack_frame(res.body)
+    assert data["results"][0]["features"] == "features-0"
+    np.testing.assert_array_equal(arrays["features-0"], np.ones((1, 2)))
+
+
+def test_training_examples_batch(cached_partition):
+    partition = cached_partition(random_rows(30))
+    data = asyncio.run(get_examples_with_features_batch(
+        5, 20, 0, {"headwords": ["Fahrrad", "Unbekannt"]},
+        session=FakeSession(), media=MEDIA_JSON))
+    assert data["status"] == "partial"
+    result, failed = data["results"]
+    assert result["headword"] == "Fahrrad"
+    assert len(result["data"]) == 5
+    assert len(result["data"][0]["features"]) == partition.feats.shape[1]
+    assert failed["status"] == "failed"
+
+
+def test_training_examples_top_window(cached_partition):
+    partition = cached_partition(random_rows(30))
+    top = {str(row.example_id) for row in partition.top(10).rows}
+    # less sentences than n_offset, i.e. the offset is not applied
+    for n_offset in (50, 0):
+        result = asyncio.run(sample_training_examples(
+            FakeSession(), "Fahrrad", 5, 10, n_offset, MEDIA_JSON))
+        assert len(result["data"]) == 5
+        assert {item["example_id"] for item in result["data"]} <= top
+    result = asyncio.run(sample_example_sets(
+        FakeSession(), "Fahrrad", 4, 10, 50, MEDIA_JSON))
+    assert {ex["example_id"] for bwset in result["data"]
+            for ex in bwset["examples"]} <= top
@@ -0,0 +1,108 @@
+from app.cache import TTLCache, ResponseCache
+import asyncio
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_size_bound():
+    cache = TTLCache(maxsize=10, ttl=60, getsizeof=len)
+    cache.set("a", "x" * 6)
+    cache.set("b", "x" * 6)
+    assert cache.get("a") is None
+    assert cache.currsize == 6
+    cache.set("c", "x" * 11)  # larger than the whole cache
+    assert cache.get("c") is None
+    assert cache.get("b") == "x" * 6
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=10, timer=clock)
+    cache.set("a", 1)
+    clock.now += 10
+    assert cache.get("a") == 1
+    clock.now += 0.001
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_ttl_per_entry():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, timer=clock)
+    cache.set("a", False, ttl=10)
+    cache.set("b", True)
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.get("b") is True
+
+
+class FakeRedis(object):
+    """ In-memory stub of `redis.asyncio.Redis` """
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def test_response_cache_shared():
+    redis = FakeRedis()
+    worker1 = ResponseCache("simi", maxbytes=100, ttl=60, redis=redis)
+    worker2 = ResponseCache("simi", maxbytes=100, ttl=60, redis=redis)
+    asyncio.run(worker1.set("etag", b"body"))
+    assert redis.data == {"simi:etag": b"body"}
+    assert asyncio.run(worker2.get("etag")) == b"body"
+    assert worker2.local.get("etag") == b"body"
+    assert asyncio.run(worker2.get("other")) is None
+
+
+def test_response_cache_size_bound():
+    cache = ResponseCache("simi", maxbytes=10, ttl=60)
+    asyncio.run(cache.set("a", b"12345"))
+    asyncio.run(cache.set("b", b"123456"))
+    assert asyncio.run(cache.get("a")) is None
+    assert asyncio.run(cache.get("b")) == b"123456"
+
+
+def test_active_user_shared_negative_ttl(monkeypatch):
+    import app.routers.auth_email as auth_email
+    from app.config import config_active_user_cache
+    redis = FakeRedis()
+    redis.data = {"isactive:user1": b"0", "isactive:user2": b"1"}
+    monkeypatch.setattr(auth_email, "active_user_redis", redis)
+    clock = FakeClock()
+    monkeypatch.setattr(auth_email, "active_user_cache", TTLCache(
+        maxsize=10, ttl=config_active_user_cache["TTL"], timer=clock))
+    assert asyncio.run(auth_email.is_active_user_cached(None, "user1")) \
+        is False
+    assert asyncio.run(auth_email.is_active_user_cached(None, "user2"))
+    expiry = {key: entry[0] for key, entry in
+              auth_email.active_user_cache.data.items()}
+    ttl = {key: expiry[key] - clock.now for key in expiry}
+    assert ttl["user1"] <= config_active_user_cache["NEGATIVE_TTL"]
+    assert ttl["user2"] > config_active_user_cache["NEGATIVE_TTL"]
@@ -0,0 +1,41 @@
+from app.cqlconn import _cas_add_columns
+from app.statements import get_registry
+import types
+
+
+class FakeDdlSession(object):
+    """ `model_weights` with the columns of the JSON weights only """
+    keyspace = "evidence"
+
+    def __init__(self, columns):
+        table = types.SimpleNamespace(columns=dict.fromkeys(columns))
+        keyspace = types.SimpleNamespace(tables={"model_weights": table})
+        self.cluster = types.SimpleNamespace(
+            refresh_table_metadata=lambda keyspace, table: None,
+            metadata=types.SimpleNamespace(
+                keyspaces={"evidence": keyspace}))
+        self.queries = []
+
+    def execute(self, query):
+        self.queries.append(query)
+
+    def prepare(self, query):
+        return query
+
+
+def test_add_columns_invalidates_statements():
+    session = FakeDdlSession(["user_id", "updated_at", "weights"])
+    registry = get_registry(session)
+    stmt = registry.get("select_model_weights_latest")
+    _cas_add_columns(session, "evidence", "model_weights", {
+        "weights": "TEXT", "manifest": "TEXT"})
+    assert session.queries == [
+        "ALTER TABLE evidence.model_weights ADD manifest TEXT;"]
+    assert registry.statements == {}
+    assert registry.get("select_model_weights_latest") == stmt
+
+    # nothing to migrate
+    registry.get("select_model_weights_latest")
+    _cas_add_columns(session, "evidence", "model_weights", {
+        "weights": "TEXT"})
+    assert len(registry.statements) == 1
@@ -0,0 +1,43 @@
+from app.config import config_cursors
+from app.cursors import encode_cursor, decode_cursor, InvalidCursor
+import time
+import pytest
+
+
+def test_cursor_roundtrip():
+    paging_state = bytes(range(256))
+    token = encode_cursor(paging_state, user="u1", headword="Fahrrad")
+    assert isinstance(token, str) and "/" not in token and "+" not in token
+    assert decode_cursor(token, user="u1", headword="Fahrrad") == paging_state
+
+
+def test_cursor_first_and_last_page():
+    assert encode_cursor(None, user="u1") is None
+    assert decode_cursor(None, user="u1") is None
+    assert decode_cursor("", user="u1") is None
+
+
+def test_cursor_scope():
+    token = encode_cursor(b"state", user="u1", headword="Fahrrad")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, user="u2", headword="Fahrrad")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, user="u1", headword="Internet")
+
+
+def test_cursor_tampered():
+    token = encode_cursor(b"state", user="u1")
+    payload, signature = token.split(".")
+    forged = encode_cursor(b"other", user="u1").split(".")[0]
+    with pytest.raises(InvalidCursor):
+        decode_cursor(f"{forged}.{signature}", user="u1")
+    with pytest.raises(InvalidCursor):
+        decode_cursor("garbage", user="u1")
+
+
+def test_cursor_expired(monkeypatch):
+    token = encode_cursor(b"state", user="u1")
+    monkeypatch.setattr(
+        time, "time", lambda: 1e10 + config_cursors["TTL"])
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, user="u1")
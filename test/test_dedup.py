@@ -0,0 +1,107 @@
+from app.dedup import duplicate_groups, dedup_indices, read_dedup
+from app.routers.bestworst_samples import (
+    sample_example_sets, get_bestworst_example_sets)
+from app.routers.interactivity_training_examples import (
+    get_examples_with_features_batch)
+from app.wire import MEDIA_JSON
+from test.test_partitions import random_rows, FakeSession
+import asyncio
+import numpy as np
+import pytest
+
+
+def test_identical_hashes():
+    rng = np.random.default_rng(42)
+    hashes = rng.integers(0, 2**31, (10, 8)).astype(np.int32)
+    hashes[4] = hashes[1]
+    hashes[9] = hashes[1]
+    hashes[7] = hashes[2]
+    groups = duplicate_groups(hashes, 1.0)
+    assert groups.tolist() == [0, 1, 2, 3, 1, 5, 6, 2, 8, 1]
+    assert dedup_indices(hashes, 1.0) == [0, 1, 2, 3, 5, 6, 8]
+
+
+def test_threshold():
+    rng = np.random.default_rng(42)
+    hashes = rng.integers(0, 2**31, (6, 8)).astype(np.int32)
+    hashes[3, :6] = hashes[0, :6]  # 6 of 8 equal
+    hashes[5, :3] = hashes[0, :3]  # 3 of 8 equal
+    assert dedup_indices(hashes, 1.0) == list(range(6))
+    assert dedup_indices(hashes, 0.75) == [0, 1, 2, 4, 5]
+    assert dedup_indices(hashes, 0.375) == [0, 1, 2, 4]
+    assert dedup_indices(np.empty((0, 8), dtype=np.int32)) == []
+
+
+def test_matches_within_bucket():
+    # rows 1 and 2 match (3 of 4), but not the 1st row of their bucket
+    hashes = np.array([[1, 2, 7, 7], [1, 2, 3, 4], [1, 2, 3, 5]])
+    assert duplicate_groups(hashes, 0.75).tolist() == [0, 1, 1]
+    assert dedup_indices(hashes, 0.75) == [0, 1]
+
+
+def test_brute_force():
+    rng = np.random.default_rng(42)
+    hashes = rng.integers(0, 3, (60, 8)).astype(np.int32)
+    equal = (hashes[:, None, :] == hashes[None, :, :]).sum(axis=2)
+    for threshold in (1.0, 0.75, 0.5):
+        groups = duplicate_groups(hashes, threshold)
+        matches = equal >= np.ceil(threshold * 8)
+        keep = dedup_indices(hashes, threshold)
+        # the kept rows are pairwise dissimilar
+        assert matches[np.ix_(keep, keep)].sum() == len(keep)
+        # each dropped row is similar to an earlier kept row
+        for i, g in enumerate(groups.tolist()):
+            assert g <= i and matches[i, g]
+            assert g == min([j for j in keep if matches[i, j]])
+
+
+def test_not_transitive():
+    # 0~1 and 1~2 (3 of 4 equal), but not 0~2
+    hashes = np.array([[1, 2, 3, 4], [1, 2, 3, 5], [1, 2, 6, 5]])
+    assert duplicate_groups(hashes, 0.75).tolist() == [0, 0, 2]
+    assert duplicate_groups(hashes, 0.5).tolist() == [0, 0, 0]
+
+
+def test_read_dedup():
+    assert read_dedup({}) == {"dedup": False, "dedup_threshold": None}
+    assert read_dedup({"dedup": True, "dedup_threshold": "0.5"}) == {
+        "dedup": True, "dedup_threshold": 0.5}
+    for threshold in (0, 1.5, "high", [1]):
+        with pytest.raises(ValueError):
+            read_dedup({"dedup": True, "dedup_threshold": threshold})
+    for dedup in ("false", "true", 1, None):
+        with pytest.raises(ValueError):
+            read_dedup({"dedup": dedup})
+    with pytest.raises(ValueError):
+        duplicate_groups(np.zeros((2, 8), dtype=np.int32), 2.0)
+
+
+def test_invalid_dedup_threshold():
+    res = asyncio.run(get_bestworst_example_sets(
+        4, 3, 10, 0, {"headword": "Fahrrad", "dedup": True,
+                      "dedup_threshold": 2}, session=FakeSession(),
+        media=MEDIA_JSON))
+    assert res["status"] == "failed"
+    res = asyncio.run(get_bestworst_example_sets(
+        4, 3, 10, 0, {"headword": "Fahrrad", "dedup": "false"},
+        session=FakeSession(), media=MEDIA_JSON))
+    assert res["status"] == "failed"
+    res = asyncio.run(get_examples_with_features_batch(
+        5, 10, 0, {"headwords": ["Fahrrad"], "dedup_threshold": "x"},
+        session=FakeSession(), media=MEDIA_JSON))
+    assert res["status"] == "failed"
+
+
+def test_sample_example_sets_dedup(cached_partition):
+    rows = random_rows(30)
+    rows = [row._replace(hashes16=[1] * 8) if i % 2 else row
+            for i, row in enumerate(rows)]  # 15 duplicates
+    partition = cached_partition(rows)
+    result = asyncio.run(sample_example_sets(
+        FakeSession(), "Fahrrad", 4, 30, 0, MEDIA_JSON, dedup=True))
+    assert result["status"] == "success"
+    example_ids = {ex["example_id"] for bwset in result["data"]
+                   for ex in bwset["examples"]}
+    duplicates = {str(partition.rows[i].example_id) for i in range(30)
+                  if (partition.hashes16[i] == 1).all()}
+    assert len(example_ids & duplicates) == 1
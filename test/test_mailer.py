@@ -0,0 +1,151 @@
+from app.mailer import Mailer, is_transient
+from email.message import EmailMessage
+import asyncio
+import smtplib
+import time
+import pytest
+
+
+def message(i):
+    msg = EmailMessage()
+    msg.set_content(f"Please confirm your registration:\n{i}")
+    msg['Subject'] = "Please confirm your registration"
+    msg['From'] = "noreply@example.com"
+    msg['To'] = f"user{i}@example.com"
+    return msg
+
+
+class FakeSMTP(object):
+    """ Stand-in for a logged-in `smtplib.SMTP` connection """
+    def __init__(self, relay):
+        self.relay = relay
+
+    def send_message(self, msg):
+        errors = self.relay.errors.get(msg['To'])
+        if errors:
+            raise errors.pop(0)
+        self.relay.sent.append(msg['To'])
+
+    def quit(self):
+        self.relay.closed += 1
+
+    def close(self):
+        self.relay.closed += 1
+
+
+class FakeRelay(object):
+    def __init__(self, errors=None):
+        self.errors = errors or {}  # errors of each recipient
+        self.sent = []
+        self.connections = 0
+        self.closed = 0
+
+    def connect(self):
+        self.connections += 1
+        return FakeSMTP(self)
+
+
+def mailer(connect, **kwargs):
+    options = dict(maxsize=100, rate=1000.0, retries=3, backoff=0.0,
+                   idle_timeout=1.0)
+    options.update(kwargs)
+    return Mailer(connect, **options)
+
+
+def test_reuse_connection():
+    relay = FakeRelay()
+
+    async def run():
+        queue = mailer(relay.connect)
+        queue.start()
+        assert all([queue.put(message(i)) for i in range(10)])
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert relay.sent == [f"user{i}@example.com" for i in range(10)]
+    assert relay.connections == 1 and relay.closed == 1
+    assert stats["sent"] == 10 and stats["queue-size"] == 0
+
+
+def test_retries():
+    relay = FakeRelay(errors={
+        "user0@example.com": [
+            smtplib.SMTPServerDisconnected("gone"),
+            smtplib.SMTPResponseException(421, b"try again")],
+        "user1@example.com": [
+            smtplib.SMTPRecipientsRefused(
+                {"user1@example.com": (550, b"no")})]})
+
+    async def run():
+        queue = mailer(relay.connect)
+        queue.start()
+        queue.put(message(0))  # 2 transient errors, then sent
+        queue.put(message(1))  # permanent error
+        queue.put(message(2))
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert relay.sent == ["user0@example.com", "user2@example.com"]
+    assert stats["retries"] == 2 and stats["failed"] == 1
+    assert relay.connections == 4  # reconnect after each error
+
+
+def test_rate_limit_and_backpressure():
+    relay = FakeRelay()
+
+    async def run():
+        queue = mailer(relay.connect, maxsize=5, rate=50.0)
+        queued = [queue.put(message(i)) for i in range(6)]
+        t = time.perf_counter()
+        queue.start()
+        await queue.stop()
+        return queued, time.perf_counter() - t
+
+    queued, elapsed = asyncio.run(run())
+    assert queued == [True] * 5 + [False]
+    assert len(relay.sent) == 5
+    assert elapsed >= 4 / 50.0
+
+
+def test_is_transient():
+    assert is_transient(ConnectionRefusedError())
+    assert is_transient(smtplib.SMTPResponseException(451, b"later"))
+    assert not is_transient(smtplib.SMTPResponseException(554, b"no"))
+    assert not is_transient(smtplib.SMTPAuthenticationError(535, b"no"))
+
+
+def test_aiosmtpd_relay():
+    aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+    aiosmtpd_handlers = pytest.importorskip("aiosmtpd.handlers")
+    handler = aiosmtpd_handlers.Sink()
+    received = []
+
+    async def handle_DATA(server, session, envelope):
+        received.append(envelope.rcpt_tos)
+        return "250 OK"
+
+    handler.handle_DATA = handle_DATA
+    controller = aiosmtpd_controller.Controller(
+        handler, hostname="127.0.0.1", port=0)
+    controller.start()
+    connections = []
+
+    def connect():
+        connections.append(1)
+        return smtplib.SMTP(controller.hostname, controller.port, timeout=5)
+
+    async def run():
+        queue = mailer(connect)
+        queue.start()
+        for i in range(3):
+            queue.put(message(i))
+        await queue.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        controller.stop()
+    assert received == [[f"user{i}@example.com"] for i in range(3)]
+    assert len(connections) == 1
@@ -4,31 +4,35 @@ from app.main import app, version
 
 
 # get an global access token
-client = TestClient(app)
+# - use `TestClient` as context manager to run the startup/shutdown events,
+#   i.e. to open the DB connection pools in the client's event loop
 testusercreds = {"username": "nobody@example.com", "password": "supersecret"}
-resp = client.post(f"/{version}/auth/login", testusercreds)
+with TestClient(app) as client:
+    resp = client.post(f"/{version}/auth/login", data=testusercreds)
 TOKEN = resp.json()['access_token']
 headers = {'Authorization': f"Bearer {TOKEN}"}
 del resp
 
 
 def test1():
-    client = TestClient(app)
-    response = client.post(f"/{version}/auth/login", testusercreds)
+    with TestClient(app) as client:
+        response = client.post(f"/{version}/auth/login", data=testusercreds)
     assert 'access_token' in response.json()
     assert response.json()['token_type'] == 'bearer'
 
 
 def test2():
-    client = TestClient(app)
-    response = client.get(f"/{version}/bestworst/random/5", headers=headers)
+    with TestClient(app) as client:
+        response = client.get(f"/{version}/bestworst/random/5",
+                              headers=headers)
     assert response.status_code == 200
     assert len(response.json()) == 5
 
 
 def test3():
-    client = TestClient(app)
-    response = client.get(f"/{version}/bestworst/random/4/10", headers=headers)
+    with TestClient(app) as client:
+        response = client.get(f"/{version}/bestworst/random/4/10",
+                              headers=headers)
     assert response.status_code == 200
     assert len(response.json()[0]["examples"]) == 4
     assert len(response.json()) == 10
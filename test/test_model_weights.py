@@ -0,0 +1,114 @@
+from app.config import config_model_weights
+from app.wire import MEDIA_JSON
+import app.routers.model_weights as mw
+import asyncio
+import collections
+import datetime
+import uuid
+
+USER_ID = str(uuid.uuid4())
+
+Row = collections.namedtuple(
+    "Row", ["updated_at", "weights", "weights_blob", "manifest", "nbytes"])
+Result = collections.namedtuple(
+    "Result", ["current_rows", "paging_state"])
+Applied = collections.namedtuple("Applied", ["applied"])
+
+
+class FakeStatement(object):
+    def __init__(self, name):
+        self.name = name
+        self.parameters = None
+        self.fetch_size = None
+
+    def bind(self, parameters):
+        self.parameters = parameters
+        return self
+
+
+class FakeTable(object):
+    """ `model_weights` of one user, latest snapshot first """
+    def __init__(self):
+        self.rows = []
+        self.now = datetime.datetime(2026, 1, 1)
+
+    async def aexecute(self, session, stmt, parameters=None,
+                       paging_state=None):
+        parameters = parameters or stmt.parameters
+        if stmt.name.startswith("insert_model_weights"):
+            self.now += datetime.timedelta(seconds=1)
+            if stmt.name.endswith("_blob"):
+                blob, manifest, nbytes = parameters[2:5]
+                row = Row(self.now, None, blob, manifest, nbytes)
+            else:
+                row = Row(self.now, parameters[2], None, None, parameters[3])
+            self.rows.insert(0, row)
+            return [Applied(True)]
+        if stmt.name == "select_model_weights_timestamps":
+            return Result(self.rows[:parameters[1]], None)
+        if stmt.name == "delete_model_weights_before":
+            self.rows = [r for r in self.rows if r.updated_at >= parameters[1]]
+            return Result([], None)
+        if stmt.name == "select_model_weights_at":
+            return Result([r for r in self.rows
+                           if r.updated_at == parameters[1]], None)
+        if stmt.name == "select_model_weights_list":
+            start = int(paging_state or 0)
+            end = start + stmt.fetch_size
+            return Result(self.rows[start:end],
+                          str(end).encode() if end < len(self.rows) else None)
+        raise NotImplementedError(stmt.name)
+
+
+def fake_table(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(mw, "prepared", lambda s, name: FakeStatement(name))
+    monkeypatch.setattr(mw, "aexecute", table.aexecute)
+    return table
+
+
+def test_keep_last(monkeypatch):
+    monkeypatch.setitem(config_model_weights, "KEEP_LAST", 3)
+    table = fake_table(monkeypatch)
+    for i in range(5):
+        res = asyncio.run(mw.save_model_weights(
+            {"weights": [0.1 * i, 0.2]}, user_id=USER_ID, session=None))
+        assert res == {"status": "success"}
+    assert len(table.rows) == 3
+    assert table.rows[-1].updated_at == datetime.datetime(2026, 1, 1, 0, 0, 3)
+
+
+def test_list_and_load_at(monkeypatch):
+    monkeypatch.setitem(config_model_weights, "KEEP_LAST", 0)
+    fake_table(monkeypatch)
+    for weights in [[1.0, 2.0], [[1.0], [2.0, 3.0]], ["a", "b"]]:
+        asyncio.run(mw.save_model_weights(
+            {"weights": weights}, user_id=USER_ID, session=None))
+
+    page1 = asyncio.run(mw.list_model_weights(
+        {"limit": 2}, user_id=USER_ID, session=None))
+    assert page1["num"] == 2 and page1["cursor"] is not None
+    assert page1["data"][0]["format"] == "json"
+    assert page1["data"][1]["dtype"] == "float32"
+    assert page1["data"][1]["nbytes"] == 12
+    assert "weights" not in page1["data"][1]
+    page2 = asyncio.run(mw.list_model_weights(
+        {"limit": 2, "cursor": page1["cursor"]}, user_id=USER_ID,
+        session=None))
+    assert page2["num"] == 1 and page2["cursor"] is None
+
+    # the cursor is bound to the user
+    res = asyncio.run(mw.list_model_weights(
+        {"cursor": page1["cursor"]}, user_id=str(uuid.uuid4()),
+        session=None))
+    assert res["status"] == "failed"
+
+    timestamp = page2["data"][0]["updated_at"].isoformat()
+    res = asyncio.run(mw.load_model_weights_at(
+        {"timestamp": timestamp}, user_id=USER_ID, session=None,
+        media=MEDIA_JSON))
+    assert res["weights"] == [1.0, 2.0]
+    res = asyncio.run(mw.load_model_weights_at(
+        {"timestamp": "yesterday"}, user_id=USER_ID, session=None,
+        media=MEDIA_JSON))
+    assert res["status"] == "failed"
@@ -0,0 +1,116 @@
+from app.partitions import (
+    build_partition, decode_features, get_top_partition, get_top_rows,
+    get_row_features)
+import app.partitions
+from test.test_transform import random_features
+import asyncio
+import collections
+import uuid
+import numpy as np
+
+
+# a `select_features` row of the Cassandra driver
+FeaturesRow = collections.namedtuple("FeaturesRow", [
+    "headword", "example_id", "sentence", "sent_id", "spans", "annot",
+    "biblio", "license", "score",
+    "feats1", "feats2", "feats3", "feats4", "feats5", "feats6", "feats7",
+    "feats8", "feats9", "feats12", "feats13", "feats14",
+    "hashes15", "hashes16", "hashes18"])
+
+
+def random_rows(n: int, seed: int = 42, headword: str = "Fahrrad") -> list:
+    """ Random `select_features` rows of a headword """
+    rng = np.random.default_rng(seed)
+    feats = random_features(n, seed)
+    scores = rng.integers(0, 20, size=n) / 10.  # with ties
+    hashes = rng.integers(0, 4, size=(3, n, 8)).tolist()
+    return [FeaturesRow(
+        headword, uuid.uuid4(), f"Satz {i} mit {headword}.", uuid.uuid4(),
+        [[0, 4]], "", f"biblio {i % 3}", "CC-BY-4.0", float(scores[i]),
+        *[f[i] for f in feats], *[h[i] for h in hashes])
+        for i in range(n)]
+
+
+class FakeSession(object):
+    keyspace = "evidence"
+
+
+class FakeStatement(str):
+    """ `prepared(session, name)` returns the query name """
+    def __new__(cls, session, name):
+        return str.__new__(cls, name)
+
+    def bind(self, parameters):
+        return self
+
+
+def test_build_partition():
+    rows = random_rows(50)
+    partition = build_partition(rows)
+    assert len(partition) == 50
+    assert partition.feats.shape[0] == 50
+    assert partition.feats1.dtype == np.int8
+    assert partition.hashes16.shape == (50, 8)
+    assert not partition.feats.flags.writeable
+    example_id = str(rows[7].example_id)
+    assert partition.example_positions[example_id] == 7
+    assert partition.example_positions is partition.example_positions
+
+
+def test_build_partition_empty():
+    partition = build_partition([])
+    assert len(partition) == 0
+
+
+def test_top():
+    partition = build_partition(random_rows(100))
+    top = partition.top(10)
+    assert len(top) == 10
+    # same order as `sorted(..., reverse=True)`, i.e. stable for ties
+    expected = sorted(range(100), key=lambda i: partition.rows[i].score,
+                      reverse=True)[:10]
+    assert top.rows == [partition.rows[i] for i in expected]
+    np.testing.assert_array_equal(top.feats, partition.feats[expected])
+    np.testing.assert_array_equal(top.hashes18, partition.hashes18[expected])
+    assert len(partition.top(1000)) == 100
+
+
+def test_get_top_partition_from_cache(cached_partition):
+    partition = cached_partition(random_rows(30))
+    top = asyncio.run(get_top_partition(FakeSession(), "Fahrrad", 5))
+    assert top.rows == partition.top(5).rows
+
+
+def test_get_top_rows_fallback(monkeypatch):
+    rows = random_rows(40)
+
+    async def fake_aexecute_all(session, stmt, parameters=None):
+        # `tbl_features_by_score` is empty, i.e. not indexed yet
+        return [] if stmt == "select_rows_by_score" else rows
+
+    monkeypatch.setattr(app.partitions, "aexecute_all", fake_aexecute_all)
+    monkeypatch.setattr(app.partitions, "prepared", FakeStatement)
+    top = asyncio.run(get_top_rows(FakeSession(), "Fahrrad", 7))
+    assert top == build_partition(rows).top(7).rows
+
+
+def test_get_row_features(monkeypatch):
+    rows = random_rows(250)
+    queried = []
+
+    async def fake_aexecute_all(session, stmt, parameters=None):
+        queried.append(len(parameters[1]))
+        return [row for row in rows if row.sentence in parameters[1]]
+
+    monkeypatch.setattr(app.partitions, "aexecute_all", fake_aexecute_all)
+    monkeypatch.setattr(app.partitions, "prepared", FakeStatement)
+    chosen = build_partition(rows).rows[::2]
+    deleted = rows.pop(6)  # deleted in the meantime, i.e. chosen[3]
+    result, feats = asyncio.run(
+        get_row_features(FakeSession(), "Fahrrad", chosen))
+    assert queried == [100, 25]
+    assert [row.sentence for row in result] == [
+        row.sentence for row in chosen if row.sentence != deleted.sentence]
+    raw = {row.sentence: row for row in rows}
+    np.testing.assert_array_equal(
+        feats, decode_features([raw[row.sentence] for row in result]))
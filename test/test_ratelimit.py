@@ -0,0 +1,60 @@
+from app.ratelimit import TokenBuckets, ConcurrencyLimit, throttle
+import asyncio
+import fastapi
+import pytest
+
+
+def test_token_buckets():
+    buckets = TokenBuckets(rate=0.5, burst=3)
+    assert [buckets.acquire("a", now=0.0) for _ in range(3)] == [0.0] * 3
+    assert buckets.acquire("a", now=0.0) == pytest.approx(2.0)
+    assert buckets.acquire("b", now=0.0) == 0.0  # other key
+    assert buckets.acquire("a", now=2.0) == 0.0  # refilled 1 token
+    assert buckets.acquire("a", now=2.0) > 0.0
+
+
+def test_token_buckets_maxkeys():
+    buckets = TokenBuckets(rate=1.0, burst=1, maxkeys=2)
+    for key in "abc":
+        buckets.acquire(key, now=0.0)
+    assert list(buckets.buckets) == ["b", "c"]
+    assert buckets.acquire("a", now=0.0) == 0.0  # dropped, i.e. full again
+
+
+def test_throttle():
+    buckets = TokenBuckets(rate=0.1, burst=1)
+    throttle(buckets, "nobody@example.com")
+    with pytest.raises(fastapi.HTTPException) as err:
+        throttle(buckets, "nobody@example.com")
+    assert err.value.status_code == 429
+    assert err.value.headers["Retry-After"] == "10"
+
+
+def test_concurrency_limit():
+    limit = ConcurrencyLimit(limit=2, timeout=0.05)
+    running, peak = [0], [0]
+
+    async def check(secs):
+        async with limit.slot():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(secs)
+            running[0] -= 1
+        return "ok"
+
+    async def run():
+        return await asyncio.gather(
+            *[check(0.01) for _ in range(6)],  # wait for a free slot
+            return_exceptions=True)
+
+    assert asyncio.run(run()) == ["ok"] * 6
+    assert peak[0] == 2
+
+    async def run_slow():
+        return await asyncio.gather(
+            *[check(0.2) for _ in range(3)], return_exceptions=True)
+
+    limit.semaphore = None  # new event loop
+    results = asyncio.run(run_slow())
+    assert results[:2] == ["ok", "ok"]
+    assert results[2].status_code == 503
@@ -0,0 +1,51 @@
+import app.score_index as si
+from test.test_model_weights import FakeStatement
+from test.test_partitions import random_rows
+import cassandra.concurrent
+import collections
+
+KeyRow = collections.namedtuple("KeyRow", ["score", "sentence"])
+
+
+class FakeIndexSession(object):
+    """ `tbl_features` and `tbl_features_by_score` of one headword """
+    def __init__(self, rows, indexed):
+        self.rows = rows
+        self.index = {(row.score, row.sentence): row for row in indexed}
+        self.log = []
+
+    def execute(self, stmt, parameters=None):
+        if stmt.name == "select_keys_by_score":
+            return [KeyRow(*key) for key in self.index]
+        if stmt.name == "select_features":
+            return self.rows
+        raise NotImplementedError(stmt.name)
+
+    def execute_concurrent_with_args(self, session, stmt, params, **kwargs):
+        for p in params:
+            self.log.append(stmt.name)
+            if stmt.name == "insert_features_by_score":
+                self.index[(p[8], p[2])] = p
+            elif stmt.name == "delete_feature_by_score":
+                del self.index[(p[1], p[2])]
+            else:
+                raise NotImplementedError(stmt.name)
+        return [None] * len(params)
+
+
+def test_rebuild_score_index(monkeypatch):
+    rows = random_rows(30)
+    old = rows[:20] + [r._replace(sentence=f"gone {i}")
+                       for i, r in enumerate(rows[20:25])]
+    rows = rows[5:]  # 5 sentences deleted, 10 new ones
+    session = FakeIndexSession(rows, old)
+    monkeypatch.setattr(si, "prepared", lambda s, name: FakeStatement(name))
+    monkeypatch.setattr(cassandra.concurrent, "execute_concurrent_with_args",
+                        session.execute_concurrent_with_args)
+
+    assert si.rebuild_score_index(session, "Fahrrad") == len(rows)
+    assert set(session.index) == {(r.score, r.sentence) for r in rows}
+    # the new rows are written before the stale rows are deleted
+    inserts = ["insert_features_by_score"] * len(rows)
+    deletes = ["delete_feature_by_score"] * 10
+    assert session.log == inserts + deletes
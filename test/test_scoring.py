@@ -0,0 +1,136 @@
+from app.scoring import Scorer, dense_layers, get_scorer, scorer_cache
+from app.weights import encode_weights
+import app.routers.model_weights as mw
+import app.scoring
+from test.test_model_weights import FakeTable, FakeStatement, USER_ID
+from test.test_partitions import random_rows, FakeSession
+import asyncio
+import uuid
+import numpy as np
+import pytest
+
+
+def fake_table(monkeypatch):
+    table = FakeTable()
+    for module in (mw, app.scoring):
+        monkeypatch.setattr(
+            module, "prepared", lambda s, name: FakeStatement(name))
+        monkeypatch.setattr(module, "aexecute", table.aexecute)
+    return table
+
+
+def test_dense_layers():
+    rng = np.random.default_rng(42)
+    feats = rng.normal(size=(10, 4)).astype(np.float32)
+    w = rng.normal(size=4).astype(np.float32)
+    # linear model without and with bias
+    scorer = Scorer(None, dense_layers([w], 4))
+    np.testing.assert_allclose(scorer(feats), feats @ w, rtol=1e-5)
+    scorer = Scorer(None, dense_layers([np.append(w, 2.0)], 4))
+    np.testing.assert_allclose(scorer(feats), feats @ w + 2.0, rtol=1e-5)
+    # MLP, i.e. `model.getWeights()` of 2 dense layers
+    w1, b1 = rng.normal(size=(4, 3)), rng.normal(size=3)
+    w2, b2 = rng.normal(size=(3, 1)), rng.normal(size=1)
+    scorer = Scorer(None, dense_layers([w1, b1, w2, b2], 4), "relu")
+    expected = (np.maximum(feats @ w1 + b1, 0) @ w2 + b2)[:, 0]
+    np.testing.assert_allclose(scorer(feats), expected, rtol=1e-5)
+    with pytest.raises(ValueError):
+        scorer(feats[:, :3])
+    with pytest.raises(ValueError):
+        Scorer(None, dense_layers([w1, b1, w2, b2], 4))  # no activation
+    with pytest.raises(ValueError):
+        dense_layers([w1, b1], 4)  # 3 outputs
+    with pytest.raises(ValueError):
+        dense_layers([w1, w1], 4)
+
+
+def test_get_scorer_cache(monkeypatch):
+    table = fake_table(monkeypatch)
+    user_id = uuid.uuid4()
+
+    async def save(weights):
+        blob, manifest = encode_weights(weights)
+        await table.aexecute(None, FakeStatement(
+            "insert_model_weights_blob"),
+            [user_id, None, blob, manifest, len(blob), 0])
+
+    async def run():
+        assert await get_scorer(FakeSession(), user_id, 2) is None
+        await save([1.0, 2.0])
+        first = await get_scorer(FakeSession(), user_id, 2)
+        again = await get_scorer(FakeSession(), user_id, 2)
+        await save([3.0, 4.0])
+        newer = await get_scorer(FakeSession(), user_id, 2)
+        return first, again, newer
+
+    try:
+        first, again, newer = asyncio.run(run())
+    finally:
+        scorer_cache.clear()
+    assert first is again
+    assert newer is not first
+    np.testing.assert_array_equal(newer.layers[0][0][:, 0], [3.0, 4.0])
+
+
+def test_score_examples(monkeypatch, cached_partition):
+    fake_table(monkeypatch)
+    partition = cached_partition(random_rows(40))
+    weights = np.linspace(-1, 1, partition.feats.shape[1]).tolist()
+    try:
+        res = asyncio.run(mw.score_examples(
+            {"headword": "Fahrrad", "n_top": 5}, user_id=USER_ID,
+            session=FakeSession()))
+        assert res["status"] == "no-data"
+        asyncio.run(mw.save_model_weights(
+            {"weights": weights}, user_id=USER_ID, session=FakeSession()))
+        res = asyncio.run(mw.score_examples(
+            {"headword": "Fahrrad", "n_top": 5}, user_id=USER_ID,
+            session=FakeSession()))
+    finally:
+        scorer_cache.clear()
+    assert res["status"] == "success" and res["num"] == 5
+    expected = partition.feats @ np.array(weights, dtype=np.float32)
+    idx = np.argsort(-expected, kind="stable")[:5]
+    assert [item["example_id"] for item in res["data"]] == [
+        str(partition.rows[i].example_id) for i in idx]
+    np.testing.assert_allclose(
+        [item["score"] for item in res["data"]], expected[idx], rtol=1e-4)
+
+
+def test_score_examples_activation(monkeypatch, cached_partition):
+    fake_table(monkeypatch)
+    partition = cached_partition(random_rows(40))
+    rng = np.random.default_rng(23)
+    w1 = rng.normal(size=(partition.feats.shape[1], 3))
+    w2 = rng.normal(size=(3, 1))
+    weights = [w1.tolist(), w2.tolist()]
+
+    def score(params):
+        return asyncio.run(mw.score_examples(
+            dict(params, headword="Fahrrad"), user_id=USER_ID,
+            session=FakeSession()))
+
+    def save(data):
+        res = asyncio.run(mw.save_model_weights(
+            data, user_id=USER_ID, session=FakeSession()))
+        scorer_cache.clear()
+        return res
+
+    try:
+        assert save({"weights": weights, "activation": "foo"})[
+            "status"] == "failed"
+        assert save({"weights": weights})["status"] == "success"
+        without = score({"n_top": 5})
+        assert save({"weights": weights, "activation": "tanh"})[
+            "status"] == "success"
+        res = score({"n_top": 5})
+        invalid = score({"n_top": "x"})
+    finally:
+        scorer_cache.clear()
+    assert without["status"] == "failed"
+    assert res["status"] == "success" and res["num"] == 5
+    expected = (np.tanh(partition.feats @ w1) @ w2)[:, 0]
+    idx = np.argsort(-expected, kind="stable")[:5]
+    np.testing.assert_allclose(
+        [item["score"] for item in res["data"]], expected[idx], rtol=1e-4)
+    assert invalid["status"] == "failed"
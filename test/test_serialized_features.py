@@ -0,0 +1,112 @@
+from app.cursors import decode_cursor
+import app.routers.serialized_features as sf
+from test.test_model_weights import FakeStatement, USER_ID
+from test.test_partitions import random_rows
+import asyncio
+import collections
+import json
+
+Result = collections.namedtuple(
+    "Result", ["current_rows", "paging_state"])
+
+
+class FakeFuture(object):
+    def __init__(self, result=None, error=None):
+        self.value = result
+        self.error = error
+        self.waited = False
+
+    def add_callbacks(self, callback, errback):
+        callback()  # the page is there already
+
+    def result(self):
+        self.waited = True
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class FakePagingSession(object):
+    """ `tbl_features` of one headword, paged by row number """
+    keyspace = "evidence"
+
+    def __init__(self, rows, fail_at=None):
+        self.rows = rows
+        self.fail_at = fail_at
+        self.futures = []
+
+    def execute_async(self, stmt, parameters=None, paging_state=None):
+        start = int(paging_state or 0)
+        end = min(start + stmt.fetch_size, len(self.rows))
+        if start == self.fail_at:
+            future = FakeFuture(error=RuntimeError("Read timeout"))
+        else:
+            future = FakeFuture(Result(
+                self.rows[start:end],
+                str(end).encode() if end < len(self.rows) else None))
+        self.futures.append(future)
+        return future
+
+
+def stream(session, params):
+    response = asyncio.run(sf.get_serialized_features(
+        dict(params, headword="Fahrrad", stream=True), user_id=USER_ID,
+        session=session, media=sf.MEDIA_JSON))
+
+    async def read():
+        return [chunk async for chunk in response.body_iterator]
+
+    lines = "".join(asyncio.run(read())).splitlines()
+    return [json.loads(line) for line in lines]
+
+
+def test_stream_pages(monkeypatch):
+    monkeypatch.setattr(sf, "prepared", lambda s, name: FakeStatement(name))
+    monkeypatch.setattr(sf, "STREAM_FETCH_SIZE", 40)
+    rows = random_rows(130)
+    session = FakePagingSession(rows)
+
+    lines = stream(session, {"limit": 100})
+    *examples, last = lines
+    assert [ex["example_id"] for ex in examples] == [
+        str(row.example_id) for row in rows[:100]]
+    assert examples[0]["hashes16"] == rows[0].hashes16
+    assert len(session.futures) == 3  # 40 + 40 + 20 rows
+    assert last["status"] == "success" and last["num"] == 100
+    assert decode_cursor(
+        last["cursor"], user=USER_ID, headword="Fahrrad") == b"100"
+
+    # resume with the cursor of the last line
+    *examples, last = stream(session, {"limit": 100,
+                                       "cursor": last["cursor"]})
+    assert [ex["example_id"] for ex in examples] == [
+        str(row.example_id) for row in rows[100:]]
+    assert last == {"status": "success", "num": 30, "cursor": None}
+
+
+def test_stream_failed(monkeypatch):
+    monkeypatch.setattr(sf, "prepared", lambda s, name: FakeStatement(name))
+    monkeypatch.setattr(sf, "STREAM_FETCH_SIZE", 40)
+    session = FakePagingSession(random_rows(130), fail_at=40)
+    *examples, last = stream(session, {"limit": 100})
+    assert len(examples) == 40
+    assert last == {"status": "failed", "msg": "Unknown error"}
+
+    # a bad row while the next page is prefetched
+    rows = random_rows(130)
+    rows[10] = rows[10]._replace(spans={1, 2})  # no JSON
+    session = FakePagingSession(rows)
+    *examples, last = stream(session, {"limit": 100})
+    assert len(examples) == 10
+    assert last["status"] == "failed"
+    assert len(session.futures) == 2 and not session.futures[1].waited
+
+
+def test_page_failed(monkeypatch):
+    monkeypatch.setattr(sf, "prepared", lambda s, name: FakeStatement(name))
+    session = FakePagingSession(random_rows(10), fail_at=0)
+    res = asyncio.run(sf.get_serialized_features(
+        {"headword": "Fahrrad", "limit": 5}, user_id=USER_ID,
+        session=session, media=sf.MEDIA_JSON))
+    assert res["status"] == "failed"
+    assert json.loads(json.dumps(res))["error"] == "Read timeout"
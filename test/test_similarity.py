@@ -0,0 +1,63 @@
+from app.similarity import (
+    semantic_simi_matrix, hash_simi_matrix, hamming_neighbors,
+    diverse_subset, pack_bits)
+import numpy as np
+
+
+# The former `compute_simi_matrix` on unpacked bits or raw hashes
+def simi_matrix_reference(x):
+    n = x.shape[0]
+    y = np.diag(np.ones(n, dtype=np.float32))
+    for i in range(n):
+        for j in range(i + 1, n):
+            y[i, j] = np.mean(x[i] == x[j])
+            y[j, i] = y[i, j]
+    return y
+
+
+def test_semantic_simi_matrix():
+    rng = np.random.default_rng(42)
+    for nbytes in (48, 13):  # with and without padding
+        feats1 = rng.integers(-128, 128, (30, nbytes)).astype(np.int8)
+        feats1[1] = feats1[0]
+        bits = np.unpackbits(feats1.view(np.uint8), axis=1, bitorder='big')
+        expected = simi_matrix_reference(bits)
+        result = semantic_simi_matrix(feats1)
+        assert result.dtype == np.float32
+        np.testing.assert_array_equal(result, expected)
+        assert result[0, 1] == 1.0
+
+
+def test_hash_simi_matrix():
+    rng = np.random.default_rng(42)
+    hashes = rng.integers(0, 3, (30, 8)).astype(np.int32)
+    expected = simi_matrix_reference(hashes)
+    result = hash_simi_matrix(hashes)
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_hamming_neighbors():
+    rng = np.random.default_rng(42)
+    feats1 = rng.integers(-128, 128, (200, 13)).astype(np.int8)
+    feats1[7] = feats1[3]
+    simi = semantic_simi_matrix(feats1)
+    idx, result = hamming_neighbors(pack_bits(feats1), 13 * 8, 3, 10)
+    assert idx[0] == 7 and result[0] == 1.0
+    assert 3 not in idx
+    expected = np.delete(simi[3], 3)
+    np.testing.assert_allclose(result, np.sort(expected)[::-1][:10])
+    np.testing.assert_allclose(simi[3, idx], result)
+    assert len(hamming_neighbors(pack_bits(feats1[:1]), 104, 0, 5)[0]) == 0
+
+
+def test_diverse_subset():
+    rng = np.random.default_rng(42)
+    centers = rng.integers(-128, 128, (4, 16)).astype(np.int8)
+    # 4 clusters of 25 near-duplicates (1 flipped bit)
+    feats1 = np.repeat(centers, 25, axis=0)
+    feats1[np.arange(100), rng.integers(0, 16, 100)] ^= 1
+    idx = diverse_subset(pack_bits(feats1), 4, start=10)
+    assert idx[0] == 10
+    assert sorted(idx // 25) == [0, 1, 2, 3]  # one of each cluster
+    assert len(diverse_subset(pack_bits(feats1), 500)) == 100
@@ -0,0 +1,67 @@
+from app.partitions import build_partition
+from app.routers import similarity_matrices
+from app.routers.similarity_matrices import create_similarity_matrices
+from app.wire import MEDIA_JSON, MEDIA_FRAME, unpack_frame
+from test.test_partitions import random_rows, FakeSession
+import asyncio
+import json
+
+
+def request(media=MEDIA_JSON, if_none_match=None):
+    return asyncio.run(create_similarity_matrices(
+        {"headword": "Fahrrad", "limit": 10}, user_id="user",
+        session=FakeSession(), media=media, if_none_match=if_none_match))
+
+
+def test_similarity_cache(monkeypatch):
+    partition = build_partition(random_rows(30))
+    computed = []
+
+    async def fake_get_top_rows(session, headword, limit):
+        return partition.top(limit).rows
+
+    async def fake_get_top_partition(session, headword, limit):
+        computed.append(limit)
+        return partition.top(limit)
+
+    monkeypatch.setattr(
+        similarity_matrices, "get_top_rows", fake_get_top_rows)
+    monkeypatch.setattr(
+        similarity_matrices, "get_top_partition", fake_get_top_partition)
+    similarity_matrices.similarity_cache.local.clear()
+
+    res1 = request()
+    body = json.loads(res1.body)
+    assert body["num"] == 10
+    assert len(body["simi-semantic"]) == 10
+    etag = res1.headers["ETag"]
+
+    # cached response
+    res2 = request()
+    assert res2.body == res1.body
+    assert res2.headers["ETag"] == etag
+    assert computed == [10]
+
+    # unchanged data
+    res3 = request(if_none_match=etag)
+    assert res3.status_code == 304
+    assert res3.body == b""
+
+    # another representation has another ETag
+    res4 = request(media=MEDIA_FRAME, if_none_match=etag)
+    assert res4.status_code == 200
+    assert res4.headers["ETag"] != etag
+    data, arrays = unpack_frame(res4.body)
+    assert arrays["simi-semantic"].shape == (10, 10)
+    assert computed == [10, 10]
+
+
+def test_similarity_matrices_failed(monkeypatch):
+    async def fake_get_top_rows(session, headword, limit):
+        raise RuntimeError("Read timeout")
+
+    monkeypatch.setattr(
+        similarity_matrices, "get_top_rows", fake_get_top_rows)
+    res = request()
+    assert res["status"] == "failed"
+    assert json.loads(json.dumps(res))["error"] == "Read timeout"
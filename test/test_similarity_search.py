@@ -0,0 +1,38 @@
+from app.routers.similarity_search import (
+    nearest_neighbors, maximally_diverse_subset)
+from test.test_partitions import random_rows, FakeSession
+import asyncio
+
+
+def test_search_endpoints(cached_partition):
+    partition = cached_partition(random_rows(50))
+    example_id = str(partition.rows[5].example_id)
+    res = asyncio.run(nearest_neighbors(
+        {"headword": "Fahrrad", "example_id": example_id, "k": 3},
+        session=FakeSession()))
+    assert res["status"] == "success" and res["num"] == 3
+    assert example_id not in [item["example_id"] for item in res["data"]]
+    similarities = [item["similarity"] for item in res["data"]]
+    assert similarities == sorted(similarities, reverse=True)
+
+    res = asyncio.run(nearest_neighbors(
+        {"headword": "Fahrrad", "example_id": "unknown"},
+        session=FakeSession()))
+    assert res["status"] == "failed"
+
+    res = asyncio.run(nearest_neighbors(
+        {"headword": "Fahrrad", "example_id": example_id, "k": "ten"},
+        session=FakeSession()))
+    assert res["status"] == "failed"
+    res = asyncio.run(maximally_diverse_subset(
+        {"headword": "Fahrrad", "limit": "all"}, session=FakeSession()))
+    assert res["status"] == "failed"
+
+    res = asyncio.run(maximally_diverse_subset(
+        {"headword": "Fahrrad", "n": 5, "limit": 20},
+        session=FakeSession()))
+    assert res["num"] == 5
+    top = partition.top(20)
+    assert res["data"][0]["example_id"] == str(top.rows[0].example_id)
+    assert {item["example_id"] for item in res["data"]} <= {
+        str(row.example_id) for row in top.rows}
@@ -0,0 +1,97 @@
+from app.transform import i2f
+import numpy as np
+
+
+# The former list-based implementation of `app.transform.i2f`
+def divide_by_1st_col_reference(feats):
+    n_feats = feats.shape[-1] - 1
+    denom = np.maximum(feats[:, 0], 1)
+    return feats[:, 1:] / np.tile(denom.reshape(-1, 1), n_feats)
+
+
+def divide_by_sum_reference(feats):
+    n_feats = feats.shape[-1]
+    denom = np.maximum(feats.sum(axis=1), 1)
+    return feats / np.tile(denom.reshape(-1, 1), n_feats)
+
+
+def int8_to_scaledfloat_reference(idx):
+    idx = min(127, max(-128, idx))
+    return 1. - (float(idx) + 128.0) / 255.0
+
+
+def i2f_reference(feats1, feats2, feats3, feats4,
+                  feats5, feats6, feats7, feats8,
+                  feats9, feats12, feats13, feats14):
+    feats1 = np.array(feats1, dtype=np.int8)
+    feats2 = np.array(feats2, dtype=np.int8)
+    feats3 = np.array(feats3, dtype=np.int8)
+    feats4 = np.array(feats4, dtype=np.int8)
+    feats5 = np.array(feats5, dtype=np.int16)
+    feats6 = np.array(feats6, dtype=np.int16)
+    feats7 = np.array(feats7, dtype=np.int16)
+    feats8 = np.array(feats8, dtype=np.int8)
+    feats9 = np.array(feats9, dtype=np.int8)
+    feats12 = np.array(feats12, dtype=np.int16)
+    feats13 = np.array(feats13, dtype=np.int8)
+    feats14 = np.array(feats14, dtype=np.int8)
+    return np.hstack([
+        np.vstack([np.unpackbits(enc.astype(np.uint8), bitorder='big')
+                   for enc in feats1]),
+        divide_by_1st_col_reference(feats2),
+        divide_by_1st_col_reference(feats3),
+        divide_by_sum_reference(feats4),
+        divide_by_1st_col_reference(feats5),
+        divide_by_1st_col_reference(feats6),
+        divide_by_1st_col_reference(feats7),
+        divide_by_1st_col_reference(feats8),
+        divide_by_1st_col_reference(feats9),
+        np.log(feats12 + 1.),
+        np.vstack([[int8_to_scaledfloat_reference(i) for i in tmp]
+                   for tmp in feats13]).astype(float),
+        divide_by_1st_col_reference(feats14)
+    ])
+
+
+def random_features(n: int, seed: int = 42) -> list:
+    """ Random `tbl_features` columns of n sentences as lists of lists """
+    rng = np.random.default_rng(seed)
+    specs = [  # (width, low, high) of feats1..9, feats12..14
+        (96, -128, 128), (19, 0, 50), (39, 0, 50), (23, 0, 20),
+        (9, 0, 300), (41, 0, 300), (81, 0, 300), (7, 0, 50),
+        (8, 0, 50), (1, 0, 500), (3, -128, 128), (6, 0, 5)]
+    feats = []
+    for width, low, high in specs:
+        x = rng.integers(low, high, size=(n, width))
+        x[:n // 10, 0] = 0  # zero denominators
+        feats.append(x.tolist())
+    return feats
+
+
+def test_i2f_parity_float64():
+    feats = random_features(200)
+    expected = i2f_reference(*feats)
+    result = i2f(*feats, dtype=np.float64)
+    assert result.dtype == np.float64
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_i2f_parity_float32():
+    feats = random_features(200)
+    expected = i2f_reference(*feats).astype(np.float32)
+    result = i2f(*feats)
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_i2f_out():
+    feats = random_features(10)
+    shape = i2f_reference(*feats).shape
+    out = np.full(shape, np.nan, dtype=np.float32)
+    result = i2f(*feats, out=out)
+    assert result is out
+    assert not np.isnan(out).any()
+
+
+def test_i2f_empty():
+    assert i2f(*[[] for _ in range(12)]).shape == (0, 0)
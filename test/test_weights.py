@@ -0,0 +1,58 @@
+from app.weights import (
+    encode_weights, decode_weights, read_weights, read_weights_arrays)
+import collections
+import json
+import pytest
+import numpy as np
+
+
+WeightsRow = collections.namedtuple(
+    "WeightsRow", ["updated_at", "weights", "weights_blob", "manifest"])
+
+LAYERS = [np.linspace(-1, 1, 12).reshape(3, 4).tolist(), [0.5, -0.25, 0.0]]
+
+
+def test_single_tensor_roundtrip():
+    weights = [0.2, -0.3, 1.3, -0.4]
+    blob, manifest = encode_weights(weights)
+    assert len(blob) == 16
+    np.testing.assert_allclose(decode_weights(blob, manifest), weights,
+                               rtol=1e-7)
+
+
+def test_list_of_tensors_roundtrip():
+    for dtype, rtol in [("float32", 1e-7), ("float16", 1e-3)]:
+        for compress in (False, True):
+            blob, manifest = encode_weights(
+                LAYERS, dtype=dtype, compress=compress)
+            result = decode_weights(blob, manifest)
+            assert len(result) == 2
+            np.testing.assert_allclose(result[0], LAYERS[0], rtol=rtol)
+            np.testing.assert_allclose(result[1], LAYERS[1], rtol=rtol)
+
+
+def test_not_numeric():
+    with pytest.raises(ValueError):
+        encode_weights([[[1.0, 2.0], [3.0]]])  # ragged tensor
+    with pytest.raises(ValueError):
+        encode_weights({"layer": [1.0]})
+    with pytest.raises(ValueError):
+        encode_weights(["a", "b"])
+
+
+def test_read_old_json_rows():
+    row = WeightsRow(None, json.dumps(LAYERS), None, None)
+    assert read_weights(row) == LAYERS
+    meta, arrays = read_weights_arrays(row)
+    assert meta == {"layout": "list", "tensors": ["weights-0", "weights-1"],
+                    "activation": None}
+    assert arrays[0].dtype == np.float32 and arrays[0].shape == (3, 4)
+
+
+def test_read_binary_rows():
+    blob, manifest = encode_weights(LAYERS, dtype="float16", compress=True)
+    row = WeightsRow(None, None, blob, manifest)
+    meta, arrays = read_weights_arrays(row)
+    assert arrays[1].dtype == np.float32
+    np.testing.assert_allclose(arrays[1], LAYERS[1])
+    np.testing.assert_allclose(read_weights(row)[0], LAYERS[0], rtol=1e-3)
@@ -0,0 +1,47 @@
+from app.wire import (
+    negotiate, etag_matches, pack_frame, unpack_frame, pack_msgpack,
+    unpack_msgpack,
+    MEDIA_JSON, MEDIA_FRAME, MEDIA_MSGPACK)
+import numpy as np
+import struct
+
+
+DATA = {"status": "success", "examples": [{"text": "Zwölf Boxkämpfer"}]}
+ARRAYS = {
+    "features": np.random.random((3, 5)).astype(np.float32),
+    "feats1": np.arange(-7, 8, dtype=np.int8).reshape(3, 5),
+    "feats5": np.arange(6, dtype=np.int16).reshape(2, 3)
+}
+
+
+def test_negotiate():
+    assert negotiate(None) == MEDIA_JSON
+    assert negotiate("application/json") == MEDIA_JSON
+    assert negotiate("application/octet-stream") == MEDIA_FRAME
+    assert negotiate("application/x-msgpack, */*") == MEDIA_MSGPACK
+
+
+def test_frame_roundtrip():
+    buf = pack_frame(DATA, ARRAYS)
+    hlen, = struct.unpack_from("<I", buf, 0)
+    assert (4 + hlen) % 8 == 0
+    data, arrays = unpack_frame(buf)
+    assert data == DATA
+    for name, arr in ARRAYS.items():
+        assert arrays[name].dtype == arr.dtype
+        np.testing.assert_array_equal(arrays[name], arr)
+
+
+def test_msgpack_roundtrip():
+    data, arrays = unpack_msgpack(pack_msgpack(DATA, ARRAYS))
+    assert data == DATA
+    for name, arr in ARRAYS.items():
+        np.testing.assert_array_equal(arrays[name], arr)
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"xyz", W/"abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"xyz"', '"abc"')
+    assert not etag_matches(None, '"abc"')
@@ -0,0 +1,152 @@
+from app.config import config_writes
+from app.writes import write_rows, WriteBehindQueue
+import app.writes
+import asyncio
+import threading
+import time
+import cassandra as cas
+
+
+class FakeResult(object):
+    def __init__(self, was_applied):
+        self.was_applied = was_applied
+
+
+class FakeFuture(object):
+    def __init__(self, result, latency):
+        self._result = result
+        self.latency = latency
+
+    def add_callbacks(self, callback, errback):
+        if self.latency > 0:
+            threading.Timer(self.latency, callback, [None]).start()
+        else:
+            callback(None)
+
+    def result(self):
+        if isinstance(self._result, Exception):
+            raise self._result
+        return self._result
+
+
+class FakeCqlSession(object):
+    """ Stand-in for `cassandra.cluster.Session` that executes conditional
+      batches of `INSERT %s` statements (the row is the bound string) """
+    def __init__(self, latency=0.0, failures=0):
+        self.latency = latency
+        self.failures = failures  # number of calls that time out
+        self.rows = set()
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def execute_async(self, query, parameters=None, paging_state=None):
+        rows = [s for _, s, _ in query._statements_and_parameters]
+        with self.lock:
+            self.batch_sizes.append(len(rows))
+            if self.failures > 0:
+                self.failures -= 1
+                return FakeFuture(cas.WriteTimeout(
+                    "timeout", write_type=cas.WriteType.CAS), self.latency)
+            applied = not any([row in self.rows for row in rows])
+            if applied:
+                self.rows.update(rows)
+        return FakeFuture(FakeResult(applied), self.latency)
+
+
+def rows(n, headword="Fahrrad"):
+    return [(f"{headword}{i}", headword, [f"{headword}{i}"])
+            for i in range(n)]
+
+
+def test_write_rows_chunks(monkeypatch):
+    monkeypatch.setitem(config_writes, "BATCH_SIZE", 20)
+    session = FakeCqlSession()
+    stored = asyncio.run(write_rows(
+        session, "INSERT %s", rows(30) + rows(15, "Internet")))
+    assert all(stored.values()) and len(stored) == 45
+    assert sorted(session.batch_sizes) == [10, 15, 20]
+    assert len(session.rows) == 45
+
+
+def test_write_rows_existing():
+    session = FakeCqlSession()
+    session.rows.add("INSERT 'Fahrrad3'")
+    stored = asyncio.run(write_rows(session, "INSERT %s", rows(5)))
+    assert all(stored.values())
+    assert len(session.rows) == 5
+    assert session.batch_sizes == [5, 1, 1, 1, 1, 1]
+
+
+def test_write_rows_retries(monkeypatch):
+    monkeypatch.setitem(config_writes, "BACKOFF", 0.0)
+    session = FakeCqlSession(failures=2)
+    stored = asyncio.run(write_rows(session, "INSERT %s", rows(3)))
+    assert all(stored.values())
+    assert session.batch_sizes == [3, 3, 3]
+
+
+def test_write_rows_failed(monkeypatch):
+    monkeypatch.setitem(config_writes, "BACKOFF", 0.0)
+    monkeypatch.setitem(config_writes, "BATCH_SIZE", 2)
+    monkeypatch.setitem(config_writes, "CONCURRENCY", 1)
+    session = FakeCqlSession(failures=config_writes["RETRIES"] + 1)
+    stored = asyncio.run(write_rows(session, "INSERT %s", rows(4)))
+    assert list(stored.values()) == [False, False, True, True]
+
+
+def test_write_rows_concurrency(monkeypatch):
+    monkeypatch.setitem(config_writes, "BATCH_SIZE", 1)
+    monkeypatch.setitem(config_writes, "CONCURRENCY", 4)
+    session = FakeCqlSession(latency=0.05)
+    t = time.perf_counter()
+    stored = asyncio.run(write_rows(session, "INSERT %s", rows(8)))
+    assert all(stored.values())
+    assert 0.1 <= time.perf_counter() - t < 0.35
+
+
+def write_behind_queue(session, **kwargs):
+    options = dict(maxsize=100, flush_size=50, flush_interval=0.05,
+                   put_timeout=0.05)
+    options.update(kwargs)
+    return WriteBehindQueue(session, **options)
+
+
+def test_write_behind_group_commit(monkeypatch):
+    monkeypatch.setattr(app.writes, "prepared", lambda s, name: "INSERT %s")
+    session = FakeCqlSession()
+
+    async def run():
+        queue = write_behind_queue(session)
+        queue.start()
+        # 10 requests with 3 rows each
+        for i in range(10):
+            queued = await queue.put_many(
+                "insert_evaluated_bestworst", rows(3, f"headword{i % 2}"))
+            assert all(queued.values())
+        await asyncio.sleep(0.1)  # flush by time
+        assert len(session.rows) == 6  # same keys in each request
+        await queue.put_many("insert_evaluated_bestworst", rows(60))
+        await queue.stop()  # flush on shutdown
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert len(session.rows) == 66
+    assert stats["queued"] == 90 and stats["written"] == 90
+    assert stats["failed"] == 0 and stats["queue-size"] == 0
+    assert max(session.batch_sizes) <= config_writes["BATCH_SIZE"]
+
+
+def test_write_behind_backpressure(monkeypatch):
+    monkeypatch.setattr(app.writes, "prepared", lambda s, name: "INSERT %s")
+    session = FakeCqlSession()
+
+    async def run():
+        queue = write_behind_queue(session, maxsize=2)  # not started
+        queued = await queue.put_many("insert_evaluated_bestworst", rows(3))
+        queue.start()
+        await queue.stop()
+        return queued
+
+    queued = asyncio.run(run())
+    assert list(queued.values()) == [True, True, False]
+    assert len(session.rows) == 2